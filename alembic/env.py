@@ -9,7 +9,8 @@ import sys
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
 
 from src.database import Base
-from src.models import User, Station, Subscription, FoundTicket
+from src.models import User, Station, Subscription, FoundTicket, RouteWatch, StationCatalogVersion, NotificationOutbox
+from src.models import TrainSeatSeries, TrainSeatSeriesChunk
 
 # this is the Alembic Config object, which provides
 # access to the values within the .ini file in use.
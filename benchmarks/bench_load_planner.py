@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Ожидаемая нагрузка на РЖД: проверки по шагу beat против плана с фазами маршрутов
+
+Маршруты получают частоты как у подписок (в основном 10 минут), план строится
+LoadPlanner; выводятся пик и среднее проверок в секунду и кривая по минутам.
+
+Запуск: python benchmarks/bench_load_planner.py [число маршрутов]
+"""
+
+import os
+import random
+import sys
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from src.load_planner import LoadPlanner
+from src.utils import RouteKey
+
+STATIONS = ['МСК', 'СПБ', 'НСК', 'ЕКБ', 'КЗН', 'ННГ', 'ЧЛБ', 'СМР', 'ОМС', 'РНД', 'УФА', 'КРС']
+FREQUENCIES = [5, 10, 10, 10, 10, 10, 15, 30]
+
+
+def build_routes(count: int):
+    rng = random.Random(42)
+    routes = []
+    for watch_id in range(1, count + 1):
+        departure, arrival = rng.sample(STATIONS, 2)
+        departure_date = date(2026, 1, 1) + timedelta(days=rng.randrange(60))
+        routes.append((watch_id, RouteKey(departure, arrival, departure_date), rng.choice(FREQUENCIES)))
+    return routes
+
+
+def unplanned_curve(routes, horizon: int):
+    """Все маршруты наступают на шаге beat (10 минут): проверки уходят одним всплеском"""
+    counts = [0] * horizon
+    for tick in range(0, horizon, 600):
+        counts[tick] = len(routes)
+    return counts
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    routes = build_routes(count)
+
+    planner = LoadPlanner()
+    planner.plan(routes)
+    curve = planner.predicted_rps()
+    beat = unplanned_curve(routes, len(curve))
+
+    print(f"Маршрутов: {count}, горизонт: {len(curve)} с")
+    for name, values in (('beat', beat), ('план', curve)):
+        busy = sum(1 for value in values if value)
+        print(f"{name:<5} пик: {max(values):6d} проверок/с  среднее: {sum(values) / len(values):6.2f}  "
+              f"секунд с проверками: {busy}")
+
+    print("\nПлан по минутам (пик проверок/с):")
+    for minute in range(0, len(curve) // 60):
+        window = curve[minute * 60:(minute + 1) * 60]
+        print(f"{minute:3d} мин  {max(window):4d}  {'#' * max(window)}")
+
+    # Добавление маршрутов перераспределяет фазы, пик остается ровным
+    planner.plan(routes + build_routes(count + count // 10)[count:])
+    print(f"\nПосле добавления {count // 10} маршрутов пик: {max(planner.predicted_rps())} проверок/с")
+
+
+if __name__ == '__main__':
+    main()
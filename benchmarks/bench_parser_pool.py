@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Пропускная способность разбора страниц результатов в пуле процессов
+
+Запуск: python benchmarks/bench_parser_pool.py [страниц] [поездов на странице]
+"""
+
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from src.parser import parse_search_page
+from src.records import SEAT_CLASSES
+
+DEPARTURE_DATE = date(2024, 3, 15)
+
+
+def build_page(trains: int) -> bytes:
+    """Синтетическая страница результатов в разметке, которую ожидает парсер"""
+    blocks = []
+    for i in range(trains):
+        seats = "".join(
+            f'<div><span>{name}</span><span class="count">{(i + j) % 40}</span>'
+            f'<span class="price">от {1000 + i * 10 + j} ₽</span></div>'
+            for j, name in enumerate(SEAT_CLASSES)
+        )
+        blocks.append(
+            f'<div class="train-item"><span class="train-number">{i % 999:03d}М</span>'
+            f'<span class="departure-time">{i % 24:02d}:15</span>'
+            f'<span class="arrival-time">{(i + 9) % 24:02d}:40</span>{seats}</div>'
+        )
+    return f"<html><body>{''.join(blocks)}</body></html>".encode('utf-8')
+
+
+def run(workers: int, pages: list) -> float:
+    """Страниц в секунду при заданном числе процессов"""
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        # Прогрев: процессы стартуют и импортируют парсер до замера
+        list(executor.map(parse_search_page, pages[:workers], [DEPARTURE_DATE] * workers))
+        started = time.perf_counter()
+        list(executor.map(parse_search_page, pages, [DEPARTURE_DATE] * len(pages)))
+        return len(pages) / (time.perf_counter() - started)
+
+
+def main():
+    page_count = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    trains = int(sys.argv[2]) if len(sys.argv) > 2 else 30
+    pages = [build_page(trains)] * page_count
+
+    started = time.perf_counter()
+    for page in pages:
+        parse_search_page(page, DEPARTURE_DATE)
+    inline = page_count / (time.perf_counter() - started)
+
+    print(f"Страниц: {page_count}, поездов на странице: {trains}, размер: {len(pages[0])} байт")
+    print(f"В процессе:   {inline:8.1f} стр/с")
+
+    cores = os.cpu_count() or 1
+    workers = 1
+    while workers <= cores:
+        rate = run(workers, pages)
+        print(f"Пул x{workers:<3}     {rate:8.1f} стр/с ({rate / inline:.2f}x)")
+        workers *= 2
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Сравнение памяти на кэшированный результат поиска: словари строк против записей Train
+
+Запуск: python benchmarks/bench_records.py [количество результатов]
+"""
+
+import os
+import sys
+import tracemalloc
+from datetime import date
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from src.records import SEAT_CLASSES, SeatClass, Train, parse_count, parse_price_kopecks, parse_departure_times
+
+TRAINS_PER_RESULT = 20
+
+
+def build_dict_result(seed: int) -> list:
+    """Результат в прежнем виде: вложенные словари строк"""
+    trains = []
+    for i in range(TRAINS_PER_RESULT):
+        seats = {
+            name: {'count': f"{(seed + i + j) % 40} мест", 'price': f"от {1000 + seed + i * 10 + j} ₽"}
+            for j, name in enumerate(SEAT_CLASSES)
+        }
+        trains.append({
+            'train_number': f"{(seed + i) % 999:03d}М",
+            'departure_time': f"{i % 24:02d}:{seed % 60:02d}",
+            'arrival_time': f"{(i + 9) % 24:02d}:{seed % 60:02d}",
+            'available_seats': seats,
+            'prices': {seat['price']: int(''.join(filter(str.isdigit, seat['price']))) for seat in seats.values()},
+        })
+    return trains
+
+
+def build_record_result(seed: int) -> list:
+    """Тот же результат в виде записей Train"""
+    day = date(2024, 3, 15)
+    trains = []
+    for train in build_dict_result(seed):
+        departure, arrival = parse_departure_times(day, train['departure_time'], train['arrival_time'])
+        seats = tuple(
+            SeatClass(name, parse_count(info['count']), parse_price_kopecks(info['price']))
+            for name, info in train['available_seats'].items()
+        )
+        trains.append(Train.build(train['train_number'], departure, arrival, seats))
+    return trains
+
+
+def measure(builder, results: int) -> int:
+    """Объем памяти, занятой результатами, в байтах"""
+    tracemalloc.start()
+    cache = [builder(seed) for seed in range(results)]
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del cache
+    return current
+
+
+def main():
+    results = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+
+    dict_bytes = measure(build_dict_result, results)
+    record_bytes = measure(build_record_result, results)
+
+    print(f"Результатов: {results}, поездов в результате: {TRAINS_PER_RESULT}")
+    print(f"Словари:  {dict_bytes / results:10.0f} байт на результат")
+    print(f"Записи:   {record_bytes / results:10.0f} байт на результат")
+    print(f"Экономия: {(1 - record_bytes / dict_bytes) * 100:9.1f}%")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Время импорта модулей при запуске каждой команды run.py
+
+Запускает `python -X importtime` в чистом процессе для модулей, которые импортирует команда,
+и выводит общее время, число модулей и самые тяжелые пакеты верхнего уровня.
+
+Запуск: python benchmarks/bench_startup.py [команда ...]
+"""
+
+import os
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+ROOT = os.path.join(os.path.dirname(__file__), '..')
+
+# Модули, которые импортирует каждая команда run.py до начала работы
+COMMANDS = {
+    'worker': ['src.celery_app', 'src.tasks'],
+    'beat': ['src.celery_app', 'src.tasks'],
+    'bot': ['src.bot'],
+    'monitor': ['src.monitoring'],
+}
+
+TOP = 8
+
+
+def measure(modules):
+    """Разбор вывода -X importtime: (время процесса, число модулей, время по пакетам, общее время)"""
+    env = dict(os.environ)
+    env.setdefault('TELEGRAM_BOT_TOKEN', '123:abc')
+    env.setdefault('DATABASE_URL', 'sqlite:////tmp/bench_startup.db')
+    code = '; '.join(f'import {module}' for module in modules)
+
+    started = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', code],
+        cwd=ROOT, env=env, capture_output=True, text=True,
+    )
+    wall = time.perf_counter() - started
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+
+    count = 0
+    total_us = 0
+    by_package = defaultdict(int)
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, _, name = line[len('import time:'):].split('|')
+        count += 1
+        total_us += int(self_us)
+        by_package[name.strip().split('.')[0]] += int(self_us)
+
+    return wall, count, by_package, total_us
+
+
+def main():
+    commands = sys.argv[1:] or list(COMMANDS)
+    for command in commands:
+        wall, count, by_package, total_us = measure(COMMANDS[command])
+        print(f"{command}: {wall * 1000:.0f} мс процесс, {total_us / 1000:.0f} мс импорт, {count} модулей")
+        heaviest = sorted(by_package.items(), key=lambda item: item[1], reverse=True)[:TOP]
+        for package, self_us in heaviest:
+            print(f"  {package:<20} {self_us / 1000:>8.1f} мс")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Пиковая память и скорость разбора: дерево BeautifulSoup против потокового разбора
+
+Каждый режим запускается в отдельном процессе, чтобы пиковый RSS не смешивался;
+несколько страниц разбираются одновременно в потоках, как при параллельных проверках.
+
+Запуск: python benchmarks/bench_streaming.py [поездов на странице] [одновременных разборов]
+"""
+
+import os
+import resource
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from bench_parser_pool import DEPARTURE_DATE, build_page
+from src.parser import iter_chunks, iter_search_page, parse_search_page
+
+
+def parse_tree(page: bytes) -> int:
+    return len(parse_search_page(page, DEPARTURE_DATE))
+
+
+def parse_stream(page: bytes) -> int:
+    return sum(1 for _ in iter_search_page(iter_chunks(page), DEPARTURE_DATE))
+
+
+def run_mode(mode: str, trains: int, concurrency: int):
+    """Замер в текущем процессе (вызывается в дочернем процессе)"""
+    parse = parse_tree if mode == 'tree' else parse_stream
+    pages = [build_page(trains) for _ in range(concurrency)]
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        counts = list(executor.map(parse, pages))
+    elapsed = time.perf_counter() - started
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(f"{mode:<7} поездов: {sum(counts):6d}  время: {elapsed * 1000:8.1f} мс  "
+          f"прирост RSS: {(peak - baseline) / 1024:7.1f} МБ")
+
+
+def main():
+    trains = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+
+    if len(sys.argv) > 3:
+        run_mode(sys.argv[3], trains, concurrency)
+        return
+
+    print(f"Поездов на странице: {trains}, размер: {len(build_page(trains)) // 1024} КБ, "
+          f"одновременных разборов: {concurrency}")
+    for mode in ('tree', 'stream'):
+        subprocess.run([sys.executable, __file__, str(trains), str(concurrency), mode], check=True)
+
+
+if __name__ == '__main__':
+    main()
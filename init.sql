@@ -7,7 +7,6 @@ CREATE EXTENSION IF NOT EXISTS "uuid-ossp";
 CREATE INDEX IF NOT EXISTS idx_users_telegram_id ON users(telegram_id);
 CREATE INDEX IF NOT EXISTS idx_subscriptions_user_id ON subscriptions(user_id);
 CREATE INDEX IF NOT EXISTS idx_subscriptions_active ON subscriptions(is_active);
-CREATE INDEX IF NOT EXISTS idx_subscriptions_last_checked ON subscriptions(last_checked);
 CREATE INDEX IF NOT EXISTS idx_found_tickets_subscription_id ON found_tickets(subscription_id);
 CREATE INDEX IF NOT EXISTS idx_found_tickets_found_at ON found_tickets(found_at);
 
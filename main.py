@@ -11,7 +11,6 @@ from loguru import logger
 # Добавляем путь к src в sys.path
 sys.path.append(os.path.join(os.path.dirname(__file__), 'src'))
 
-from src.bot import main
 from src.config import settings
 
 
@@ -46,7 +45,9 @@ def main_sync():
         logger.info(f"База данных: {settings.database_url}")
         logger.info(f"Интервал проверки: {settings.check_interval_minutes} минут")
         
-        # Запускаем бота
+        # Запускаем бота (модули бота импортируются только здесь)
+        from src.bot import main
+        
         asyncio.run(main())
         
     except KeyboardInterrupt:
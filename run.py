@@ -6,6 +6,7 @@
 import sys
 import os
 import argparse
+from typing import Optional
 from loguru import logger
 
 # Добавляем путь к src в sys.path
@@ -23,12 +24,52 @@ def run_bot():
     asyncio.run(main())
 
 
-def run_celery_worker():
-    """Запуск Celery worker"""
+def run_monitor():
+    """Запуск мониторинга отдельным процессом"""
+    from src.monitoring import main
+    import asyncio
+    
+    logger.info("Запуск монитора...")
+    asyncio.run(main())
+
+
+def run_notifier():
+    """Запуск отправителя уведомлений из потока Redis"""
+    from src.notifier import main
+    import asyncio
+    
+    logger.info("Запуск отправителя уведомлений...")
+    asyncio.run(main())
+
+
+def run_replay(archive_dir: str, cycles: int):
+    """Воспроизведение архива ответов через мониторинг для замера пропускной способности"""
+    from src.replay import replay
+    import asyncio
+    import json
+    
+    logger.info(f"Воспроизведение архива {archive_dir}...")
+    result = asyncio.run(replay(archive_dir, cycles))
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+
+
+def run_scheduler():
+    """Запуск тикера расписания проверок в Redis"""
+    from src.scheduler import main
+    
+    logger.info("Запуск тикера расписания проверок...")
+    main()
+
+
+def run_celery_worker(queues: str, concurrency: Optional[int] = None):
+    """Запуск Celery worker для заданных очередей"""
     from src.celery_app import celery_app
     
-    logger.info("Запуск Celery worker...")
-    celery_app.worker_main(['worker', '--loglevel=info'])
+    logger.info(f"Запуск Celery worker (очереди: {queues})...")
+    argv = ['worker', '--loglevel=info', '--queues', queues]
+    if concurrency:
+        argv += ['--concurrency', str(concurrency)]
+    celery_app.worker_main(argv)
 
 
 def run_celery_beat():
@@ -66,8 +107,15 @@ def run_tests():
 def main():
     parser = argparse.ArgumentParser(description='RZD Bot Management Script')
     parser.add_argument('command', choices=[
-        'bot', 'worker', 'beat', 'migrate', 'create-migration', 'test'
+        'bot', 'monitor', 'worker', 'beat', 'migrate', 'create-migration', 'test', 'replay', 'notifier',
+        'scheduler'
     ], help='Команда для выполнения')
+    parser.add_argument('--archive-dir', default=settings.response_archive_dir,
+                        help='Каталог архива ответов (для replay)')
+    parser.add_argument('--cycles', type=int, default=10, help='Число циклов (для replay)')
+    parser.add_argument('--queues', default='checks,notify,maintenance',
+                        help='Очереди Celery через запятую (для worker)')
+    parser.add_argument('--concurrency', type=int, help='Число процессов Celery (для worker)')
     
     args = parser.parse_args()
     
@@ -77,8 +125,14 @@ def main():
     
     if args.command == 'bot':
         run_bot()
+    elif args.command == 'monitor':
+        run_monitor()
+    elif args.command == 'notifier':
+        run_notifier()
+    elif args.command == 'scheduler':
+        run_scheduler()
     elif args.command == 'worker':
-        run_celery_worker()
+        run_celery_worker(args.queues, args.concurrency)
     elif args.command == 'beat':
         run_celery_beat()
     elif args.command == 'migrate':
@@ -87,6 +141,10 @@ def main():
         create_migration()
     elif args.command == 'test':
         run_tests()
+    elif args.command == 'replay':
+        if not args.archive_dir:
+            parser.error('для replay нужен --archive-dir или RESPONSE_ARCHIVE_DIR')
+        run_replay(args.archive_dir, args.cycles)
 
 
 if __name__ == "__main__":
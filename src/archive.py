@@ -0,0 +1,126 @@
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Dict, Iterator, Optional
+
+from loguru import logger
+
+from src.config import settings
+
+
+class ResponseArchive:
+    """
+    Архив сырых ответов РЖД с адресацией по содержимому.
+
+    Тело ответа сжимается gzip и хранится один раз под своим SHA-256 в objects/;
+    каждый ответ добавляет строку в index.jsonl (время, маршрут, хеш).
+    При превышении лимита удаляются давно не встречавшиеся объекты,
+    а индекс очищается от строк, ссылающихся на удаленные объекты.
+    """
+
+    INDEX_FILE = 'index.jsonl'
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.objects_dir = os.path.join(directory, 'objects')
+        self.index_path = os.path.join(directory, self.INDEX_FILE)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(self.objects_dir, exist_ok=True)
+        self.total_bytes = self._disk_usage()
+
+    @classmethod
+    def from_settings(cls) -> Optional['ResponseArchive']:
+        """Архив из настроек (None, если архивирование выключено)"""
+        if not settings.response_archive_dir:
+            return None
+        return cls(settings.response_archive_dir, settings.response_archive_max_mb * 1024 * 1024)
+
+    def _object_path(self, digest: str) -> str:
+        return os.path.join(self.objects_dir, digest[:2], f"{digest}.gz")
+
+    def _disk_usage(self) -> int:
+        total = 0
+        for root, _, files in os.walk(self.directory):
+            total += sum(os.path.getsize(os.path.join(root, name)) for name in files)
+        return total
+
+    def store(self, content: bytes, meta: Dict) -> str:
+        """Сохранение ответа; возвращает хеш содержимого"""
+        digest = hashlib.sha256(content).hexdigest()
+        path = self._object_path(digest)
+        entry = {'ts': time.time(), 'sha256': digest, **meta}
+        line = json.dumps(entry, ensure_ascii=False, default=str) + '\n'
+
+        with self._lock:
+            if os.path.exists(path):
+                # Повтор уже известного ответа: только отмечаем, что он снова встретился
+                os.utime(path)
+            else:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                tmp_path = f"{path}.tmp"
+                with open(tmp_path, 'wb') as f:
+                    f.write(gzip.compress(content, compresslevel=6))
+                os.replace(tmp_path, path)
+                self.total_bytes += os.path.getsize(path)
+
+            with open(self.index_path, 'a', encoding='utf-8') as f:
+                f.write(line)
+            self.total_bytes += len(line.encode('utf-8'))
+
+            if self.total_bytes > self.max_bytes:
+                self._evict()
+
+        return digest
+
+    def load(self, digest: str) -> Optional[bytes]:
+        """Тело ответа по хешу (None, если объект вытеснен)"""
+        try:
+            with open(self._object_path(digest), 'rb') as f:
+                return gzip.decompress(f.read())
+        except FileNotFoundError:
+            return None
+
+    def entries(self) -> Iterator[Dict]:
+        """Записи индекса в порядке получения ответов"""
+        if not os.path.exists(self.index_path):
+            return
+        with open(self.index_path, encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+    def _evict(self):
+        """Удаление давно не встречавшихся объектов до 90% лимита"""
+        target = int(self.max_bytes * 0.9)
+        objects = []
+        for root, _, files in os.walk(self.objects_dir):
+            for name in files:
+                path = os.path.join(root, name)
+                stat = os.stat(path)
+                objects.append((stat.st_mtime, stat.st_size, path))
+        objects.sort()
+
+        removed = set()
+        for _, size, path in objects:
+            if self.total_bytes <= target:
+                break
+            os.remove(path)
+            self.total_bytes -= size
+            removed.add(os.path.basename(path)[:-len('.gz')])
+
+        if removed:
+            self._compact_index(removed)
+            logger.info(f"Архив ответов: вытеснено объектов {len(removed)}, занято {self.total_bytes // 1024} КБ")
+
+    def _compact_index(self, removed: set):
+        tmp_path = f"{self.index_path}.tmp"
+        with open(self.index_path, encoding='utf-8') as src, open(tmp_path, 'w', encoding='utf-8') as dst:
+            for line in src:
+                if line.strip() and json.loads(line)['sha256'] not in removed:
+                    dst.write(line)
+        os.replace(tmp_path, self.index_path)
+        self.total_bytes = self._disk_usage()
@@ -2,28 +2,48 @@ import asyncio
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, ReplyKeyboardMarkup, KeyboardButton
 from telegram.ext import Application, CommandHandler, CallbackQueryHandler, MessageHandler, filters, ContextTypes
 from telegram.constants import ParseMode
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, selectinload
 from datetime import datetime, date, timedelta
 from typing import Dict, List
 import json
 
 from src.config import settings
-from src.database import get_db, engine
+from src.database import get_db, engine, read_session
 from src.models import User, Subscription, Station, FoundTicket
-from src.scraper import RZDScraper
-from src.monitoring import MonitoringService
-from src.utils import get_seat_type_emoji, format_subscription_summary
+from src.route_watches import attach_subscription, detach_subscription
+from src.scheduler import sync_scheduled_watches
+from src.stations import station_cache
+from src.records import SEAT_CLASSES, parse_price_kopecks
+from src.utils import get_seat_type_emoji, format_subscription_summary, validate_date_range, format_date_range
+from src.utils import format_kopecks, format_max_prices
 from loguru import logger
 
 
 class RZDBot:
     def __init__(self):
         self.application = Application.builder().token(settings.telegram_bot_token).build()
-        self.scraper = RZDScraper()
-        self.monitoring = MonitoringService()
+        self._scraper = None
+        self._monitoring = None
         self.user_states = {}  # Для хранения состояний пользователей
         self.setup_handlers()
     
+    @property
+    def scraper(self):
+        """Парсер РЖД создается при первом поиске станций"""
+        if self._scraper is None:
+            from src.scraper import RZDScraper
+            self._scraper = RZDScraper()
+        return self._scraper
+    
+    @property
+    def monitoring(self):
+        """Встроенный мониторинг создается, только если он включен"""
+        if self._monitoring is None:
+            from src.event_bus import create_event_bus
+            from src.monitoring import MonitoringService
+            self._monitoring = MonitoringService(event_bus=create_event_bus())
+        return self._monitoring
+    
     def create_main_keyboard(self) -> ReplyKeyboardMarkup:
         """Создание основной клавиатуры"""
         keyboard = [
@@ -207,16 +227,18 @@ class RZDBot:
         """Обработчик команды /subscriptions"""
         user_id = update.effective_user.id
         
+        # Список читается из основной базы: подписка, созданная только что, могла не дойти до реплики
         with Session(engine) as db:
             user = db.query(User).filter(User.telegram_id == user_id).first()
             if not user:
                 await update.message.reply_text("❌ Пользователь не найден. Используйте /start для регистрации.")
                 return
             
+            # Маршруты загружаются одним запросом: время последней проверки берется из них
             subscriptions = db.query(Subscription).filter(
                 Subscription.user_id == user.id,
                 Subscription.is_active == True
-            ).all()
+            ).options(selectinload(Subscription.route_watches)).all()
             
             if not subscriptions:
                 text = """
@@ -237,20 +259,19 @@ class RZDBot:
             text = f"📋 <b>Ваши активные подписки ({len(subscriptions)}):</b>\n\n"
             
             for i, sub in enumerate(subscriptions, 1):
-                # Получаем названия станций
-                departure_station = db.query(Station).filter(Station.code == sub.departure_station).first()
-                arrival_station = db.query(Station).filter(Station.code == sub.arrival_station).first()
-                
-                departure_name = departure_station.name if departure_station else sub.departure_station
-                arrival_name = arrival_station.name if arrival_station else sub.arrival_station
+                # Названия станций из кэша каталога
+                departure_name = station_cache.display_name(db, sub.departure_station)
+                arrival_name = station_cache.display_name(db, sub.arrival_station)
                 
                 text += f"<b>{i}. 🚂 {departure_name} → {arrival_name}</b>\n"
-                text += f"📅 <b>Дата:</b> {sub.departure_date.strftime('%d.%m.%Y')}\n"
+                text += f"📅 <b>Дата:</b> {format_date_range(sub.departure_date, sub.departure_date_to)}\n"
                 if sub.train_number:
                     text += f"🚆 <b>Поезд:</b> {sub.train_number}\n"
                 if sub.seat_type:
                     emoji = get_seat_type_emoji(sub.seat_type)
                     text += f"{emoji} <b>Тип места:</b> {sub.seat_type}\n"
+                if sub.max_prices:
+                    text += f"💰 <b>Цена:</b> {format_max_prices(sub.max_prices)}\n"
                 text += f"⏰ <b>Проверка:</b> каждые {sub.check_frequency} мин\n"
                 text += f"📊 <b>Последняя проверка:</b> {sub.last_checked.strftime('%d.%m.%Y %H:%M') if sub.last_checked else 'Никогда'}\n\n"
             
@@ -325,7 +346,7 @@ class RZDBot:
         """Обработчик команды /settings"""
         user_id = update.effective_user.id
         
-        with Session(engine) as db:
+        with read_session() as db:
             user = db.query(User).filter(User.telegram_id == user_id).first()
             if not user:
                 await update.message.reply_text("❌ Пользователь не найден. Используйте /start для регистрации.")
@@ -610,7 +631,8 @@ class RZDBot:
 Шаг 3/6: Дата поездки
 
 Введите дату поездки в формате ДД.ММ.ГГГГ
-Например: 15.03.2024
+или диапазон дат ДД.ММ.ГГГГ-ДД.ММ.ГГГГ
+Например: 15.03.2024 или 15.03.2024-21.03.2024
 
 💡 Совет: Дата должна быть не раньше завтрашнего дня.
             """
@@ -634,20 +656,34 @@ class RZDBot:
     
     async def handle_departure_date(self, update: Update, text: str, state: Dict):
         """Обработка выбора даты поездки"""
-        try:
-            departure_date = datetime.strptime(text, '%d.%m.%Y').date()
-            
-            if departure_date < date.today():
-                await update.message.reply_text(
-                    "❌ Дата не может быть в прошлом. Введите корректную дату."
-                )
-                return
-            
-            state['data']['departure_date'] = departure_date
-            state['step'] = 'train_number'
-            
-            text = f"""
-✅ Дата поездки: {departure_date.strftime('%d.%m.%Y')}
+        date_range = validate_date_range(text)
+        if not date_range:
+            await update.message.reply_text(
+                "❌ Неверный формат даты. Используйте формат ДД.ММ.ГГГГ (например: 15.03.2024) "
+                "или диапазон ДД.ММ.ГГГГ-ДД.ММ.ГГГГ"
+            )
+            return
+        
+        departure_date, departure_date_to = date_range
+        
+        if departure_date < date.today():
+            await update.message.reply_text(
+                "❌ Дата не может быть в прошлом. Введите корректную дату."
+            )
+            return
+        
+        if departure_date_to and (departure_date_to - departure_date).days >= settings.max_date_range_days:
+            await update.message.reply_text(
+                f"❌ Диапазон не может быть длиннее {settings.max_date_range_days} дней."
+            )
+            return
+        
+        state['data']['departure_date'] = departure_date
+        state['data']['departure_date_to'] = departure_date_to
+        state['step'] = 'train_number'
+        
+        text = f"""
+✅ Дата поездки: {format_date_range(departure_date, departure_date_to)}
 
 Шаг 4/6: Номер поезда (опционально)
 
@@ -655,16 +691,11 @@ class RZDBot:
 Например: 001М, 002М, 003М
 
 💡 Совет: Если не знаете номер поезда, можете пропустить этот шаг.
-            """
-            
-            keyboard = [[InlineKeyboardButton("⏭ Пропустить", callback_data="skip_train_number")]]
-            reply_markup = InlineKeyboardMarkup(keyboard)
-            await update.message.reply_text(text, reply_markup=reply_markup)
-            
-        except ValueError:
-            await update.message.reply_text(
-                "❌ Неверный формат даты. Используйте формат ДД.ММ.ГГГГ (например: 15.03.2024)"
-            )
+        """
+        
+        keyboard = [[InlineKeyboardButton("⏭ Пропустить", callback_data="skip_train_number")]]
+        reply_markup = InlineKeyboardMarkup(keyboard)
+        await update.message.reply_text(text, reply_markup=reply_markup)
     
     async def handle_train_number(self, update: Update, text: str, state: Dict):
         """Обработка выбора номера поезда"""
@@ -723,6 +754,9 @@ class RZDBot:
 
 Проверять билеты каждые {query.data.split('_')[1]} минут.
 
+💰 Чтобы получать уведомления только о билетах не дороже заданной цены,
+отправьте максимальную цену в рублях (например, 3500).
+
 Создать подписку с этими параметрами?
         """
         
@@ -741,9 +775,10 @@ class RZDBot:
 📋 <b>Подтверждение подписки</b>
 
 🚂 <b>Маршрут:</b> {data['departure_station_name']} → {data['arrival_station_name']}
-📅 <b>Дата:</b> {data['departure_date'].strftime('%d.%m.%Y')}
+📅 <b>Дата:</b> {format_date_range(data['departure_date'], data.get('departure_date_to'))}
 🚆 <b>Поезд:</b> {data.get('train_number', 'Любой')}
 💺 <b>Тип места:</b> {data['seat_type']}
+💰 <b>Цена:</b> {format_max_prices(data.get('max_prices')) or 'Любая'}
 ⏰ <b>Время:</b> {data.get('time_range', 'Любое')}
 🔄 <b>Проверка:</b> каждые {data.get('frequency', 10)} минут
 
@@ -775,14 +810,19 @@ class RZDBot:
                     departure_station=data['departure_station'],
                     arrival_station=data['arrival_station'],
                     departure_date=data['departure_date'],
+                    departure_date_to=data.get('departure_date_to'),
                     train_number=data.get('train_number'),
                     seat_type=data['seat_type'],
+                    max_prices=data.get('max_prices'),
                     departure_time_range=data.get('time_range'),
                     check_frequency=data.get('frequency', 10)
                 )
                 
                 db.add(subscription)
+                watches = attach_subscription(db, subscription)
                 db.commit()
+                # Новый маршрут проверяется сразу, а не на следующем шаге планировщика
+                sync_scheduled_watches(watches)
                 
                 # Очищаем состояние
                 del self.user_states[user_id]
@@ -791,7 +831,7 @@ class RZDBot:
 ✅ <b>Подписка создана успешно!</b>
 
 🚂 <b>Маршрут:</b> {data['departure_station_name']} → {data['arrival_station_name']}
-📅 <b>Дата:</b> {data['departure_date'].strftime('%d.%m.%Y')}
+📅 <b>Дата:</b> {format_date_range(data['departure_date'], data.get('departure_date_to'))}
 🔄 <b>Проверка:</b> каждые {data.get('frequency', 10)} минут
 
 🔔 Теперь вы будете получать уведомления о появлении билетов!
@@ -852,7 +892,8 @@ class RZDBot:
 🎯 <b>Шаг 3/7: Дата поездки</b>
 
 Введите дату поездки в формате ДД.ММ.ГГГГ
-Например: 15.03.2024
+или диапазон дат ДД.ММ.ГГГГ-ДД.ММ.ГГГГ
+Например: 15.03.2024 или 15.03.2024-21.03.2024
 
 💡 Совет: Дата должна быть не раньше завтрашнего дня.
                 """
@@ -860,11 +901,49 @@ class RZDBot:
                 keyboard = self.create_cancel_keyboard()
                 await query.edit_message_text(text, reply_markup=keyboard, parse_mode=ParseMode.HTML)
     
+    def get_user_subscription(self, db: Session, telegram_id: int, subscription_id: int):
+        """Подписка пользователя по идентификатору"""
+        return db.query(Subscription).join(User).filter(
+            Subscription.id == subscription_id,
+            User.telegram_id == telegram_id
+        ).first()
+    
+    async def pause_subscription(self, query, subscription_id: int):
+        """Приостановка подписки"""
+        with Session(engine) as db:
+            subscription = self.get_user_subscription(db, query.from_user.id, subscription_id)
+            if not subscription:
+                await query.edit_message_text("❌ Подписка не найдена")
+                return
+            
+            watches = detach_subscription(db, subscription)
+            subscription.is_active = False
+            db.commit()
+            sync_scheduled_watches(watches)
+        
+        await query.edit_message_text(f"⏸️ Подписка #{subscription_id} приостановлена")
+    
+    async def delete_subscription(self, query, subscription_id: int):
+        """Удаление подписки"""
+        with Session(engine) as db:
+            subscription = self.get_user_subscription(db, query.from_user.id, subscription_id)
+            if not subscription:
+                await query.edit_message_text("❌ Подписка не найдена")
+                return
+            
+            watches = detach_subscription(db, subscription)
+            db.query(FoundTicket).filter(FoundTicket.subscription_id == subscription.id).delete()
+            db.delete(subscription)
+            db.commit()
+            sync_scheduled_watches(watches)
+        
+        await query.edit_message_text(f"🗑 Подписка #{subscription_id} удалена")
+    
     async def statistics_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Обработчик команды статистики"""
         user_id = update.effective_user.id
         
-        with Session(engine) as db:
+        with read_session() as db:
             user = db.query(User).filter(User.telegram_id == user_id).first()
             if not user:
                 await update.message.reply_text("❌ Пользователь не найден. Используйте /start для регистрации.")
@@ -958,7 +1037,7 @@ class RZDBot:
         """Показ подробной статистики"""
         user_id = query.from_user.id
         
-        with Session(engine) as db:
+        with read_session() as db:
             user = db.query(User).filter(User.telegram_id == user_id).first()
             if not user:
                 await query.edit_message_text("❌ Пользователь не найден")
@@ -990,11 +1069,8 @@ class RZDBot:
             """
             
             for sub in active_subscriptions[:5]:  # Показываем первые 5
-                departure_station = db.query(Station).filter(Station.code == sub.departure_station).first()
-                arrival_station = db.query(Station).filter(Station.code == sub.arrival_station).first()
-                
-                departure_name = departure_station.name if departure_station else sub.departure_station
-                arrival_name = arrival_station.name if arrival_station else sub.arrival_station
+                departure_name = station_cache.display_name(db, sub.departure_station)
+                arrival_name = station_cache.display_name(db, sub.arrival_station)
                 
                 sub_tickets = db.query(FoundTicket).filter(FoundTicket.subscription_id == sub.id).count()
                 
@@ -1011,9 +1087,27 @@ class RZDBot:
             await query.edit_message_text(text, reply_markup=reply_markup, parse_mode=ParseMode.HTML)
     
     async def handle_confirmation(self, update: Update, text: str, state: Dict):
-        """Обработка подтверждения создания подписки"""
-        # Этот метод вызывается только при callback query
-        pass
+        """Обработка максимальной цены, отправленной перед подтверждением подписки"""
+        # Само подтверждение приходит через callback query
+        price = parse_price_kopecks(text)
+        if not price:
+            await update.message.reply_text(
+                "❌ Не удалось распознать цену. Отправьте число в рублях, например 3500."
+            )
+            return
+        
+        seat_type = state['data'].get('seat_type')
+        seat_classes = SEAT_CLASSES if not seat_type or seat_type == 'любой' else (seat_type,)
+        state['data']['max_prices'] = {seat_class: price for seat_class in seat_classes}
+        
+        text = f"""
+✅ <b>Максимальная цена:</b> {format_kopecks(price)}
+
+Создать подписку с этими параметрами?
+        """
+        
+        keyboard = self.create_confirmation_keyboard()
+        await update.message.reply_text(text, reply_markup=keyboard, parse_mode=ParseMode.HTML)
     
     async def register_user(self, user):
         """Регистрация пользователя в базе данных"""
@@ -1035,19 +1129,21 @@ class RZDBot:
         """Запуск бота"""
         logger.info("Запуск Telegram бота...")
         
-        # Запускаем мониторинг в фоне
-        asyncio.create_task(self.monitoring.start_monitoring())
+        # Мониторинг обычно работает отдельным процессом (run.py monitor)
+        if settings.bot_embedded_monitoring:
+            asyncio.create_task(self.monitoring.start_monitoring())
         
         # Запускаем бота
         await self.application.run_polling()
 
 
-# Создаем экземпляр бота
-bot = RZDBot()
+def create_bot() -> RZDBot:
+    """Создание бота; парсер и мониторинг создаются при первом обращении"""
+    return RZDBot()
 
 # Функция для запуска
 async def main():
-    await bot.run()
+    await create_bot().run()
 
 if __name__ == "__main__":
     asyncio.run(main())
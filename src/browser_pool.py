@@ -0,0 +1,220 @@
+import os
+import threading
+import time
+from typing import List, Optional
+
+from loguru import logger
+
+from src.config import settings
+from src.metrics import metrics
+
+
+def process_tree_rss_mb(pid: int) -> float:
+    """RSS процесса и всех его потомков в МБ (Linux /proc; на других системах 0)"""
+    total_kb = 0
+    pending = [pid]
+    while pending:
+        current = pending.pop()
+        try:
+            with open(f"/proc/{current}/status") as f:
+                for line in f:
+                    if line.startswith('VmRSS:'):
+                        total_kb += int(line.split()[1])
+                        break
+            for task in os.listdir(f"/proc/{current}/task"):
+                with open(f"/proc/{current}/task/{task}/children") as f:
+                    pending.extend(int(child) for child in f.read().split())
+        except (OSError, ValueError):
+            continue
+    return total_kb / 1024
+
+
+class _Browser:
+    """Запущенный headless-браузер пула"""
+
+    def __init__(self, driver):
+        self.driver = driver
+        self.last_used = time.monotonic()
+        self.pages = 0
+
+    @property
+    def rss_mb(self) -> float:
+        service = getattr(self.driver, 'service', None)
+        process = getattr(service, 'process', None)
+        return process_tree_rss_mb(process.pid) if process else 0.0
+
+    def quit(self):
+        try:
+            self.driver.quit()
+        except Exception as e:
+            logger.warning(f"Ошибка остановки браузера: {e}")
+
+
+class BrowserPool:
+    """
+    Пул заранее запущенных headless-браузеров для страниц РЖД, которым нужен JavaScript.
+
+    fetch() берет только уже запущенный браузер: если свободного нет, запрос пропускается,
+    а запуск выполняется в фоне, поэтому запуск браузера никогда не попадает в проверку.
+    Браузер, простаивающий дольше idle_seconds, останавливается, но один всегда остается
+    запущенным; браузер, превысивший лимит памяти, перезапускается. Одновременно используется не больше max_concurrency браузеров.
+    """
+
+    def __init__(self, size: int = 1, idle_seconds: int = 600, memory_limit_mb: int = 512,
+                 max_concurrency: int = 1, page_timeout: int = 30):
+        self.size = size
+        self.idle_seconds = idle_seconds
+        self.memory_limit_mb = memory_limit_mb
+        self.page_timeout = page_timeout
+        self._idle: List[_Browser] = []
+        self._count = 0  # запущенные и запускаемые браузеры
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._stopped = threading.Event()
+        self._maintenance: Optional[threading.Thread] = None
+
+    @classmethod
+    def from_settings(cls) -> Optional['BrowserPool']:
+        """Пул из настроек (None, если браузерный запасной путь выключен)"""
+        if settings.browser_pool_size <= 0:
+            return None
+        return cls(
+            size=settings.browser_pool_size,
+            idle_seconds=settings.browser_idle_seconds,
+            memory_limit_mb=settings.browser_memory_limit_mb,
+            max_concurrency=settings.browser_max_concurrency,
+            page_timeout=settings.browser_page_timeout,
+        )
+
+    def start(self):
+        """Запуск браузеров и фоновой очистки простаивающих"""
+        self._stopped.clear()
+        self._warm_up()
+        if self._maintenance is None or not self._maintenance.is_alive():
+            self._maintenance = threading.Thread(target=self._run_maintenance, name='browser-pool', daemon=True)
+            self._maintenance.start()
+
+    def fetch(self, url: str) -> Optional[str]:
+        """
+        HTML страницы после выполнения JavaScript или None, если свободного браузера нет
+        (None - не пустая страница: вызывающий код откладывает проверку)
+        """
+        if not self._slots.acquire(timeout=self.page_timeout):
+            metrics.increment('browser_pool_busy')
+            return None
+        try:
+            with self._lock:
+                browser = self._idle.pop() if self._idle else None
+            if browser is None:
+                metrics.increment('browser_pool_cold')
+                self._warm_up()
+                return None
+
+            try:
+                html = self._render(browser, url)
+            except Exception as e:
+                logger.warning(f"Ошибка загрузки страницы в браузере: {e}")
+                self._retire(browser)
+                self._warm_up()
+                return None
+
+            if self.memory_limit_mb and browser.rss_mb > self.memory_limit_mb:
+                logger.info(f"Браузер превысил лимит памяти {self.memory_limit_mb} МБ, перезапуск")
+                self._retire(browser)
+                self._warm_up()
+            else:
+                browser.last_used = time.monotonic()
+                with self._lock:
+                    self._idle.append(browser)
+            return html
+        finally:
+            self._slots.release()
+
+    def _render(self, browser: _Browser, url: str) -> str:
+        from selenium.webdriver.support.ui import WebDriverWait
+
+        driver = browser.driver
+        driver.delete_all_cookies()
+        driver.get(url)
+        WebDriverWait(driver, self.page_timeout).until(
+            lambda d: d.execute_script('return document.readyState') == 'complete'
+        )
+        browser.pages += 1
+        metrics.increment('browser_pool_pages')
+        return driver.page_source
+
+    def _launch(self) -> _Browser:
+        from selenium import webdriver
+
+        options = webdriver.ChromeOptions()
+        for argument in ('--headless=new', '--no-sandbox', '--disable-dev-shm-usage',
+                         '--disable-gpu', '--blink-settings=imagesEnabled=false'):
+            options.add_argument(argument)
+        driver = webdriver.Chrome(options=options)
+        driver.set_page_load_timeout(self.page_timeout)
+        return _Browser(driver)
+
+    def _warm_up(self):
+        """Запуск недостающих браузеров в фоновом потоке"""
+        with self._lock:
+            missing = self.size - self._count
+            if missing <= 0 or self._stopped.is_set():
+                return
+            self._count += missing
+        threading.Thread(target=self._launch_many, args=(missing,), daemon=True).start()
+
+    def _launch_many(self, count: int):
+        for _ in range(count):
+            try:
+                browser = self._launch()
+            except Exception as e:
+                logger.error(f"Не удалось запустить браузер: {e}")
+                with self._lock:
+                    self._count -= 1
+                continue
+            with self._lock:
+                if self._stopped.is_set():
+                    self._count -= 1
+                    browser.quit()
+                    continue
+                self._idle.append(browser)
+            logger.info("Браузер запущен и добавлен в пул")
+
+    def _retire(self, browser: _Browser):
+        with self._lock:
+            self._count -= 1
+        browser.quit()
+
+    def evict_idle(self) -> int:
+        """Остановка браузеров, простаивающих дольше idle_seconds"""
+        deadline = time.monotonic() - self.idle_seconds
+        with self._lock:
+            expired = [browser for browser in self._idle if browser.last_used < deadline]
+            if expired and len(expired) == self._count:
+                # Последний браузер не останавливается: после простоя страница не ждет холодного запуска
+                expired.remove(max(expired, key=lambda browser: browser.last_used))
+            self._idle = [browser for browser in self._idle if browser not in expired]
+            self._count -= len(expired)
+        for browser in expired:
+            browser.quit()
+        if expired:
+            logger.info(f"Остановлено простаивающих браузеров: {len(expired)}")
+        return len(expired)
+
+    def _run_maintenance(self):
+        interval = max(1, min(60, self.idle_seconds // 2))
+        while not self._stopped.wait(interval):
+            self.evict_idle()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {'browsers': self._count, 'idle': len(self._idle)}
+
+    def shutdown(self):
+        """Остановка всех браузеров"""
+        self._stopped.set()
+        with self._lock:
+            browsers, self._idle = self._idle, []
+            self._count -= len(browsers)
+        for browser in browsers:
+            browser.quit()
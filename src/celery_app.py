@@ -1,4 +1,5 @@
 from celery import Celery
+from kombu import Queue
 from src.config import settings
 
 # Создаем экземпляр Celery
@@ -16,13 +17,48 @@ celery_app.conf.update(
     result_serializer='json',
     timezone='Europe/Moscow',
     enable_utc=True,
-    task_track_started=True,
+    task_track_started=False,  # лишняя запись в Redis на каждую задачу
     task_time_limit=30 * 60,  # 30 минут
     task_soft_time_limit=25 * 60,  # 25 минут
+    result_expires=60 * 60,
     worker_prefetch_multiplier=1,
     worker_max_tasks_per_child=1000,
 )
 
+# Очереди по типу нагрузки: долгое обслуживание не задерживает проверки.
+# Рекомендуемая параллельность воркеров: checks - по числу ядер (ожидание сети),
+# notify - 2-4, maintenance - 1.
+CHECKS_QUEUE = 'checks'
+NOTIFY_QUEUE = 'notify'
+MAINTENANCE_QUEUE = 'maintenance'
+
+celery_app.conf.update(
+    task_queues=(
+        Queue(CHECKS_QUEUE, routing_key=CHECKS_QUEUE),
+        Queue(NOTIFY_QUEUE, routing_key=NOTIFY_QUEUE),
+        Queue(MAINTENANCE_QUEUE, routing_key=MAINTENANCE_QUEUE),
+    ),
+    task_default_queue=MAINTENANCE_QUEUE,
+    task_routes={
+        'src.tasks.check_all_subscriptions': {'queue': CHECKS_QUEUE},
+        'src.tasks.check_route_watches_task': {'queue': CHECKS_QUEUE},
+        'src.tasks.check_specific_subscription': {'queue': CHECKS_QUEUE},
+        'src.tasks.send_notification_task': {'queue': NOTIFY_QUEUE},
+        'src.tasks.cleanup_old_tickets': {'queue': MAINTENANCE_QUEUE},
+        'src.tasks.reconcile_route_watches_task': {'queue': MAINTENANCE_QUEUE},
+        'src.tasks.downsample_price_history_task': {'queue': MAINTENANCE_QUEUE},
+        'src.tasks.update_stations_list': {'queue': MAINTENANCE_QUEUE},
+        'src.tasks.get_monitoring_statistics': {'queue': MAINTENANCE_QUEUE},
+    },
+    # Приоритеты внутри очереди; в Redis 0 - наивысший приоритет
+    broker_transport_options={
+        'priority_steps': list(range(10)),
+        'sep': ':',
+        'queue_order_strategy': 'priority',
+    },
+    task_default_priority=5,
+)
+
 # Периодические задачи
 celery_app.conf.beat_schedule = {
     'check-subscriptions': {
@@ -33,12 +69,25 @@ celery_app.conf.beat_schedule = {
         'task': 'src.tasks.cleanup_old_tickets',
         'schedule': 24 * 60 * 60.0,  # раз в день
     },
+    'reconcile-route-watches': {
+        'task': 'src.tasks.reconcile_route_watches_task',
+        'schedule': 60 * 60.0,  # раз в час
+    },
+    'downsample-price-history': {
+        'task': 'src.tasks.downsample_price_history_task',
+        'schedule': 60 * 60.0,  # раз в час
+    },
     'update-stations': {
         'task': 'src.tasks.update_stations_list',
         'schedule': 7 * 24 * 60 * 60.0,  # раз в неделю
     },
 }
 
+# Проверки ставит тикер (python run.py scheduler) или выполняют мониторы (python run.py monitor):
+# проверка из beat проверяла бы те же маршруты второй раз
+if settings.check_scheduler != 'beat':
+    celery_app.conf.beat_schedule.pop('check-subscriptions')
+
 if __name__ == '__main__':
     celery_app.start()
 
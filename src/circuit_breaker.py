@@ -0,0 +1,133 @@
+import random
+import threading
+import time
+from collections import deque
+from typing import Deque, Tuple
+
+from loguru import logger
+from src.config import settings
+
+
+class CircuitOpenError(Exception):
+    """Цепь разомкнута: запросы к РЖД временно не выполняются"""
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"Цепь разомкнута, повтор через {retry_after:.0f} с")
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """
+    Предохранитель для запросов к РЖД.
+
+    CLOSED - запросы идут, по скользящему окну считается доля ошибок и медленных ответов.
+    OPEN - запросы не выполняются до истечения паузы (экспоненциальная, со случайным разбросом).
+    HALF_OPEN - пропускается пробный запрос: успех замыкает цепь, ошибка снова размыкает.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, window_size: int = 20, min_calls: int = 5,
+                 failure_rate_threshold: float = 0.5, slow_call_seconds: float = 10.0,
+                 slow_call_rate_threshold: float = 0.5, base_backoff: float = 30.0,
+                 max_backoff: float = 900.0, half_open_max_calls: int = 1):
+        self.window_size = window_size
+        self.min_calls = min_calls
+        self.failure_rate_threshold = failure_rate_threshold
+        self.slow_call_seconds = slow_call_seconds
+        self.slow_call_rate_threshold = slow_call_rate_threshold
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.half_open_max_calls = half_open_max_calls
+
+        self.state = self.CLOSED
+        self._calls: Deque[Tuple[bool, bool]] = deque(maxlen=window_size)  # (ошибка, медленно)
+        self._consecutive_opens = 0
+        self._open_until = 0.0
+        self._half_open_calls = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_settings(cls) -> 'CircuitBreaker':
+        """Создание предохранителя с параметрами из настроек"""
+        return cls(
+            window_size=settings.circuit_breaker_window,
+            min_calls=settings.circuit_breaker_min_calls,
+            failure_rate_threshold=settings.circuit_breaker_failure_rate,
+            slow_call_seconds=settings.circuit_breaker_slow_call_seconds,
+            slow_call_rate_threshold=settings.circuit_breaker_slow_call_rate,
+            base_backoff=settings.circuit_breaker_base_backoff,
+            max_backoff=settings.circuit_breaker_max_backoff,
+        )
+
+    def before_call(self):
+        """Разрешение на запрос; при разомкнутой цепи выбрасывает CircuitOpenError"""
+        with self._lock:
+            if self.state == self.OPEN:
+                remaining = self._open_until - time.monotonic()
+                if remaining > 0:
+                    raise CircuitOpenError(remaining)
+                self.state = self.HALF_OPEN
+                self._half_open_calls = 0
+                logger.info("Предохранитель РЖД: пробный запрос")
+
+            if self.state == self.HALF_OPEN:
+                if self._half_open_calls >= self.half_open_max_calls:
+                    raise CircuitOpenError(self.base_backoff)
+                self._half_open_calls += 1
+
+    def record_success(self, duration: float):
+        """Учет успешного запроса"""
+        slow = duration >= self.slow_call_seconds
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                if slow:
+                    self._open()
+                else:
+                    self._close()
+                return
+            self._calls.append((False, slow))
+            self._evaluate()
+
+    def record_failure(self, duration: float):
+        """Учет неудачного запроса"""
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                self._open()
+                return
+            self._calls.append((True, duration >= self.slow_call_seconds))
+            self._evaluate()
+
+    def retry_after(self) -> float:
+        """Сколько секунд осталось до следующей попытки (0, если запросы разрешены)"""
+        with self._lock:
+            if self.state != self.OPEN:
+                return 0.0
+            return max(0.0, self._open_until - time.monotonic())
+
+    def _evaluate(self):
+        if self.state != self.CLOSED or len(self._calls) < self.min_calls:
+            return
+        total = len(self._calls)
+        failures = sum(1 for failed, _ in self._calls if failed)
+        slow = sum(1 for _, is_slow in self._calls if is_slow)
+        if failures / total >= self.failure_rate_threshold or slow / total >= self.slow_call_rate_threshold:
+            self._open()
+
+    def _open(self):
+        self._consecutive_opens += 1
+        backoff = min(self.max_backoff, self.base_backoff * 2 ** (self._consecutive_opens - 1))
+        # Половина паузы фиксирована, половина случайна, чтобы экземпляры не били в РЖД синхронно
+        delay = backoff / 2 + random.uniform(0, backoff / 2)
+        self.state = self.OPEN
+        self._open_until = time.monotonic() + delay
+        self._calls.clear()
+        logger.warning(f"Предохранитель РЖД разомкнут на {delay:.0f} с (попытка {self._consecutive_opens})")
+
+    def _close(self):
+        self.state = self.CLOSED
+        self._consecutive_opens = 0
+        self._calls.clear()
+        logger.info("Предохранитель РЖД замкнут")
@@ -9,16 +9,101 @@ class Settings(BaseSettings):
     
     # Database
     database_url: str
+    database_replica_urls: Optional[str] = None  # реплики для чтения через запятую
+    replica_max_lag_seconds: float = 5  # при большем отставании чтение идет в основную базу
+    replica_lag_check_seconds: float = 5
+    replica_connect_timeout_seconds: int = 2
     redis_url: str = "redis://localhost:6379/0"
     
     # RZD Settings
     rzd_base_url: str = "https://pass.rzd.ru"
     scraping_delay: int = 5
     max_concurrent_requests: int = 3
+    parser_pool_size: int = 0  # процессов разбора страниц: 0 - в текущем процессе, -1 - по числу ядер
+    parser_streaming: bool = False  # потоковый разбор по блокам поездов (только при parser_pool_size = 0)
+    http_validator_cache_size: int = 2048  # URL с сохраненными ETag/Last-Modified
+    station_sync_page_size: int = 500
+    station_sync_max_drop: float = 0.2  # доля станций, при потере которой каталог считается неполным
+    station_cache_check_seconds: int = 60  # как часто кэш станций сверяет версию каталога
+    
+    # Browser fallback
+    browser_pool_size: int = 0  # headless-браузеров для страниц с JavaScript; 0 - выключено
+    browser_idle_seconds: int = 600
+    browser_memory_limit_mb: int = 512
+    browser_max_concurrency: int = 1
+    browser_page_timeout: int = 30
+    browser_empty_backoff_seconds: int = 1800  # пауза браузера для маршрута, пустого и в браузере
+    browser_empty_backoff_max_seconds: int = 21600
+    
+    # Response archive
+    response_archive_dir: Optional[str] = None  # None - сырые ответы не сохраняются
+    response_archive_max_mb: int = 512
+    
+    # Circuit breaker
+    circuit_breaker_window: int = 20
+    circuit_breaker_min_calls: int = 5
+    circuit_breaker_failure_rate: float = 0.5
+    circuit_breaker_slow_call_seconds: float = 10.0
+    circuit_breaker_slow_call_rate: float = 0.5
+    circuit_breaker_base_backoff: int = 30  # секунды
+    circuit_breaker_max_backoff: int = 900  # секунды
     
     # Monitoring
     check_interval_minutes: int = 10
     max_subscriptions_per_user: int = 5
+    max_date_range_days: int = 14
+    notification_render_cache_size: int = 1024
+    notification_digest_window_seconds: int = 60
+    
+    # Monitor workers
+    bot_embedded_monitoring: bool = False  # запускать мониторинг внутри процесса бота
+    monitor_instance_id: Optional[str] = None
+    monitor_lease_ttl_seconds: int = 30
+    monitor_ring_replicas: int = 64
+    
+    # Notifier
+    notification_transport: str = "direct"  # direct - отправляет монитор, stream - через поток Redis
+    notifier_stream: str = "rzd:tickets_found"
+    notifier_group: str = "notifiers"
+    notifier_consumer: Optional[str] = None
+    notifier_batch_size: int = 100
+    notifier_block_ms: int = 5000
+    notifier_claim_idle_seconds: int = 300
+    notifier_stream_maxlen: int = 100000
+    notifier_dedup_ttl_seconds: int = 604800  # ключи доставленных уведомлений хранятся неделю
+    
+    # Price history
+    price_history_enabled: bool = True
+    price_history_raw_days: int = 7  # точки каждой проверки, затем почасовые
+    price_history_hourly_days: int = 90  # почасовые точки, затем посуточные
+    price_history_retention_days: int = 365  # ряды после даты отправления
+    price_history_downsample_batch: int = 1000
+    
+    # Outbox
+    outbox_batch_size: int = 500
+    outbox_lease_seconds: int = 120
+    outbox_retry_base_seconds: int = 30
+    outbox_max_attempts: int = 10
+    outbox_retention_days: int = 7
+    
+    # Scheduler
+    # beat - шаг check_interval_minutes, redis - тикер по расписанию в Redis,
+    # monitor - отдельные мониторы (python run.py monitor); проверяет только выбранный способ
+    check_scheduler: str = "beat"
+    scheduler_key: str = "rzd:route_schedule"
+    scheduler_tick_seconds: float = 1.0
+    scheduler_batch_size: int = 20  # маршрутов в одной задаче проверки
+    scheduler_lease_seconds: int = 300  # повтор проверки, если задача не отчиталась
+    scheduler_inflight_seconds: int = 1800  # маршрут в очереди не ставится повторно (лимит задачи Celery)
+    scheduler_rebuild_seconds: int = 300  # полная сверка расписания с базой
+    
+    # Load planner
+    # проверки по фазам маршрутов вместо всплеска раз в интервал (при CHECK_SCHEDULER monitor или redis)
+    load_planner_enabled: bool = True
+    load_planner_refresh_seconds: int = 60
+    
+    # Celery
+    celery_progress_interval_seconds: float = 5  # не чаще записи прогресса проверки в Redis
     
     # Logging
     log_level: str = "INFO"
@@ -1,6 +1,13 @@
-from sqlalchemy import create_engine, MetaData
+import itertools
+import threading
+import time
+from typing import List, Optional
+
+from loguru import logger
+from sqlalchemy import create_engine, MetaData, text
+from sqlalchemy.engine import Engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
 from src.config import settings
 
 engine = create_engine(settings.database_url)
@@ -14,3 +21,94 @@ def get_db():
     finally:
         db.close()
 
+
+# Отставание реплики в секундах; реплика, применившая весь полученный WAL, не отстает
+REPLICA_LAG_QUERY = text(
+    "SELECT CASE WHEN NOT pg_is_in_recovery() THEN 0 "
+    "WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END"
+)
+
+
+class _Replica:
+    def __init__(self, replica_engine: Engine):
+        self.engine = replica_engine
+        self.lag: Optional[float] = None  # None - реплика недоступна или еще не проверена
+        self.checked_at = 0.0
+
+
+class ReplicaRouter:
+    """
+    Выбор движка для чтения: реплики по кругу, если их отставание не больше max_lag_seconds,
+    иначе основная база. Отставание проверяет фоновый поток раз в check_seconds, поэтому
+    выбор движка не ждет сети и не блокирует цикл событий бота; недоступная реплика
+    пропускается до следующей проверки. Запись всегда идет в основную базу.
+    """
+
+    def __init__(self, primary: Engine, replica_urls: List[str], max_lag_seconds: float = 5,
+                 check_seconds: float = 5, connect_timeout: int = 2):
+        self.primary = primary
+        # Короткий таймаут подключения: недоступная реплика не держит проверку на время таймаута ОС
+        self.replicas = [
+            _Replica(create_engine(url, pool_pre_ping=True, connect_args={'connect_timeout': connect_timeout}))
+            for url in replica_urls
+        ]
+        self.max_lag_seconds = max_lag_seconds
+        self.check_seconds = check_seconds
+        self._order = itertools.cycle(range(len(self.replicas))) if self.replicas else None
+        self._lock = threading.Lock()
+        self._prober: Optional[threading.Thread] = None
+
+    @classmethod
+    def from_settings(cls, primary: Engine) -> 'ReplicaRouter':
+        urls = [url.strip() for url in (settings.database_replica_urls or '').split(',') if url.strip()]
+        return cls(primary, urls, settings.replica_max_lag_seconds, settings.replica_lag_check_seconds,
+                   settings.replica_connect_timeout_seconds)
+
+    def read_engine(self) -> Engine:
+        """Реплика с допустимым отставанием или основная база (до первой проверки - основная)"""
+        if not self.replicas:
+            return self.primary
+        self._start_prober()
+        for _ in range(len(self.replicas)):
+            with self._lock:
+                replica = self.replicas[next(self._order)]
+            if replica.lag is not None and replica.lag <= self.max_lag_seconds:
+                return replica.engine
+        return self.primary
+
+    def _start_prober(self):
+        with self._lock:
+            if self._prober is None:
+                self._prober = threading.Thread(target=self._probe_forever, name='replica-lag', daemon=True)
+                self._prober.start()
+
+    def _probe_forever(self):
+        while True:
+            for replica in self.replicas:
+                self.probe(replica)
+            time.sleep(self.check_seconds)
+
+    def probe(self, replica: _Replica):
+        """Проверка отставания реплики"""
+        first = not replica.checked_at
+        replica.checked_at = time.monotonic()
+        try:
+            with replica.engine.connect() as connection:
+                replica.lag = float(connection.execute(REPLICA_LAG_QUERY).scalar() or 0)
+        except Exception as e:
+            # Предупреждение - при первой проверке и при переходе из доступных, а не каждые check_seconds
+            if first or replica.lag is not None:
+                logger.warning(f"Реплика {replica.engine.url.host} недоступна, чтение из основной базы: {e}")
+            replica.lag = None
+
+    def status(self) -> List[dict]:
+        return [{'host': replica.engine.url.host, 'lag': replica.lag} for replica in self.replicas]
+
+
+replica_router = ReplicaRouter.from_settings(engine)
+
+
+def read_session() -> Session:
+    """Сессия только для чтения (представления бота, статистика): реплика, если она не отстает"""
+    return Session(replica_router.read_engine())
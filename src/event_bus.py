@@ -0,0 +1,149 @@
+import json
+import os
+import socket
+from typing import Dict, List, Optional, Set, Tuple
+
+from loguru import logger
+
+from src.config import settings
+
+
+# Запись потока: (идентификатор, событие)
+StreamEntry = Tuple[str, Dict]
+
+
+def _decode(value):
+    return value.decode() if isinstance(value, bytes) else value
+
+
+class TicketEventBus:
+    """
+    Поток событий "найден билет" в Redis Streams между монитором и отправителем уведомлений.
+
+    Монитор добавляет события (XADD), отправители читают их в общей группе потребителей
+    (XREADGROUP) и подтверждают после отправки (XACK). События упавшего отправителя остаются
+    в списке ожидающих и забираются другими через XAUTOCLAIM.
+    """
+
+    def __init__(self, redis_client, stream: str = 'rzd:tickets_found', group: str = 'notifiers',
+                 maxlen: int = 100000):
+        self.redis = redis_client
+        self.stream = stream
+        self.group = group
+        self.maxlen = maxlen
+        self._group_ready = False
+
+    @classmethod
+    def from_settings(cls, redis_client) -> 'TicketEventBus':
+        return cls(
+            redis_client,
+            stream=settings.notifier_stream,
+            group=settings.notifier_group,
+            maxlen=settings.notifier_stream_maxlen,
+        )
+
+    @staticmethod
+    def default_consumer_name() -> str:
+        return f"{socket.gethostname()}:{os.getpid()}"
+
+    async def publish(self, event: Dict) -> str:
+        """Публикация события; поток обрезается примерно до maxlen записей"""
+        entry_id = await self.redis.xadd(
+            self.stream,
+            {'event': json.dumps(event, ensure_ascii=False, default=str)},
+            maxlen=self.maxlen,
+            approximate=True,
+        )
+        return _decode(entry_id)
+
+    async def ensure_group(self):
+        """Создание группы потребителей (и потока), если их еще нет"""
+        if self._group_ready:
+            return
+        try:
+            await self.redis.xgroup_create(self.stream, self.group, id='0', mkstream=True)
+            logger.info(f"Создана группа {self.group} потока {self.stream}")
+        except Exception as e:
+            if 'BUSYGROUP' not in str(e):
+                raise
+        self._group_ready = True
+
+    async def read(self, consumer: str, count: int = 100, block_ms: int = 5000) -> List[StreamEntry]:
+        """Новые события для потребителя группы"""
+        await self.ensure_group()
+        response = await self.redis.xreadgroup(
+            self.group, consumer, {self.stream: '>'}, count=count, block=block_ms
+        )
+        entries = []
+        for _, stream_entries in response or []:
+            entries.extend(self._parse(stream_entries))
+        return entries
+
+    async def reclaim(self, consumer: str, min_idle_ms: int, count: int = 100) -> List[StreamEntry]:
+        """Ожидающие события, которые другие потребители не подтвердили дольше min_idle_ms"""
+        await self.ensure_group()
+        claimed = []
+        start_id = '0-0'
+        while len(claimed) < count:
+            response = await self.redis.xautoclaim(
+                self.stream, self.group, consumer, min_idle_ms, start_id, count=count - len(claimed)
+            )
+            start_id, entries = _decode(response[0]), response[1]
+            claimed.extend(self._parse(entries))
+            if start_id == '0-0':
+                break
+        return claimed
+
+    async def ack(self, entry_ids: List[str]):
+        if entry_ids:
+            await self.redis.xack(self.stream, self.group, *entry_ids)
+
+    def _delivered_key(self, idempotency_key: str) -> str:
+        return f"{self.stream}:delivered:{idempotency_key}"
+
+    async def delivered_keys(self, idempotency_keys: List[str]) -> Set[str]:
+        """Ключи идемпотентности, события которых уже доставлены"""
+        if not idempotency_keys:
+            return set()
+        values = await self.redis.mget([self._delivered_key(key) for key in idempotency_keys])
+        return {key for key, value in zip(idempotency_keys, values) if value is not None}
+
+    async def mark_delivered(self, idempotency_keys: List[str], ttl_seconds: int):
+        """Отметка доставки: повторная публикация того же события будет отброшена"""
+        if not idempotency_keys:
+            return
+        pipeline = self.redis.pipeline()
+        for key in idempotency_keys:
+            pipeline.set(self._delivered_key(key), 1, ex=ttl_seconds)
+        await pipeline.execute()
+
+    async def depth(self) -> Dict:
+        """Глубина очереди: длина потока, ожидающие подтверждения и непрочитанные события"""
+        await self.ensure_group()
+        length = await self.redis.xlen(self.stream)
+        pending = await self.redis.xpending(self.stream, self.group)
+        lag = None
+        for group in await self.redis.xinfo_groups(self.stream):
+            if _decode(group.get('name')) == self.group:
+                lag = group.get('lag')  # Redis 7+
+        return {'length': length, 'pending': pending.get('pending', 0), 'lag': lag}
+
+    @staticmethod
+    def _parse(entries) -> List[StreamEntry]:
+        parsed = []
+        for entry_id, fields in entries:
+            # Запись, удаленная обрезкой потока, приходит без полей
+            if not fields:
+                continue
+            raw = fields.get(b'event') or fields.get('event')
+            parsed.append((_decode(entry_id), json.loads(_decode(raw))))
+        return parsed
+
+
+def create_event_bus() -> Optional[TicketEventBus]:
+    """Шина событий, если уведомления передаются через поток Redis"""
+    if settings.notification_transport != 'stream':
+        return None
+    from redis import asyncio as aioredis
+
+    return TicketEventBus.from_settings(aioredis.from_url(settings.redis_url))
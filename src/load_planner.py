@@ -0,0 +1,155 @@
+import hashlib
+import math
+import time
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from src.config import settings
+from src.models import RouteWatch
+from src.sharding import route_shard_key
+from src.utils import RouteKey
+
+
+def route_hash(route_key: RouteKey) -> int:
+    """Детерминированный хеш маршрута: порядок маршрутов не зависит от процесса и перезапуска"""
+    return int.from_bytes(hashlib.md5(route_shard_key(route_key).encode('utf-8')).digest()[:8], 'big')
+
+
+def period_seconds(check_frequency: Optional[int]) -> int:
+    return (check_frequency or settings.check_interval_minutes) * 60
+
+
+class LoadPlanner:
+    """
+    Равномерное распределение проверок по интервалу вместо всплеска раз в интервал.
+
+    Маршруты с одинаковой частотой упорядочиваются по хешу и получают фазы
+    0, P/n, 2P/n, ... внутри периода P; проверка маршрута назначается на ближайший слот
+    своей фазы, не позже чем через период после предыдущей проверки. Новый маршрут сдвигает
+    фазы остальных пропорционально, поэтому нагрузка выравнивается при каждом пересчете.
+    """
+
+    def __init__(self, refresh_seconds: float = 60):
+        self.refresh_seconds = refresh_seconds
+        self.phases: Dict[int, float] = {}  # id маршрута -> фаза в секундах
+        self.periods: Dict[int, int] = {}
+        self._refreshed_at = 0.0
+
+    def plan(self, routes: Iterable[Tuple[int, RouteKey, Optional[int]]]):
+        """Фазы маршрутов: (id, ключ маршрута, частота в минутах)"""
+        groups: Dict[int, List[Tuple[int, int]]] = {}
+        for watch_id, route_key, check_frequency in routes:
+            groups.setdefault(period_seconds(check_frequency), []).append((route_hash(route_key), watch_id))
+
+        self.phases, self.periods = {}, {}
+        for period, members in groups.items():
+            members.sort()
+            step = period / len(members)
+            for rank, (_, watch_id) in enumerate(members):
+                self.phases[watch_id] = rank * step
+                self.periods[watch_id] = period
+
+    def refresh(self, db: Session, force: bool = False):
+        """Пересчет фаз по активным маршрутам (не чаще раза в refresh_seconds)"""
+        if not force and time.monotonic() - self._refreshed_at < self.refresh_seconds:
+            return
+        rows = db.query(
+            RouteWatch.id, RouteWatch.departure_station, RouteWatch.arrival_station,
+            RouteWatch.departure_date, RouteWatch.check_frequency
+        ).filter(RouteWatch.is_active == True).all()
+        self.plan(
+            (watch_id, RouteKey(departure_station, arrival_station, departure_date), check_frequency)
+            for watch_id, departure_station, arrival_station, departure_date, check_frequency in rows
+        )
+        self._refreshed_at = time.monotonic()
+
+    def phase(self, watch: RouteWatch) -> float:
+        period = period_seconds(watch.check_frequency)
+        if self.periods.get(watch.id) == period:
+            return self.phases[watch.id]
+        # Маршрут еще не попал в план: фаза по хешу до следующего пересчета
+        return route_hash(watch.route_key) % period
+
+    def next_check_at(self, watch: RouteWatch, now: datetime, last_checked: Optional[datetime] = None) -> datetime:
+        """
+        Слот фазы маршрута: последний слот не позже last_checked + период
+        (если он уже прошел - первый слот после now). Если слот ближе половины периода
+        к последней проверке, проверка назначается на last_checked + период: маршрут,
+        проверенный перед своим слотом или после паузы предохранителя, не проверяется
+        повторно через несколько секунд, но и не ждет дольше периода.
+        """
+        period = period_seconds(watch.check_frequency)
+        phase = self.phase(watch)
+        now_ts = now.timestamp()
+        checked_ts = (last_checked or now).timestamp()
+        target = checked_ts + period
+
+        slot = phase + math.floor((target - phase) / period) * period
+        if slot <= now_ts:
+            slot += math.ceil((now_ts - slot) / period) * period
+            if slot <= now_ts:
+                slot += period
+        if slot - checked_ts < period / 2:
+            # Следующий слот фазы дальше периода от проверки; к фазе маршрут вернется в следующий раз
+            slot = target
+        return datetime.fromtimestamp(slot)
+
+    def rebalance(self, db: Session, now: Optional[datetime] = None) -> List[RouteWatch]:
+        """
+        Перенос запланированных проверок активных маршрутов на слоты нового плана;
+        возвращает измененные маршруты (коммит остается за вызывающим кодом)
+        """
+        now = now or datetime.now()
+        self.refresh(db, force=True)
+        changed = []
+        watches = db.query(RouteWatch).filter(
+            RouteWatch.is_active == True,
+            RouteWatch.next_check_at != None
+        ).all()
+        for watch in watches:
+            planned = self.next_check_at(watch, now, watch.last_checked)
+            if abs(planned.timestamp() - watch.next_check_at.timestamp()) >= 1:
+                watch.next_check_at = planned
+                changed.append(watch)
+        return changed
+
+    def predicted_rps(self, bucket_seconds: int = 1) -> List[int]:
+        """
+        Ожидаемое число проверок в каждую секунду (или bucket_seconds) на горизонте
+        наибольшего периода плана (не больше часа)
+        """
+        if not self.phases:
+            return []
+        horizon = min(max(self.periods.values()), 3600)
+        counts = [0] * math.ceil(horizon / bucket_seconds)
+        for watch_id, phase in self.phases.items():
+            period = self.periods[watch_id]
+            moment = phase % period
+            while moment < horizon:
+                counts[int(moment // bucket_seconds)] += 1
+                moment += period
+        return counts
+
+    def load_report(self) -> Dict:
+        """Пик и среднее ожидаемой нагрузки; без плана все маршруты приходятся на один шаг"""
+        curve = self.predicted_rps()
+        if not curve:
+            return {'routes': 0, 'peak_rps': 0, 'mean_rps': 0.0, 'unplanned_peak_rps': 0}
+        return {
+            'routes': len(self.phases),
+            'peak_rps': max(curve),
+            'mean_rps': round(sum(curve) / len(curve), 3),
+            'unplanned_peak_rps': len(self.phases),
+        }
+
+
+def create_load_planner() -> Optional[LoadPlanner]:
+    """
+    План нагрузки, если его соблюдают: мониторы и тикер Redis проверяют маршрут в его слот,
+    а beat раз в интервал проверяет все наступившие маршруты одним всплеском
+    """
+    if not settings.load_planner_enabled or settings.check_scheduler == 'beat':
+        return None
+    return LoadPlanner(settings.load_planner_refresh_seconds)
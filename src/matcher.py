@@ -0,0 +1,143 @@
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from src.models import Subscription
+from src.records import SEAT_CLASS_BITS, Train
+from src.utils import FULL_DAY, get_time_window
+
+
+ANY_SEAT_CLASS = 0
+# Бит за пределами известных классов: ни у одного поезда его нет, поэтому подписка
+# с нераспознанным типом мест не совпадает ни с чем, а не с любым классом
+UNKNOWN_SEAT_CLASS = 1 << len(SEAT_CLASS_BITS)
+
+
+def seat_class_mask(seat_type: Optional[str]) -> int:
+    """Маска классов мест подписки (0 - подходит любой класс)"""
+    if not seat_type or seat_type.lower() == 'любой':
+        return ANY_SEAT_CLASS
+    seat_type = seat_type.lower()
+    mask = 0
+    for name, bit in SEAT_CLASS_BITS.items():
+        if seat_type in name:
+            mask |= bit
+    return mask or UNKNOWN_SEAT_CLASS
+
+
+def normalize_train_number(train_number: Optional[str]) -> Optional[str]:
+    """Номер поезда в едином виде для сравнения"""
+    if not train_number:
+        return None
+    return train_number.strip().upper()
+
+
+# Ограничения цены: ((бит класса мест, максимальная цена в копейках), ...)
+PriceLimits = Tuple[Tuple[int, int], ...]
+
+
+def price_limits(max_prices: Optional[Dict[str, int]]) -> PriceLimits:
+    """Ограничения цены подписки в виде, пригодном для ключа группы (неизвестные классы отбрасываются)"""
+    if not max_prices:
+        return ()
+    return tuple(sorted(
+        (SEAT_CLASS_BITS[name.lower()], int(price))
+        for name, price in max_prices.items()
+        if name.lower() in SEAT_CLASS_BITS and price is not None
+    ))
+
+
+def has_seats_within_limits(train: Train, mask: int, limits: PriceLimits) -> bool:
+    """
+    Есть ли у поезда места подходящего класса по допустимой цене. Класс без ограничения
+    подходит при любой цене; класс с ограничением и нераспознанной ценой не подходит.
+    """
+    for seat in train.seats:
+        if seat.count <= 0 or (mask and not mask & seat.bit):
+            continue
+        limit = next((price for bit, price in limits if bit == seat.bit), None)
+        if limit is None or (seat.price is not None and seat.price <= limit):
+            return True
+    return False
+
+
+# Ключ группы: (маска классов мест, окно времени отправления, ограничения цены)
+PredicateKey = Tuple[int, Tuple[int, int], PriceLimits]
+
+
+class RouteMatcher:
+    """
+    Подписки одного маршрута, скомпилированные в индекс:
+    номер поезда -> (маска классов мест, окно времени, ограничения цены) -> подписки.
+
+    Предикат вычисляется один раз на группу, а не на каждую подписку,
+    поэтому проход по поездам не зависит от числа подписчиков с одинаковыми условиями.
+    """
+
+    def __init__(self, subscriptions: Iterable[Subscription]):
+        self.index: Dict[Optional[str], Dict[PredicateKey, List[Subscription]]] = {}
+        for subscription in subscriptions:
+            key = (
+                seat_class_mask(subscription.seat_type),
+                get_time_window(subscription.departure_time_range),
+                price_limits(subscription.max_prices),
+            )
+            by_predicate = self.index.setdefault(normalize_train_number(subscription.train_number), {})
+            by_predicate.setdefault(key, []).append(subscription)
+
+    def match(self, trains: Iterable[Train]) -> List[Tuple[Subscription, Train]]:
+        """Пары (подписка, поезд) для всех совпадений результата поиска"""
+        matches = []
+        any_train = self.index.get(None, {})
+
+        for train in trains:
+            seats_mask = train.seat_mask
+            if not seats_mask:
+                continue
+            departure_minutes = train.departure_minutes
+
+            # Номер поезда нормализован парсером
+            by_number = self.index.get(train.train_number, {}) if train.train_number else {}
+            for groups in (by_number, any_train):
+                for (mask, (window_start, window_end), limits), subscriptions in groups.items():
+                    if mask and not mask & seats_mask:
+                        continue
+                    # Поезд без распознанного времени не отбрасываем
+                    if departure_minutes is not None and not window_start <= departure_minutes < window_end:
+                        continue
+                    # Цены сравниваются в копейках, как их разобрал парсер
+                    if limits and not has_seats_within_limits(train, mask, limits):
+                        continue
+                    matches.extend((subscription, train) for subscription in subscriptions)
+
+        return matches
+
+
+class RouteQuery(NamedTuple):
+    """Фильтры, которые можно передать в запрос к РЖД для всех подписок маршрута"""
+    time_from: str
+    time_to: str
+    train_number: Optional[str]
+
+
+def format_minutes(minutes: int) -> str:
+    """Минуты от начала суток в формате ЧЧ:ММ (конец суток - 23:59)"""
+    minutes = min(minutes, FULL_DAY[1] - 1)
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+
+def build_route_query(subscriptions: Iterable[Subscription]) -> RouteQuery:
+    """
+    Объединение фильтров подписок маршрута в один запрос: окно времени - наименьший
+    интервал, покрывающий окна всех подписок; номер поезда - только если он общий для всех
+    """
+    window_start, window_end = FULL_DAY[1], FULL_DAY[0]
+    train_numbers = set()
+    for subscription in subscriptions:
+        start, end = get_time_window(subscription.departure_time_range)
+        window_start, window_end = min(window_start, start), max(window_end, end)
+        train_numbers.add(normalize_train_number(subscription.train_number))
+
+    if window_start >= window_end:
+        window_start, window_end = FULL_DAY
+
+    train_number = train_numbers.pop() if len(train_numbers) == 1 else None
+    return RouteQuery(format_minutes(window_start), format_minutes(window_end), train_number)
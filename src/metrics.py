@@ -0,0 +1,78 @@
+import threading
+from typing import Dict, Optional
+
+
+class Summary:
+    """Сводка наблюдений: количество, сумма, минимум, максимум, последнее значение"""
+
+    __slots__ = ('count', 'total', 'min', 'max', 'last')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+        self.last = None
+
+    def observe(self, value: float):
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+        self.last = value
+
+    def to_dict(self) -> Dict:
+        return {
+            'count': self.count,
+            'sum': self.total,
+            'avg': self.total / self.count if self.count else None,
+            'min': self.min,
+            'max': self.max,
+            'last': self.last,
+        }
+
+
+class MetricsRegistry:
+    """Метрики процесса: счетчики и сводки по имени"""
+
+    def __init__(self):
+        self._counters: Dict[str, float] = {}
+        self._summaries: Dict[str, Summary] = {}
+        self._lock = threading.Lock()
+
+    def increment(self, name: str, value: float = 1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def observe(self, name: str, value: float):
+        with self._lock:
+            summary = self._summaries.get(name)
+            if summary is None:
+                summary = self._summaries[name] = Summary()
+            summary.observe(value)
+
+    def counter(self, name: str) -> float:
+        with self._lock:
+            return self._counters.get(name, 0)
+
+    def hit_ratio(self, hits: str, misses: str) -> Optional[float]:
+        """Доля попаданий по двум счетчикам (None, пока не было ни одного обращения)"""
+        with self._lock:
+            hit_count = self._counters.get(hits, 0)
+            total = hit_count + self._counters.get(misses, 0)
+        return hit_count / total if total else None
+
+    def snapshot(self) -> Dict:
+        """Текущие значения всех метрик"""
+        with self._lock:
+            result = dict(self._counters)
+            result.update({name: summary.to_dict() for name, summary in self._summaries.items()})
+            return result
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._summaries.clear()
+
+
+metrics = MetricsRegistry()
@@ -1,7 +1,10 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, Date, ForeignKey, JSON, BigInteger
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, Date, ForeignKey, JSON, BigInteger, Table, Text, UniqueConstraint, Index, LargeBinary
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
+from datetime import date, datetime
+from typing import List, Optional
 from src.database import Base
+from src.utils import expand_date_range, RouteKey
 
 
 class User(Base):
@@ -25,6 +28,55 @@ class Station(Base):
     name = Column(String(255), nullable=False)
     region = Column(String(100))
     is_active = Column(Boolean, default=True)
+    catalog_version = Column(Integer, index=True)  # версия каталога, в которой станция была последний раз
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+
+class StationCatalogVersion(Base):
+    """Версия каталога станций: одна запись на каждую синхронизацию"""
+    __tablename__ = "station_catalog_versions"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    started_at = Column(DateTime(timezone=True), server_default=func.now())
+    completed_at = Column(DateTime(timezone=True))
+    station_count = Column(Integer, default=0)
+    deactivated_count = Column(Integer, default=0)
+
+
+# Связь подписок с маршрутами: подписка на диапазон дат ссылается на несколько маршрутов
+subscription_route_watches = Table(
+    "subscription_route_watches",
+    Base.metadata,
+    Column("subscription_id", Integer, ForeignKey("subscriptions.id", ondelete="CASCADE"), primary_key=True),
+    Column("route_watch_id", Integer, ForeignKey("route_watches.id", ondelete="CASCADE"), primary_key=True, index=True),
+)
+
+
+class RouteWatch(Base):
+    """Отслеживаемый маршрут на дату: один запрос к РЖД на всех подписчиков"""
+    __tablename__ = "route_watches"
+    __table_args__ = (
+        UniqueConstraint("departure_station", "arrival_station", "departure_date", name="uq_route_watches_route"),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    departure_station = Column(String(10), nullable=False)
+    arrival_station = Column(String(10), nullable=False)
+    departure_date = Column(Date, nullable=False)
+    subscriber_count = Column(Integer, default=0, nullable=False)
+    is_active = Column(Boolean, default=True)
+    check_frequency = Column(Integer, default=10)  # минуты, минимальная среди подписчиков
+    next_check_at = Column(DateTime(timezone=True), index=True)
+    last_checked = Column(DateTime(timezone=True))
+    last_result_hash = Column(String(64))
+    last_snapshot = Column(JSON)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    
+    subscriptions = relationship("Subscription", secondary=subscription_route_watches, back_populates="route_watches")
+    
+    @property
+    def route_key(self) -> RouteKey:
+        return RouteKey(self.departure_station, self.arrival_station, self.departure_date)
 
 
 class Subscription(Base):
@@ -35,24 +87,42 @@ class Subscription(Base):
     departure_station = Column(String(10), nullable=False)
     arrival_station = Column(String(10), nullable=False)
     departure_date = Column(Date, nullable=False)
+    departure_date_to = Column(Date)  # конец диапазона дат (включительно), None - одна дата
     train_number = Column(String(20))
     seat_type = Column(String(50))
+    max_prices = Column(JSON)  # {класс мест: максимальная цена в копейках}, None - без ограничения
     departure_time_range = Column(String(20))
     check_frequency = Column(Integer, default=10)  # минуты
     is_active = Column(Boolean, default=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
-    last_checked = Column(DateTime(timezone=True))
     
     user = relationship("User", back_populates="subscriptions")
     found_tickets = relationship("FoundTicket", back_populates="subscription")
+    route_watches = relationship("RouteWatch", secondary=subscription_route_watches, back_populates="subscriptions")
+    
+    def departure_dates(self) -> List[date]:
+        """Даты поездки, которые покрывает подписка (прошедшие не проверяются)"""
+        return expand_date_range(self.departure_date, self.departure_date_to, not_before=date.today())
+    
+    @property
+    def last_checked(self) -> Optional[datetime]:
+        """Время последней проверки любого из маршрутов подписки"""
+        checked = [watch.last_checked for watch in self.route_watches if watch.last_checked]
+        return max(checked) if checked else None
 
 
 class FoundTicket(Base):
     __tablename__ = "found_tickets"
+    __table_args__ = (
+        # Параллельные проверки одного маршрута не записывают билет дважды
+        UniqueConstraint("subscription_id", "train_number", "departure_date", "departure_time",
+                         name="uq_found_tickets_train"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     subscription_id = Column(Integer, ForeignKey("subscriptions.id"), nullable=False)
     train_number = Column(String(20))
+    departure_date = Column(Date)
     departure_time = Column(DateTime(timezone=True))
     arrival_time = Column(DateTime(timezone=True))
     available_seats = Column(JSON)
@@ -62,3 +132,74 @@ class FoundTicket(Base):
     
     subscription = relationship("Subscription", back_populates="found_tickets")
 
+
+class NotificationOutbox(Base):
+    """
+    Исходящее уведомление, записанное в одной транзакции с найденным билетом.
+    Отправку выполняет OutboxRelay; ключ идемпотентности защищает от повторной доставки.
+    """
+    __tablename__ = "notification_outbox"
+    __table_args__ = (
+        Index("idx_notification_outbox_pending", "status", "available_at"),
+    )
+    
+    PENDING = 'pending'
+    SENT = 'sent'
+    FAILED = 'failed'
+    
+    id = Column(Integer, primary_key=True, index=True)
+    idempotency_key = Column(String(128), unique=True, nullable=False)
+    found_ticket_id = Column(Integer, ForeignKey("found_tickets.id", ondelete="CASCADE"), nullable=False)
+    chat_id = Column(BigInteger, nullable=False)
+    message = Column(Text, nullable=False)
+    status = Column(String(10), default=PENDING, nullable=False)
+    attempts = Column(Integer, default=0, nullable=False)
+    available_at = Column(DateTime(timezone=True), server_default=func.now())  # не раньше - следующая попытка
+    claimed_until = Column(DateTime(timezone=True))  # аренда отправителя
+    last_error = Column(String(255))
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    sent_at = Column(DateTime(timezone=True))
+
+
+class TrainSeatSeries(Base):
+    """Временной ряд мест и минимальной цены одного класса мест поезда на маршруте"""
+    __tablename__ = "train_seat_series"
+    __table_args__ = (
+        Index("idx_train_seat_series_route", "departure_station", "arrival_station", "departure_date"),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    series_key = Column(String(128), unique=True, nullable=False)
+    departure_station = Column(String(10), nullable=False)
+    arrival_station = Column(String(10), nullable=False)
+    departure_date = Column(Date, nullable=False)
+    train_number = Column(String(20))
+    departure_time = Column(DateTime(timezone=True))
+    seat_class = Column(String(50), nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    
+    chunks = relationship("TrainSeatSeriesChunk", back_populates="series", cascade="all, delete-orphan")
+
+
+class TrainSeatSeriesChunk(Base):
+    """
+    Блок точек ряда: точки каждой проверки за час, почасовые за сутки или посуточные за месяц.
+    Точки хранятся дельтами (см. src/price_history.py); last_* - последняя точка для дописывания.
+    """
+    __tablename__ = "train_seat_series_chunks"
+    __table_args__ = (
+        UniqueConstraint("series_id", "resolution", "bucket_start", name="uq_train_seat_series_chunks_bucket"),
+        Index("idx_train_seat_series_chunks_resolution", "resolution", "bucket_start"),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    series_id = Column(Integer, ForeignKey("train_seat_series.id", ondelete="CASCADE"), nullable=False)
+    resolution = Column(String(10), nullable=False)  # check, hour, day
+    bucket_start = Column(DateTime(timezone=True), nullable=False)
+    point_count = Column(Integer, default=0, nullable=False)
+    payload = Column(LargeBinary, nullable=False, default=b'')
+    last_offset = Column(Integer, default=0, nullable=False)
+    last_count = Column(Integer, default=0, nullable=False)
+    last_price = Column(Integer, default=-1, nullable=False)  # -1 - цена неизвестна
+    
+    series = relationship("TrainSeatSeries", back_populates="chunks")
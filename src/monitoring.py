@@ -1,32 +1,94 @@
 import asyncio
-from datetime import datetime, timedelta
-from sqlalchemy.orm import Session
-from typing import List, Dict
+import hashlib
+import json
+import time
+from datetime import datetime, date, timedelta
+from sqlalchemy import func, or_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, selectinload
+from typing import Callable, Iterable, Iterator, List, Dict, Optional, Tuple
 from loguru import logger
 
 from src.config import settings
-from src.database import engine
-from src.models import Subscription, FoundTicket, User
-from src.scraper import RZDScraper
-from telegram import Bot
-from telegram.error import TelegramError
+from src.database import engine, read_session
+from src.models import Subscription, FoundTicket, RouteWatch
+from src.route_watches import retire_route_watch, reconcile_route_watches
+from src.scraper import RZDScraper, RZDUnavailableError, TrainStream
+from src.circuit_breaker import CircuitOpenError
+from src.matcher import RouteMatcher, RouteQuery, build_route_query
+from src.metrics import metrics
+from src.records import Train
+from src.notifications import NotificationRenderer, build_digest_chunks, send_telegram_message
+from src.outbox import OutboxRelay, enqueue_notification
+from src.price_history import PriceHistoryRecorder
+from src.load_planner import create_load_planner
+from src.sharding import ShardMembership
+from src.event_bus import TicketEventBus
+from src.utils import RouteKey
 
 
 class MonitoringService:
-    def __init__(self):
-        self.scraper = RZDScraper()
-        self.bot = Bot(token=settings.telegram_bot_token)
+    def __init__(self, shard: Optional[ShardMembership] = None, scraper: Optional[RZDScraper] = None,
+                 event_bus: Optional[TicketEventBus] = None):
+        self.scraper = scraper or RZDScraper()
+        self.shard = shard  # None - проверяются все маршруты
+        self.event_bus = event_bus  # None - уведомления отправляет сам монитор
+        self._bot = None
+        self.renderer = NotificationRenderer(settings.notification_render_cache_size)
+        self.outbox = OutboxRelay.from_settings(deliver_chat=self.deliver_digest, event_bus=event_bus)
+        self.price_history = PriceHistoryRecorder() if settings.price_history_enabled else None
+        # Проверки распределяются по интервалу по фазам маршрутов (кроме режима beat)
+        self.planner = create_load_planner()
+        self.next_due_at: Optional[datetime] = None  # ближайшая запланированная проверка
+        self.next_flush_at: Optional[datetime] = None  # конец окна самой старой сводки outbox
         self.is_running = False
+        self.deferred_checks = 0  # проверки, отложенные в последнем цикле из-за недоступности РЖД
+        # Подписки, с которыми сопоставлена последняя полная страница маршрута
+        self.matched_subscribers: Dict[int, frozenset] = {}
+    
+    @property
+    def bot(self):
+        """Клиент Telegram создается при первой отправке"""
+        if self._bot is None:
+            from telegram import Bot
+            self._bot = Bot(token=settings.telegram_bot_token)
+        return self._bot
+    
+    @bot.setter
+    def bot(self, value):
+        self._bot = value
     
     async def start_monitoring(self):
         """Запуск сервиса мониторинга"""
         self.is_running = True
         logger.info("Сервис мониторинга запущен")
         
+        # Подписки, созданные до появления маршрутов, привязываются при старте
+        with Session(engine) as db:
+            reconcile_route_watches(db)
+        
+        # Браузеры запасного пути запускаются заранее, а не во время проверки
+        browser = getattr(self.scraper, 'browser', None)
+        if browser:
+            browser.start()
+        
+        heartbeat_task = None
+        if self.shard:
+            await self.shard.heartbeat()
+            heartbeat_task = asyncio.create_task(self.shard.run_heartbeat())
+        
+        try:
+            await self.run_cycles()
+        finally:
+            if heartbeat_task:
+                heartbeat_task.cancel()
+    
+    async def run_cycles(self):
+        """Циклы проверки до остановки сервиса"""
         while self.is_running:
             try:
                 await self.check_all_subscriptions()
-                await asyncio.sleep(settings.check_interval_minutes * 60)
+                await asyncio.sleep(self.next_cycle_delay())
             except Exception as e:
                 logger.error(f"Ошибка в сервисе мониторинга: {e}")
                 await asyncio.sleep(60)  # Ждем минуту перед повтором
@@ -34,196 +96,380 @@ class MonitoringService:
     async def stop_monitoring(self):
         """Остановка сервиса мониторинга"""
         self.is_running = False
+        # Накопленные сводки отправляются сразу, не дожидаясь окна
+        with Session(engine) as db:
+            await self.flush_notifications(db, force=True)
+        self.scraper.parser.shutdown()
+        if getattr(self.scraper, 'browser', None):
+            self.scraper.browser.shutdown()
+        if self.shard:
+            await self.shard.leave()
         logger.info("Сервис мониторинга остановлен")
     
+    def next_cycle_delay(self) -> float:
+        """Пауза до следующего цикла: отложенные проверки повторяются после паузы предохранителя"""
+        interval = settings.check_interval_minutes * 60
+        if self.planner and self.next_due_at:
+            # Слоты маршрутов разнесены по интервалу: просыпаемся к ближайшему
+            interval = min(interval, max(1.0, self.next_due_at.timestamp() - time.time()))
+        if self.next_flush_at:
+            interval = min(interval, max(1.0, self.next_flush_at.timestamp() - time.time()))
+        if not self.deferred_checks:
+            return interval
+        retry_after = max(self.scraper.breaker.retry_after(), settings.circuit_breaker_base_backoff)
+        return min(interval, retry_after)
+    
     async def check_all_subscriptions(self):
-        """Проверка всех активных подписок"""
-        with Session(engine) as db:
-            # Получаем все активные подписки, которые нужно проверить
-            subscriptions = db.query(Subscription).filter(
-                Subscription.is_active == True
-            ).all()
-            
-            logger.info(f"Проверка {len(subscriptions)} подписок")
-            
-            for subscription in subscriptions:
-                try:
-                    await self.check_subscription(subscription, db)
-                except Exception as e:
-                    logger.error(f"Ошибка проверки подписки {subscription.id}: {e}")
-                    continue
+        """Проверка всех маршрутов, по которым подошло время проверки"""
+        # Коммит после каждого маршрута не сбрасывает загруженные заранее подписки остальных маршрутов
+        with Session(engine, expire_on_commit=False) as db:
+            watches = self.due_route_watches(db)
+            logger.info(f"Проверка {len(watches)} маршрутов")
+            await self.check_route_watches(watches, db)
+            self.next_due_at = self.next_due_time(db)
+            self.next_flush_at = self.outbox.next_ready_at(db)
+    
+    def next_due_time(self, db: Session) -> Optional[datetime]:
+        """Ближайшая проверка среди маршрутов, которые выберет due_route_watches"""
+        query = db.query(RouteWatch).filter(
+            RouteWatch.is_active == True,
+            RouteWatch.departure_date >= date.today(),
+            RouteWatch.next_check_at != None
+        )
+        if not self.shard:
+            return query.with_entities(func.min(RouteWatch.next_check_at)).scalar()
+        
+        rows = query.with_entities(
+            RouteWatch.departure_station, RouteWatch.arrival_station,
+            RouteWatch.departure_date, RouteWatch.next_check_at
+        ).all()
+        owned = [
+            next_check_at for departure_station, arrival_station, departure_date, next_check_at in rows
+            if self.shard.owns(RouteKey(departure_station, arrival_station, departure_date))
+        ]
+        return min(owned) if owned else None
+    
+    def due_route_watches(self, db: Session) -> List[RouteWatch]:
+        """Активные маршруты этого экземпляра, по которым подошло время проверки"""
+        now = datetime.now()
+        watches = db.query(RouteWatch).filter(
+            RouteWatch.is_active == True,
+            RouteWatch.departure_date >= now.date(),
+            or_(RouteWatch.next_check_at == None, RouteWatch.next_check_at <= now)
+        ).options(
+            selectinload(RouteWatch.subscriptions).selectinload(Subscription.user)
+        ).order_by(RouteWatch.next_check_at).all()
+        
+        if self.shard:
+            watches = [watch for watch in watches if self.shard.owns(watch.route_key)]
+        return watches
     
     async def check_subscription(self, subscription: Subscription, db: Session):
-        """Проверка конкретной подписки"""
-        try:
-            # Проверяем, нужно ли проверять эту подписку сейчас
-            if subscription.last_checked:
-                time_since_last_check = datetime.now() - subscription.last_checked
-                if time_since_last_check.total_seconds() < subscription.check_frequency * 60:
-                    return  # Еще рано проверять
-            
-            logger.info(f"Проверка подписки {subscription.id}: {subscription.departure_station} -> {subscription.arrival_station}")
-            
-            # Ищем билеты
-            trains = self.scraper.search_tickets(
-                departure_station=subscription.departure_station,
-                arrival_station=subscription.arrival_station,
-                departure_date=subscription.departure_date,
-                train_number=subscription.train_number
+        """Проверка конкретной подписки (вне расписания)"""
+        await self.check_route_watches(list(subscription.route_watches), db)
+    
+    async def check_route_watches(self, watches: List[RouteWatch], db: Session,
+                                  on_progress: Optional[Callable[[int, int], None]] = None):
+        """Проверка маршрутов: один запрос к РЖД на маршрут для всех его подписок"""
+        self.deferred_checks = 0
+        if self.planner:
+            self.planner.refresh(db)
+        
+        for i, watch in enumerate(watches):
+            if on_progress:
+                on_progress(i + 1, len(watches))
+            if self.shard and not self.shard.owns(watch.route_key):
+                # Аренда потеряна или кольцо перестроено: маршруты проверит новый владелец
+                logger.warning(f"Монитор больше не владеет маршрутами, пропущено проверок: {len(watches) - i}")
+                break
+            try:
+                await self.check_route_watch(watch, db)
+                # Сводки, окно которых истекло, не ждут конца цикла
+                await self.flush_notifications(db)
+            except CircuitOpenError as e:
+                # Остальные маршруты не тратим на таймауты, а переносим на время пробного запроса
+                logger.warning(
+                    f"РЖД недоступен, отложено проверок: {len(watches) - i}, "
+                    f"повтор через {e.retry_after:.0f} с"
+                )
+                self.defer_route_watches(watches[i:], e.retry_after)
+                break
+            except RZDUnavailableError:
+                # Не считаем это отсутствием поездов: маршрут проверится повторно после паузы
+                logger.warning(f"Проверка маршрута {watch.route_key} отложена: РЖД не ответил")
+                self.defer_route_watches([watch], self.scraper.breaker.retry_after())
+                db.commit()
+            except Exception as e:
+                logger.error(f"Ошибка при проверке маршрута {watch.route_key}: {e}")
+                # Сессия после ошибки базы непригодна: откатываем, чтобы проверить остальные маршруты
+                db.rollback()
+                self.matched_subscribers.pop(watch.id, None)
+        
+        db.commit()
+        
+        # Цикл по плану нагрузки содержит лишь несколько маршрутов: сводки ждут своего окна
+        # (монитор просыпается к его концу); проверка раз в шаг beat отправляет остаток сразу
+        await self.flush_notifications(db, force=not self.planner)
+    
+    def defer_route_watches(self, watches: List[RouteWatch], retry_after: float):
+        """Перенос проверки маршрутов на время после паузы предохранителя"""
+        delay = max(retry_after, settings.circuit_breaker_base_backoff)
+        next_check_at = datetime.now() + timedelta(seconds=delay)
+        for watch in watches:
+            watch.next_check_at = next_check_at
+        self.deferred_checks += len(watches)
+    
+    async def check_route_watch(self, watch: RouteWatch, db: Session):
+        """Проверка одного маршрута для всех его подписок"""
+        subscriptions = [s for s in watch.subscriptions if s.is_active]
+        if not subscriptions:
+            retire_route_watch(watch)
+            self.matched_subscribers.pop(watch.id, None)
+            return
+        
+        route_key = watch.route_key
+        logger.info(
+            f"Проверка маршрута {route_key.departure_station} -> {route_key.arrival_station} "
+            f"на {route_key.departure_date}: подписок {len(subscriptions)}"
+        )
+        
+        # Окно времени и номер поезда, общие для подписок, фильтруются на стороне РЖД
+        query = build_route_query(subscriptions)
+        
+        # Условный запрос допустим, только если все подписчики уже видели текущую страницу
+        subscriber_ids = frozenset(s.id for s in subscriptions)
+        conditional = subscriber_ids <= self.matched_subscribers.get(watch.id, frozenset())
+        
+        # Запрос, разбор и сопоставление идут в отдельном потоке и не блокируют цикл событий
+        result = await asyncio.to_thread(
+            self.search_and_match, route_key, query, subscriptions, conditional
+        )
+        
+        # Обновляем состояние маршрута и планируем следующую проверку
+        now = datetime.now()
+        watch.last_checked = now
+        if self.planner:
+            watch.next_check_at = self.planner.next_check_at(watch, now)
+        else:
+            watch.next_check_at = now + timedelta(minutes=watch.check_frequency or settings.check_interval_minutes)
+        
+        if result is None:
+            # Страница не изменилась: снимок и совпадения остаются прежними
+            db.commit()
+            self.record_price_history(db, route_key, watch.last_snapshot, now)
+            return
+        
+        snapshot, matches = result
+        watch.last_snapshot = snapshot
+        watch.last_result_hash = hashlib.sha256(
+            json.dumps(snapshot, sort_keys=True, ensure_ascii=False).encode('utf-8')
+        ).hexdigest()
+        db.commit()
+        
+        persisted = True
+        for subscription, train in matches:
+            if not await self.process_found_train(train, subscription, db, route_key.departure_date):
+                persisted = False
+        if persisted:
+            self.matched_subscribers[watch.id] = subscriber_ids
+        else:
+            # Незаписанный билет найдется снова только при полном разборе страницы
+            self.matched_subscribers.pop(watch.id, None)
+            self.scraper.forget_validators(
+                route_key.departure_station, route_key.arrival_station, route_key.departure_date,
+                query.train_number, query.time_from, query.time_to
             )
-            
-            # Обновляем время последней проверки
-            subscription.last_checked = datetime.now()
+        
+        # История пишется после уведомлений: ее ошибка не должна их задерживать
+        self.record_price_history(db, route_key, snapshot, now)
+    
+    def record_price_history(self, db: Session, route_key: RouteKey, snapshot: Optional[List[Dict]],
+                             checked_at: datetime):
+        """
+        Точки истории мест и цен для проверки (неизменившаяся страница тоже дает точку).
+        Запись идет в точке сохранения: ее ошибка откатывает только историю, проверка не страдает.
+        """
+        if not (self.price_history and snapshot):
+            return
+        try:
+            with db.begin_nested():
+                self.price_history.record(db, route_key, snapshot, checked_at)
             db.commit()
-            
-            # Обрабатываем найденные поезда
-            for train in trains:
-                await self.process_found_train(train, subscription, db)
-                
         except Exception as e:
-            logger.error(f"Ошибка при проверке подписки {subscription.id}: {e}")
+            db.rollback()
+            logger.warning(f"История цен маршрута {route_key} не записана: {e}")
     
-    async def process_found_train(self, train: Dict, subscription: Subscription, db: Session):
-        """Обработка найденного поезда"""
+    def search_and_match(self, route_key: RouteKey, query: RouteQuery, subscriptions: List[Subscription],
+                         conditional: bool) -> Optional[Tuple[List[Dict], List[Tuple[Subscription, Train]]]]:
+        """
+        Поиск поездов маршрута и сопоставление сразу со всеми подписками.
+        Поезда потокового разбора проходят через сопоставление по одному, по пути
+        попадая в снимок. None - страница не изменилась.
+        """
+        trains = self.scraper.search_tickets(
+            departure_station=route_key.departure_station,
+            arrival_station=route_key.arrival_station,
+            departure_date=route_key.departure_date,
+            train_number=query.train_number,
+            time_from=query.time_from,
+            time_to=query.time_to,
+            conditional=conditional,
+            stream=settings.parser_streaming
+        )
+        if trains is None:
+            return None
+        
+        snapshot = []
+        
+        def recorded(trains: Iterable[Train]) -> Iterator[Train]:
+            for train in trains:
+                snapshot.append(train.to_dict())
+                yield train
+        
+        matches = RouteMatcher(subscriptions).match(recorded(trains))
+        if isinstance(trains, TrainStream) and trains.unchanged:
+            # Отпечаток потокового разбора совпал с прошлым: совпадения обработаны прошлой проверкой
+            return None
+        return snapshot, matches
+    
+    async def process_found_train(self, train: Train, subscription: Subscription, db: Session,
+                                  departure_date: Optional[date] = None) -> bool:
+        """
+        Обработка поезда, подходящего подписке (сопоставление выполняет RouteMatcher).
+        False - билет не записан, и поезд нужно сопоставить снова.
+        """
         try:
-            # Проверяем, соответствует ли поезд критериям подписки
-            if not self.train_matches_subscription(train, subscription):
-                return
-            
-            # Проверяем, есть ли доступные места нужного типа
-            available_seats = train.get('available_seats', {})
-            if not self.has_matching_seats(available_seats, subscription.seat_type):
-                return
+            departure_date = departure_date or subscription.departure_date
             
-            # Проверяем, не уведомляли ли мы уже об этом поезде
+            # Проверяем, не уведомляли ли мы уже об этом поезде (недоставленное повторит outbox)
             existing_ticket = db.query(FoundTicket).filter(
                 FoundTicket.subscription_id == subscription.id,
-                FoundTicket.train_number == train.get('train_number'),
-                FoundTicket.departure_time == train.get('departure_time'),
-                FoundTicket.is_notified == True
+                FoundTicket.train_number == train.train_number,
+                FoundTicket.departure_date == departure_date,
+                FoundTicket.departure_time == train.departure_time
             ).first()
             
             if existing_ticket:
-                return  # Уже уведомляли
+                return True  # Уже уведомляли или уведомление в outbox
             
             # Создаем запись о найденном билете
             found_ticket = FoundTicket(
                 subscription_id=subscription.id,
-                train_number=train.get('train_number'),
-                departure_time=train.get('departure_time'),
-                arrival_time=train.get('arrival_time'),
-                available_seats=available_seats,
-                prices=train.get('prices', {})
+                train_number=train.train_number,
+                departure_date=departure_date,
+                departure_time=train.departure_time,
+                arrival_time=train.arrival_time,
+                available_seats=train.seats_dict(),
+                prices=train.prices_dict()
             )
             
             db.add(found_ticket)
-            db.commit()
+            db.flush()
             
-            # Отправляем уведомление
-            await self.send_notification(subscription, train, found_ticket.id)
-            
-            # Отмечаем как уведомленное
-            found_ticket.is_notified = True
+            # Билет и уведомление фиксируются одной транзакцией; отправляет их OutboxRelay
+            message = self.format_notification_message(subscription, train, found_ticket.id, departure_date)
+            enqueue_notification(db, found_ticket, subscription.user.telegram_id, message)
             db.commit()
             
-            logger.info(f"Найден билет для подписки {subscription.id}: {train.get('train_number')}")
+            logger.info(f"Найден билет для подписки {subscription.id}: {train.train_number} на {departure_date}")
+            return True
             
+        except IntegrityError:
+            # Тот же билет только что записала параллельная проверка: он уже найден
+            db.rollback()
+            logger.info(f"Билет {train.train_number} на {departure_date} для подписки {subscription.id} уже найден")
+            return True
         except Exception as e:
+            db.rollback()
             logger.error(f"Ошибка обработки найденного поезда: {e}")
+            return False
     
-    def train_matches_subscription(self, train: Dict, subscription: Subscription) -> bool:
-        """Проверка соответствия поезда критериям подписки"""
-        # Если указан конкретный номер поезда, проверяем его
-        if subscription.train_number:
-            return train.get('train_number') == subscription.train_number
-        
-        return True  # Если номер поезда не указан, подходит любой
+    async def flush_notifications(self, db: Session, force: bool = False):
+        """Отправка уведомлений из outbox (сводки чатов или публикация в поток Redis)"""
+        await self.outbox.drain(db, force)
     
-    def has_matching_seats(self, available_seats: Dict, seat_type: str) -> bool:
-        """Проверка наличия мест нужного типа"""
-        if not seat_type or seat_type == 'любой':
-            return len(available_seats) > 0
-        
-        # Проверяем наличие мест указанного типа
-        for seat_type_name, seat_info in available_seats.items():
-            if seat_type.lower() in seat_type_name.lower():
-                count = seat_info.get('count', '0')
-                if isinstance(count, str):
-                    count = ''.join(filter(str.isdigit, count))
-                    count = int(count) if count else 0
-                return count > 0
-        
-        return False
+    async def deliver_digest(self, chat_id: int, messages: List[str]) -> List[bool]:
+        """
+        Отправка сводки чата; по флагу на уведомление. После временной ошибки остальные
+        части не отправляются: уведомления из них и из неудавшейся части будут повторены.
+        """
+        failed = set()
+        for text, indices in build_digest_chunks(messages):
+            if failed or not await self.send_notification(chat_id, text):
+                failed.update(indices)
+        return [index not in failed for index in range(len(messages))]
     
-    async def send_notification(self, subscription: Subscription, train: Dict, ticket_id: int):
+    async def send_notification(self, chat_id: int, message: str) -> bool:
         """Отправка уведомления пользователю"""
-        try:
-            user = subscription.user
-            
-            # Формируем сообщение
-            message = self.format_notification_message(subscription, train, ticket_id)
-            
-            # Отправляем уведомление
-            await self.bot.send_message(
-                chat_id=user.telegram_id,
-                text=message,
-                parse_mode='HTML'
-            )
-            
-            logger.info(f"Уведомление отправлено пользователю {user.telegram_id}")
-            
-        except TelegramError as e:
-            logger.error(f"Ошибка отправки уведомления: {e}")
-        except Exception as e:
-            logger.error(f"Неожиданная ошибка при отправке уведомления: {e}")
+        return await send_telegram_message(self.bot, chat_id, message)
     
-    def format_notification_message(self, subscription: Subscription, train: Dict, ticket_id: int) -> str:
+    def format_notification_message(self, subscription: Subscription, train: Train, ticket_id: int,
+                                    departure_date: Optional[date] = None) -> str:
         """Форматирование сообщения уведомления"""
-        train_number = train.get('train_number', 'Неизвестно')
-        departure_time = train.get('departure_time', 'Неизвестно')
-        arrival_time = train.get('arrival_time', 'Неизвестно')
-        available_seats = train.get('available_seats', {})
-        prices = train.get('prices', {})
-        
-        message = f"""
-🎫 <b>НАЙДЕНЫ БИЛЕТЫ!</b>
-
-🚂 <b>Поезд:</b> {train_number}
-📍 <b>Маршрут:</b> {subscription.departure_station} → {subscription.arrival_station}
-📅 <b>Дата:</b> {subscription.departure_date.strftime('%d.%m.%Y')}
-🕐 <b>Отправление:</b> {departure_time}
-🕐 <b>Прибытие:</b> {arrival_time}
-
-💺 <b>Доступные места:</b>
-"""
-        
-        # Добавляем информацию о доступных местах
-        for seat_type, seat_info in available_seats.items():
-            count = seat_info.get('count', '0')
-            price = seat_info.get('price', '0')
-            message += f"• {seat_type.title()}: {count} мест от {price}₽\n"
-        
-        # Добавляем ссылку на покупку (примерная)
-        rzd_url = f"https://pass.rzd.ru/tickets/public/ru?layerName=search&ticketSearch[departureStation]={subscription.departure_station}&ticketSearch[arrivalStation]={subscription.arrival_station}&ticketSearch[departureDate]={subscription.departure_date.strftime('%d.%m.%Y')}"
-        
-        message += f"""
-🔗 <a href="{rzd_url}">Купить билет</a>
-
-📋 Подписка: #{subscription.id} ({subscription.departure_station} → {subscription.arrival_station})
-        """
-        
-        return message.strip()
+        route_key = RouteKey(
+            subscription.departure_station,
+            subscription.arrival_station,
+            departure_date or subscription.departure_date
+        )
+        return self.renderer.render(route_key, train, subscription.id)
     
     async def get_statistics(self) -> Dict:
         """Получение статистики мониторинга"""
-        with Session(engine) as db:
+        # Счетчики читаются с реплики: статистика не нагружает основную базу проверок
+        with read_session() as db:
             total_subscriptions = db.query(Subscription).filter(Subscription.is_active == True).count()
+            total_route_watches = db.query(RouteWatch).filter(RouteWatch.is_active == True).count()
             total_found_tickets = db.query(FoundTicket).count()
             total_notifications = db.query(FoundTicket).filter(FoundTicket.is_notified == True).count()
+            outbox_pending = self.outbox.pending_count(db)
+            if self.planner:
+                self.planner.refresh(db)
+            
+            queue = await self.event_bus.depth() if self.event_bus else None
             
             return {
+                'notification_queue': queue,
+                'outbox_pending': outbox_pending,
                 'active_subscriptions': total_subscriptions,
+                'active_route_watches': total_route_watches,
                 'found_tickets': total_found_tickets,
-                'sent_notifications': total_notifications
+                'sent_notifications': total_notifications,
+                'circuit_breaker': self.scraper.breaker.state,
+                'deferred_checks': self.deferred_checks,
+                'load_plan': self.planner.load_report() if self.planner else None,
+                'fingerprint_hit_ratio': metrics.hit_ratio(
+                    'rzd_search_fingerprint_hits', 'rzd_search_fingerprint_misses'
+                ),
+                'metrics': metrics.snapshot()
             }
 
+
+# Функция для запуска отдельного процесса мониторинга
+async def main():
+    from redis import asyncio as aioredis
+    
+    if settings.check_scheduler != 'monitor':
+        logger.error(
+            f"Монитор не запущен: CHECK_SCHEDULER={settings.check_scheduler}, "
+            f"маршруты уже проверяются задачами Celery (нужно CHECK_SCHEDULER=monitor)"
+        )
+        return
+    
+    redis_client = aioredis.from_url(settings.redis_url)
+    shard = ShardMembership(
+        redis_client,
+        instance_id=settings.monitor_instance_id,
+        ttl_seconds=settings.monitor_lease_ttl_seconds,
+        replicas=settings.monitor_ring_replicas
+    )
+    event_bus = TicketEventBus.from_settings(redis_client) if settings.notification_transport == 'stream' else None
+    monitoring = MonitoringService(shard=shard, event_bus=event_bus)
+    
+    logger.info(f"Запуск монитора {shard.instance_id}")
+    try:
+        await monitoring.start_monitoring()
+    finally:
+        await monitoring.stop_monitoring()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,183 @@
+import html
+import re
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+from loguru import logger
+
+from src.records import Train
+from src.utils import RouteKey, format_kopecks
+
+
+class NotificationRenderer:
+    """
+    Рендер уведомлений о билетах.
+
+    Тело сообщения (поезд, места, ссылка на покупку) одинаково для всех подписчиков
+    маршрута и кэшируется по (маршрут, поезд, состояние мест); для каждой подписки
+    дописывается только подвал с ее номером.
+    """
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self._bodies: "OrderedDict[Tuple, str]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def render(self, route_key: RouteKey, train: Train, subscription_id: int) -> str:
+        """Сообщение для подписки"""
+        return self.render_body(route_key, train) + self.render_footer(route_key, subscription_id)
+
+    def render_body(self, route_key: RouteKey, train: Train) -> str:
+        """Общая часть сообщения (из кэша, если поезд и места не изменились)"""
+        # Места входят в ключ целиком: изменение количества или цены дает новое тело
+        key = (route_key, train.train_number, train.departure_time, train.seats)
+        body = self._bodies.get(key)
+        if body is not None:
+            self._bodies.move_to_end(key)
+            self.hits += 1
+            return body
+
+        self.misses += 1
+        body = self._build_body(route_key, train)
+        self._bodies[key] = body
+        if len(self._bodies) > self.max_entries:
+            self._bodies.popitem(last=False)
+        return body
+
+    @staticmethod
+    def render_footer(route_key: RouteKey, subscription_id: Optional[int]) -> str:
+        """Часть сообщения, уникальная для подписки"""
+        return f"\n\n📋 Подписка: #{subscription_id} ({route_key.departure_station} → {route_key.arrival_station})"
+
+    @staticmethod
+    def _build_body(route_key: RouteKey, train: Train) -> str:
+        train_number = train.train_number or 'Неизвестно'
+        departure_time = train.departure_time.strftime('%H:%M') if train.departure_time else 'Неизвестно'
+        arrival_time = train.arrival_time.strftime('%H:%M') if train.arrival_time else 'Неизвестно'
+        departure_date = route_key.departure_date.strftime('%d.%m.%Y')
+
+        lines = [
+            "🎫 <b>НАЙДЕНЫ БИЛЕТЫ!</b>",
+            "",
+            f"🚂 <b>Поезд:</b> {train_number}",
+            f"📍 <b>Маршрут:</b> {route_key.departure_station} → {route_key.arrival_station}",
+            f"📅 <b>Дата:</b> {departure_date}",
+            f"🕐 <b>Отправление:</b> {departure_time}",
+            f"🕐 <b>Прибытие:</b> {arrival_time}",
+            "",
+            "💺 <b>Доступные места:</b>",
+        ]
+
+        # Добавляем информацию о доступных местах
+        for seat in train.seats:
+            lines.append(f"• {seat.name.title()}: {seat.count} мест от {format_kopecks(seat.price)}")
+
+        # Добавляем ссылку на покупку (примерная)
+        rzd_url = (
+            f"https://pass.rzd.ru/tickets/public/ru?layerName=search"
+            f"&ticketSearch[departureStation]={route_key.departure_station}"
+            f"&ticketSearch[arrivalStation]={route_key.arrival_station}"
+            f"&ticketSearch[departureDate]={departure_date}"
+        )
+        lines.append("")
+        lines.append(f"🔗 <a href=\"{rzd_url}\">Купить билет</a>")
+
+        return "\n".join(lines)
+
+
+TELEGRAM_MESSAGE_LIMIT = 4096
+DIGEST_SEPARATOR = "\n\n➖➖➖➖➖\n\n"
+
+
+def build_digest_chunks(messages: List[str], limit: int = TELEGRAM_MESSAGE_LIMIT) -> List[Tuple[str, List[int]]]:
+    """Сообщения сводки с номерами уведомлений, части которых в них вошли"""
+    if len(messages) == 1 and len(messages[0]) <= limit:
+        return [(messages[0], [0])]
+
+    header = f"🔔 <b>Найдено билетов: {len(messages)}</b>" if len(messages) > 1 else ""
+    parts = []
+    for index, message in enumerate(messages):
+        # Первая часть идет вместе с заголовком: под нее остается лимит без заголовка
+        part_limit = limit - len(header) - len(DIGEST_SEPARATOR) if header and index == 0 else limit
+        pieces = _split_long_message(message, part_limit) if len(message) > part_limit else [message]
+        parts.extend((piece, index) for piece in pieces)
+
+    chunks = []
+    current, indices = header, []
+    for part, index in parts:
+        candidate = f"{current}{DIGEST_SEPARATOR}{part}" if current else part
+        if len(candidate) <= limit:
+            current = candidate
+            if index not in indices:
+                indices.append(index)
+            continue
+        chunks.append((current, indices))
+        current, indices = part, [index]
+    if current:
+        chunks.append((current, indices))
+    return chunks
+
+
+def _split_long_message(message: str, limit: int) -> List[str]:
+    """Деление по строкам: теги уведомлений не переходят через строку, поэтому разметка остается целой"""
+    pieces = []
+    current = ""
+    for line in message.split("\n"):
+        if len(line) > limit:
+            if current:
+                pieces.append(current)
+                current = ""
+            pieces.extend(_split_long_line(line, limit))
+            continue
+        candidate = f"{current}\n{line}" if current else line
+        if len(candidate) > limit:
+            pieces.append(current)
+            current = line
+        else:
+            current = candidate
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+def _split_long_line(line: str, limit: int) -> List[str]:
+    """
+    Строка длиннее лимита: разметка снимается, а текст режется и экранируется заново,
+    чтобы разрез не пришелся на тег или HTML-сущность
+    """
+    text = html.unescape(re.sub(r"<[^>]*>", "", line))
+    pieces = []
+    current = ""
+    for char in text:
+        escaped = html.escape(char, quote=False)
+        if len(current) + len(escaped) > limit:
+            pieces.append(current)
+            current = ""
+        current += escaped
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+async def send_telegram_message(bot, chat_id: int, message: str) -> bool:
+    """
+    Отправка сообщения в Telegram. False - временная ошибка, отправку нужно повторить;
+    постоянные ошибки (бот заблокирован, чат удален) считаются обработанными.
+    """
+    from telegram.error import BadRequest, NetworkError, RetryAfter, TelegramError
+
+    try:
+        await bot.send_message(chat_id=chat_id, text=message, parse_mode='HTML')
+        logger.info(f"Уведомление отправлено пользователю {chat_id}")
+        return True
+    except BadRequest as e:
+        # BadRequest наследует NetworkError, но повтор не поможет
+        logger.error(f"Сообщение для {chat_id} отклонено: {e}")
+        return True
+    except (RetryAfter, NetworkError) as e:
+        logger.warning(f"Временная ошибка отправки уведомления {chat_id}: {e}")
+        return False
+    except TelegramError as e:
+        logger.error(f"Ошибка отправки уведомления {chat_id}: {e}")
+        return True
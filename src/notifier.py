@@ -0,0 +1,178 @@
+import asyncio
+import time
+from typing import Dict, List, NamedTuple, Optional, Set
+
+from loguru import logger
+from sqlalchemy.orm import Session
+
+from src.config import settings
+from src.database import engine
+from src.event_bus import StreamEntry, TicketEventBus
+from src.models import FoundTicket
+from src.notifications import build_digest_chunks, send_telegram_message
+
+
+class PendingEvent(NamedTuple):
+    """Событие потока в сводке чата"""
+    entry_id: str
+    key: Optional[str]
+    ticket_id: int
+    message: str
+
+
+class NotifierService:
+    """
+    Отправитель уведомлений: потребитель группы потока "найден билет".
+
+    События копятся в сводках чатов (как у монитора) и подтверждаются только после
+    отправки сводки. Экземпляров может быть сколько угодно: Redis распределяет события
+    между ними, а события упавшего экземпляра забираются через XAUTOCLAIM. Повторно
+    опубликованные события (outbox монитора повторяет неподтвержденные) отбрасываются
+    по ключу идемпотентности.
+    """
+
+    def __init__(self, bus: TicketEventBus, consumer: Optional[str] = None):
+        self.bus = bus
+        self.consumer = consumer or settings.notifier_consumer or TicketEventBus.default_consumer_name()
+        self._bot = None
+        self.window_seconds = settings.notification_digest_window_seconds
+        self.pending: Dict[int, List[PendingEvent]] = {}  # события сводок по чатам
+        self.opened_at: Dict[int, float] = {}  # начало окна сводки чата
+        self.in_flight: Set[str] = set()
+        self.in_flight_keys: Set[str] = set()
+        # Забираем только события, которые дольше окна сводки никто не подтвердил
+        self.claim_idle_ms = max(
+            settings.notifier_claim_idle_seconds, settings.notification_digest_window_seconds * 2
+        ) * 1000
+        self.is_running = False
+        self.sent = 0
+        self.duplicates = 0
+
+    @property
+    def bot(self):
+        """Клиент Telegram создается при первой отправке"""
+        if self._bot is None:
+            from telegram import Bot
+            self._bot = Bot(token=settings.telegram_bot_token)
+        return self._bot
+
+    async def start(self):
+        """Чтение потока до остановки"""
+        self.is_running = True
+        await self.bus.ensure_group()
+        logger.info(f"Отправитель уведомлений {self.consumer} запущен")
+
+        last_reclaim = 0.0
+        while self.is_running:
+            try:
+                if time.monotonic() - last_reclaim >= self.claim_idle_ms / 1000 / 2:
+                    await self.accept(await self.bus.reclaim(self.consumer, self.claim_idle_ms, settings.notifier_batch_size))
+                    last_reclaim = time.monotonic()
+
+                await self.accept(await self.bus.read(
+                    self.consumer, settings.notifier_batch_size, settings.notifier_block_ms
+                ))
+                await self.flush()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Ошибка чтения потока уведомлений: {e}")
+                await asyncio.sleep(5)
+
+    async def stop(self):
+        """Остановка с отправкой накопленных сводок"""
+        self.is_running = False
+        await self.flush(force=True)
+        logger.info(f"Отправитель уведомлений {self.consumer} остановлен")
+
+    async def accept(self, entries: List[StreamEntry]):
+        """Добавление событий в сводки чатов; уже доставленные события сразу подтверждаются"""
+        entries = [(entry_id, event) for entry_id, event in entries if entry_id not in self.in_flight]
+        delivered = await self.bus.delivered_keys(
+            [event['idempotency_key'] for _, event in entries if event.get('idempotency_key')]
+        )
+
+        duplicates = []
+        for entry_id, event in entries:
+            key = event.get('idempotency_key')
+            if key and (key in delivered or key in self.in_flight_keys):
+                duplicates.append(entry_id)
+                continue
+            self.in_flight.add(entry_id)
+            if key:
+                self.in_flight_keys.add(key)
+            chat_id = event['chat_id']
+            if chat_id not in self.pending:
+                self.pending[chat_id] = []
+                self.opened_at[chat_id] = time.monotonic()
+            self.pending[chat_id].append(PendingEvent(entry_id, key, event['ticket_id'], event['message']))
+
+        if duplicates:
+            self.duplicates += len(duplicates)
+            await self.bus.ack(duplicates)
+
+    def ready_chats(self, force: bool = False) -> List[int]:
+        """Чаты, окно сводки которых истекло (или все чаты при force)"""
+        if force:
+            return list(self.pending)
+        deadline = time.monotonic() - self.window_seconds
+        return [chat_id for chat_id, opened_at in self.opened_at.items() if opened_at <= deadline]
+
+    async def flush(self, force: bool = False):
+        """
+        Отправка готовых сводок. После временной ошибки остальные части сводки не отправляются;
+        подтверждаются только события, целиком вошедшие в доставленные части.
+        """
+        for chat_id in self.ready_chats(force):
+            events = self.pending.pop(chat_id, [])
+            self.opened_at.pop(chat_id, None)
+
+            failed = set()
+            for text, indices in build_digest_chunks([event.message for event in events]):
+                if failed or not await self.send(chat_id, text):
+                    failed.update(indices)
+            delivered = [event for index, event in enumerate(events) if index not in failed]
+
+            if delivered:
+                with Session(engine) as db:
+                    db.query(FoundTicket).filter(
+                        FoundTicket.id.in_([event.ticket_id for event in delivered])
+                    ).update({FoundTicket.is_notified: True}, synchronize_session=False)
+                    db.commit()
+                await self.bus.mark_delivered(
+                    [event.key for event in delivered if event.key], settings.notifier_dedup_ttl_seconds
+                )
+                await self.bus.ack([event.entry_id for event in delivered])
+            # Недоставленные события остаются ожидающими и будут забраны повторно
+            self.in_flight.difference_update(event.entry_id for event in events)
+            self.in_flight_keys.difference_update(event.key for event in events if event.key)
+
+    async def send(self, chat_id: int, message: str) -> bool:
+        """Отправка сообщения; False - временная ошибка, событие нужно повторить"""
+        delivered = await send_telegram_message(self.bot, chat_id, message)
+        if delivered:
+            self.sent += 1
+        return delivered
+
+    async def get_statistics(self) -> Dict:
+        return {
+            'consumer': self.consumer,
+            'sent': self.sent,
+            'duplicates': self.duplicates,
+            'queue': await self.bus.depth(),
+        }
+
+
+async def main():
+    from redis import asyncio as aioredis
+
+    bus = TicketEventBus.from_settings(aioredis.from_url(settings.redis_url))
+    notifier = NotifierService(bus)
+    try:
+        await notifier.start()
+    finally:
+        await notifier.stop()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,227 @@
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, List, NamedTuple, Optional
+
+from loguru import logger
+from sqlalchemy import func, or_
+from sqlalchemy.orm import Session
+
+from src.config import settings
+from src.event_bus import TicketEventBus
+from src.models import FoundTicket, NotificationOutbox
+
+
+def _now() -> datetime:
+    """
+    Текущее время с часовым поясом: колонки outbox объявлены с timezone=True, и на Postgres
+    значения приходят aware - сравнение с naive datetime падает с TypeError
+    """
+    return datetime.now().astimezone()
+
+
+def ticket_idempotency_key(found_ticket: FoundTicket) -> str:
+    """Ключ идемпотентности уведомления о найденном билете"""
+    return f"found_ticket:{found_ticket.id}"
+
+
+def enqueue_notification(db: Session, found_ticket: FoundTicket, chat_id: int, message: str) -> NotificationOutbox:
+    """
+    Запись уведомления в outbox. Коммит остается за вызывающим кодом: билет и уведомление
+    фиксируются одной транзакцией, поэтому ни одно из них не теряется при падении.
+    """
+    entry = NotificationOutbox(
+        idempotency_key=ticket_idempotency_key(found_ticket),
+        found_ticket_id=found_ticket.id,
+        chat_id=chat_id,
+        message=message,
+        status=NotificationOutbox.PENDING,
+        available_at=_now(),
+    )
+    db.add(entry)
+    return entry
+
+
+class OutboxMessage(NamedTuple):
+    """Захваченное уведомление, отвязанное от сессии: доставка не обращается к базе"""
+    id: int
+    idempotency_key: str
+    found_ticket_id: int
+    chat_id: int
+    message: str
+
+
+# Доставка сводки чата: по флагу на уведомление, True - доставлено (или не подлежит повтору),
+# False - повторить позже
+DeliverChat = Callable[[int, List[str]], Awaitable[List[bool]]]
+
+
+class OutboxRelay:
+    """
+    Отправка уведомлений из outbox пачками.
+
+    Пачка захватывается короткой транзакцией (FOR UPDATE SKIP LOCKED и аренда claimed_until),
+    доставка идет вне транзакции, результат фиксируется второй короткой транзакцией.
+    Уведомления чата, накопившиеся за окно сводки, уходят одной сводкой. При транспорте
+    stream события публикуются в поток Redis с ключом идемпотентности, и получатель
+    отбрасывает повторы; запись, аренда которой истекла без подтверждения, отправляется снова.
+    """
+
+    def __init__(self, deliver_chat: Optional[DeliverChat] = None, event_bus: Optional[TicketEventBus] = None,
+                 batch_size: int = 500, window_seconds: float = 60, lease_seconds: int = 120,
+                 retry_base_seconds: int = 30, max_attempts: int = 10):
+        self.deliver_chat = deliver_chat
+        self.event_bus = event_bus
+        self.batch_size = batch_size
+        self.window_seconds = window_seconds
+        self.lease_seconds = lease_seconds
+        self.retry_base_seconds = retry_base_seconds
+        self.max_attempts = max_attempts
+        self.delivered = 0
+
+    @classmethod
+    def from_settings(cls, deliver_chat: Optional[DeliverChat] = None,
+                      event_bus: Optional[TicketEventBus] = None) -> 'OutboxRelay':
+        return cls(
+            deliver_chat=deliver_chat,
+            event_bus=event_bus,
+            batch_size=settings.outbox_batch_size,
+            window_seconds=settings.notification_digest_window_seconds,
+            lease_seconds=settings.outbox_lease_seconds,
+            retry_base_seconds=settings.outbox_retry_base_seconds,
+            max_attempts=settings.outbox_max_attempts,
+        )
+
+    def claim(self, db: Session, force: bool = False) -> Dict[int, List[OutboxMessage]]:
+        """
+        Захват готовых уведомлений, сгруппированных по чатам. Чат готов, когда его самое
+        старое уведомление ждет дольше окна сводки (или сразу при force).
+        """
+        now = _now()
+        ready = [
+            NotificationOutbox.status == NotificationOutbox.PENDING,
+            NotificationOutbox.available_at <= now,
+            or_(NotificationOutbox.claimed_until == None, NotificationOutbox.claimed_until < now)
+        ]
+        query = db.query(NotificationOutbox).filter(*ready)
+        if not force and not self.event_bus:
+            # Окно сводки проверяется в SQL: значения колонки не сравниваются с datetime в Python
+            deadline = now - timedelta(seconds=self.window_seconds)
+            ready_chats = db.query(NotificationOutbox.chat_id).filter(*ready).group_by(
+                NotificationOutbox.chat_id
+            ).having(func.min(NotificationOutbox.available_at) <= deadline)
+            query = query.filter(NotificationOutbox.chat_id.in_(ready_chats.scalar_subquery()))
+        rows = query.order_by(NotificationOutbox.id).limit(self.batch_size).with_for_update(skip_locked=True).all()
+
+        by_chat: Dict[int, List[NotificationOutbox]] = {}
+        for row in rows:
+            by_chat.setdefault(row.chat_id, []).append(row)
+
+        lease = now + timedelta(seconds=self.lease_seconds)
+        claimed: Dict[int, List[OutboxMessage]] = {}
+        for chat_id, chat_rows in by_chat.items():
+            for row in chat_rows:
+                row.claimed_until = lease
+            claimed[chat_id] = [
+                OutboxMessage(row.id, row.idempotency_key, row.found_ticket_id, row.chat_id, row.message)
+                for row in chat_rows
+            ]
+        # Транзакция закрывается до доставки: ожидание Telegram не держит блокировки
+        db.commit()
+        return claimed
+
+    async def drain(self, db: Session, force: bool = False) -> int:
+        """Отправка готовых уведомлений; возвращает число доставленных"""
+        delivered = 0
+        claimed = self.claim(db, force)
+
+        for chat_id, messages in claimed.items():
+            try:
+                flags = await self._deliver(chat_id, messages)
+                error = 'временная ошибка доставки'
+            except Exception as e:
+                logger.error(f"Ошибка доставки уведомлений чату {chat_id}: {e}")
+                flags, error = [False] * len(messages), str(e)[:255]
+
+            # Повторяются только недоставленные уведомления: части сводки, уже ушедшие в чат, не дублируются
+            sent = [message for message, ok in zip(messages, flags) if ok]
+            failed = [message for message, ok in zip(messages, flags) if not ok]
+            if sent:
+                self._mark_sent(db, sent)
+                delivered += len(sent)
+            if failed:
+                self._reschedule(db, failed, error)
+            db.commit()
+
+        self.delivered += delivered
+        return delivered
+
+    async def _deliver(self, chat_id: int, messages: List[OutboxMessage]) -> List[bool]:
+        """Флаги доставки уведомлений в порядке messages"""
+        if self.event_bus:
+            flags = []
+            for message in messages:
+                try:
+                    await self.event_bus.publish({
+                        'idempotency_key': message.idempotency_key,
+                        'ticket_id': message.found_ticket_id,
+                        'chat_id': message.chat_id,
+                        'message': message.message,
+                    })
+                except Exception as e:
+                    logger.error(f"Ошибка публикации уведомления {message.idempotency_key}: {e}")
+                    return flags + [False] * (len(messages) - len(flags))
+                flags.append(True)
+            return flags
+        return await self.deliver_chat(chat_id, [message.message for message in messages])
+
+    def _mark_sent(self, db: Session, messages: List[OutboxMessage]):
+        db.query(NotificationOutbox).filter(NotificationOutbox.id.in_([message.id for message in messages])).update(
+            {
+                NotificationOutbox.status: NotificationOutbox.SENT,
+                NotificationOutbox.sent_at: _now(),
+                NotificationOutbox.claimed_until: None,
+            },
+            synchronize_session=False
+        )
+        # Через поток Redis билет отмечает получатель после отправки в Telegram
+        if not self.event_bus:
+            db.query(FoundTicket).filter(
+                FoundTicket.id.in_([message.found_ticket_id for message in messages])
+            ).update({FoundTicket.is_notified: True}, synchronize_session=False)
+
+    def _reschedule(self, db: Session, messages: List[OutboxMessage], error: Optional[str]):
+        now = _now()
+        rows = db.query(NotificationOutbox).filter(
+            NotificationOutbox.id.in_([message.id for message in messages])
+        ).all()
+        for row in rows:
+            row.attempts += 1
+            row.claimed_until = None
+            row.last_error = error
+            if row.attempts >= self.max_attempts:
+                row.status = NotificationOutbox.FAILED
+                logger.error(f"Уведомление {row.idempotency_key} не доставлено за {row.attempts} попыток")
+            else:
+                row.available_at = now + timedelta(seconds=self.retry_base_seconds * 2 ** (row.attempts - 1))
+
+    def next_ready_at(self, db: Session) -> Optional[datetime]:
+        """Когда истечет окно сводки самого старого ожидающего уведомления"""
+        oldest = db.query(func.min(NotificationOutbox.available_at)).filter(
+            NotificationOutbox.status == NotificationOutbox.PENDING
+        ).scalar()
+        if oldest is None or self.event_bus:
+            return oldest
+        return oldest + timedelta(seconds=self.window_seconds)
+
+    def pending_count(self, db: Session) -> int:
+        return db.query(NotificationOutbox).filter(NotificationOutbox.status == NotificationOutbox.PENDING).count()
+
+
+def purge_sent_notifications(db: Session, older_than_days: int = 7) -> int:
+    """Удаление доставленных записей outbox старше заданного срока"""
+    deadline = _now() - timedelta(days=older_than_days)
+    deleted = db.query(NotificationOutbox).filter(
+        NotificationOutbox.status == NotificationOutbox.SENT,
+        NotificationOutbox.sent_at < deadline
+    ).delete(synchronize_session=False)
+    db.commit()
+    return deleted
@@ -0,0 +1,332 @@
+import codecs
+import hashlib
+import json
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+from html.parser import HTMLParser
+from typing import TYPE_CHECKING, Iterable, Iterator, List, Optional, Tuple
+
+from loguru import logger
+
+from src.records import SEAT_CLASSES, SeatClass, Train, parse_count, parse_price_kopecks, parse_departure_times
+
+if TYPE_CHECKING:
+    from bs4 import BeautifulSoup
+
+
+# Части страницы, которые меняются от запроса к запросу при тех же поездах
+VOLATILE_PATTERNS = (
+    re.compile(rb'<script\b[^>]*>.*?</script>', re.S | re.I),
+    re.compile(rb'<!--.*?-->', re.S),
+    # CSRF-токены, nonce и идентификаторы сессии в атрибутах и скрытых полях
+    re.compile(rb'<(?:meta|input)\b[^>]*(?:csrf|token|nonce|session)[^>]*>', re.I),
+    re.compile(rb'\b(?:nonce|data-(?:csrf|token|request-id|ts|timestamp))="[^"]*"', re.I),
+    # Метки времени с секундами, ISO-даты со временем и unix-время в миллисекундах
+    re.compile(rb'\d{4}-\d{2}-\d{2}[T ]\d{2}:\d{2}:\d{2}(?:\.\d+)?(?:Z|[+-]\d{2}:?\d{2})?'),
+    re.compile(rb'\b\d{1,2}:\d{2}:\d{2}\b'),
+    re.compile(rb'\b1\d{12}\b'),
+    # Параметры сброса кэша в ссылках на статику
+    re.compile(rb'[?&](?:v|_|ts|t)=[\w.-]+'),
+)
+WHITESPACE = re.compile(rb'\s+')
+
+
+def content_fingerprint(content: bytes) -> str:
+    """
+    Отпечаток страницы без изменчивых частей (скрипты, CSRF-токены, метки времени).
+    Одинаковый отпечаток означает тот же набор поездов и мест; разбор не нужен.
+    """
+    for pattern in VOLATILE_PATTERNS:
+        content = pattern.sub(b'', content)
+    content = WHITESPACE.sub(b' ', content)
+    return hashlib.sha256(content).hexdigest()
+
+
+class TrainFingerprint:
+    """
+    Отпечаток набора поездов, который считается по мере потокового разбора. Изменчивые части
+    страницы в разобранные поезда не попадают, поэтому тот же отпечаток - те же поезда и места.
+    """
+
+    def __init__(self):
+        self._digest = hashlib.sha256()
+
+    def update(self, train: Train):
+        self._digest.update(json.dumps(train.to_dict(), sort_keys=True, ensure_ascii=False).encode('utf-8'))
+
+    def hexdigest(self) -> str:
+        # Префикс отличает его от отпечатка тела страницы (content_fingerprint)
+        return f"trains:{self._digest.hexdigest()}"
+
+
+def parse_search_page(content: bytes, departure_date: date) -> List[Train]:
+    """
+    Разбор страницы результатов поиска в записи поездов.
+    Функция верхнего уровня, чтобы ее можно было выполнять в пуле процессов.
+    """
+    # bs4 импортируется при первом разборе, а не при старте процесса
+    from bs4 import BeautifulSoup
+    
+    soup = BeautifulSoup(content, 'html.parser')
+    return parse_search_results(soup, departure_date)
+
+
+def parse_search_results(soup: "BeautifulSoup", departure_date: date) -> List[Train]:
+    """
+    Парсинг результатов поиска
+    """
+    trains = []
+
+    # Ищем блоки с поездами (это примерная структура, нужно адаптировать под реальный сайт)
+    train_blocks = soup.find_all('div', class_='train-item') or soup.find_all('tr', class_='train-row')
+
+    for block in train_blocks:
+        try:
+            train_data = parse_train_block(block, departure_date)
+            if train_data:
+                trains.append(train_data)
+        except Exception as e:
+            logger.warning(f"Ошибка парсинга блока поезда: {e}")
+            continue
+
+    return trains
+
+
+def parse_train_block(block, departure_date: date) -> Optional[Train]:
+    """
+    Парсинг блока с информацией о поезде
+    """
+    try:
+        # Извлекаем номер поезда
+        train_number_elem = block.find('span', class_='train-number') or block.find('td', class_='train-number')
+        train_number = train_number_elem.text.strip().upper() if train_number_elem else None
+
+        # Извлекаем время отправления
+        departure_time_elem = block.find('span', class_='departure-time') or block.find('td', class_='departure-time')
+        departure_time = departure_time_elem.text.strip() if departure_time_elem else None
+
+        # Извлекаем время прибытия
+        arrival_time_elem = block.find('span', class_='arrival-time') or block.find('td', class_='arrival-time')
+        arrival_time = arrival_time_elem.text.strip() if arrival_time_elem else None
+
+        departure_at, arrival_at = parse_departure_times(departure_date, departure_time, arrival_time)
+
+        # Извлекаем доступные места
+        return Train.build(train_number, departure_at, arrival_at, parse_available_seats(block))
+
+    except Exception as e:
+        logger.warning(f"Ошибка парсинга блока поезда: {e}")
+        return None
+
+
+def parse_available_seats(block) -> Tuple[SeatClass, ...]:
+    """
+    Парсинг доступных мест
+    """
+    seats = []
+
+    # Ищем блоки с типами мест
+    for seat_type in SEAT_CLASSES:
+        seat_elem = block.find('span', string=lambda text: text and seat_type in text.lower())
+        if seat_elem:
+            # Извлекаем количество мест и цену
+            parent = seat_elem.parent
+            if parent:
+                count_elem = parent.find('span', class_='count') or parent.find('span', class_='places')
+                price_elem = parent.find('span', class_='price') or parent.find('span', class_='cost')
+
+                seats.append(SeatClass(
+                    name=seat_type,
+                    count=parse_count(count_elem.text) if count_elem else 0,
+                    price=parse_price_kopecks(price_elem.text) if price_elem else None
+                ))
+
+    return tuple(seats)
+
+
+# Блоки поездов и поля внутри них: (теги, классы) в порядке приоритета, как в parse_train_block
+TRAIN_BLOCKS = (('div', 'train-item'), ('tr', 'train-row'))
+TRAIN_FIELDS = {
+    'train_number': (('span', 'td'), ('train-number',)),
+    'departure_time': (('span', 'td'), ('departure-time',)),
+    'arrival_time': (('span', 'td'), ('arrival-time',)),
+}
+SEAT_COUNT_CLASSES = ('count', 'places')
+SEAT_PRICE_CLASSES = ('price', 'cost')
+
+
+def _has_class(element, class_name: str) -> bool:
+    return class_name in (element.get('class') or '').split()
+
+
+def _find(element, tags: Tuple[str, ...], classes: Tuple[str, ...]):
+    """Первый потомок с одним из классов; теги перебираются по приоритету"""
+    for tag in tags:
+        for class_name in classes:
+            for child in element.iter(tag):
+                if child is not element and _has_class(child, class_name):
+                    return child
+    return None
+
+
+def _text(element) -> Optional[str]:
+    return ''.join(element.itertext()).strip() if element is not None else None
+
+
+def _train_from_element(element, departure_date: date) -> Optional[Train]:
+    """Запись поезда из закрытого блока lxml (те же правила, что у parse_train_block)"""
+    try:
+        fields = {name: _text(_find(element, tags, classes)) for name, (tags, classes) in TRAIN_FIELDS.items()}
+        train_number = fields['train_number'].upper() if fields['train_number'] else None
+        departure_at, arrival_at = parse_departure_times(
+            departure_date, fields['departure_time'], fields['arrival_time']
+        )
+
+        seats = []
+        spans = list(element.iter('span'))
+        for seat_type in SEAT_CLASSES:
+            # Как string= в BeautifulSoup: текст элемента без вложенных тегов
+            label = next(
+                (span for span in spans
+                 if len(span) == 0 and span.text and seat_type in span.text.lower()),
+                None
+            )
+            if label is None or label.getparent() is None:
+                continue
+            parent = label.getparent()
+            count_elem = _find(parent, ('span',), SEAT_COUNT_CLASSES)
+            price_elem = _find(parent, ('span',), SEAT_PRICE_CLASSES)
+            seats.append(SeatClass(
+                name=seat_type,
+                count=parse_count(_text(count_elem)) if count_elem is not None else 0,
+                price=parse_price_kopecks(_text(price_elem)) if price_elem is not None else None
+            ))
+
+        return Train.build(train_number, departure_at, arrival_at, tuple(seats))
+
+    except Exception as e:
+        logger.warning(f"Ошибка парсинга блока поезда: {e}")
+        return None
+
+
+class _TrainBlockCollector(HTMLParser):
+    """
+    Инкрементальный токенизатор страницы: вне блоков поездов теги пропускаются,
+    внутри блока собирается небольшое дерево lxml только этого блока
+    """
+
+    VOID_TAGS = frozenset(('area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input',
+                           'link', 'meta', 'source', 'track', 'wbr'))
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        from lxml import etree
+        self._etree = etree
+        self.stack = []
+        self.completed = []
+
+    def handle_starttag(self, tag, attrs):
+        attrs = {name: value or '' for name, value in attrs}
+        if not self.stack:
+            classes = attrs.get('class', '').split()
+            if any(tag == block_tag and class_name in classes for block_tag, class_name in TRAIN_BLOCKS):
+                self.stack.append(self._etree.Element(tag, attrs))
+            return
+        element = self._etree.SubElement(self.stack[-1], tag, attrs)
+        if tag not in self.VOID_TAGS:
+            self.stack.append(element)
+
+    def handle_startendtag(self, tag, attrs):
+        if self.stack:
+            self._etree.SubElement(self.stack[-1], tag, {name: value or '' for name, value in attrs})
+
+    def handle_endtag(self, tag):
+        # Незакрытые теги внутри блока закрываются вместе с родителем
+        for depth in range(len(self.stack) - 1, -1, -1):
+            if self.stack[depth].tag == tag:
+                if depth == 0:
+                    self.completed.append(self.stack[0])
+                del self.stack[depth:]
+                return
+
+    def handle_data(self, data):
+        if not self.stack:
+            return
+        element = self.stack[-1]
+        if len(element):
+            last = element[-1]
+            last.tail = (last.tail or '') + data
+        else:
+            element.text = (element.text or '') + data
+
+
+def iter_search_page(chunks: Iterable[bytes], departure_date: date, encoding: str = 'utf-8') -> Iterator[Train]:
+    """
+    Потоковый разбор страницы результатов: части ответа токенизируются по мере чтения,
+    запись поезда выдается, как только закрывается его блок. Дерево всей страницы
+    не строится: в памяти держится только текущий блок.
+    """
+    decoder = codecs.getincrementaldecoder(encoding)(errors='replace')
+    collector = _TrainBlockCollector()
+
+    def drain() -> Iterator[Train]:
+        blocks, collector.completed = collector.completed, []
+        for block in blocks:
+            train = _train_from_element(block, departure_date)
+            if train:
+                yield train
+
+    for chunk in chunks:
+        if chunk:
+            collector.feed(decoder.decode(chunk))
+            yield from drain()
+    collector.feed(decoder.decode(b'', final=True))
+    collector.close()
+    yield from drain()
+
+
+def iter_chunks(content: bytes, size: int = 16384) -> Iterator[bytes]:
+    """Буфер ответа по частям для потокового разбора"""
+    for offset in range(0, len(content), size):
+        yield content[offset:offset + size]
+
+
+class ParserPool:
+    """
+    Разбор страниц в отдельных процессах: BeautifulSoup нагружает процессор и под GIL
+    конкурирует с обработкой обновлений бота. При size = 0 разбор выполняется в текущем процессе.
+    """
+
+    def __init__(self, size: int = 0):
+        self.size = size if size >= 0 else (os.cpu_count() or 1)
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    def parse(self, content: bytes, departure_date: date) -> List[Train]:
+        """Разбор страницы (в пуле, если он включен)"""
+        if not self.size:
+            return parse_search_page(content, departure_date)
+        return self._get_executor().submit(parse_search_page, content, departure_date).result()
+
+    def iter_parse(self, chunks: Iterable[bytes], departure_date: date,
+                   encoding: str = 'utf-8') -> Iterable[Train]:
+        """
+        Потоковый разбор в текущем процессе. Пул процессов получает страницу целиком, потому что
+        генератор нельзя передать в другой процесс: с PARSER_POOL_SIZE != 0 потокового разбора нет.
+        """
+        if not self.size:
+            return iter_search_page(chunks, departure_date, encoding)
+        return self.parse(b''.join(chunks), departure_date)
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.size)
+            logger.info(f"Запущен пул разбора страниц: {self.size} процессов")
+        return self._executor
+
+    def shutdown(self):
+        """Остановка процессов пула"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
@@ -0,0 +1,242 @@
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from loguru import logger
+from sqlalchemy.orm import Session
+
+from src.config import settings
+from src.models import TrainSeatSeries, TrainSeatSeriesChunk
+from src.utils import RouteKey
+
+
+# Точка ряда: (смещение от начала блока в секундах, количество мест, цена в копейках или -1)
+Point = Tuple[int, int, int]
+
+NO_PRICE = -1
+
+CHECK, HOUR, DAY = 'check', 'hour', 'day'
+
+
+def _zigzag(value: int) -> int:
+    return value << 1 if value >= 0 else ((-value) << 1) - 1
+
+
+def _unzigzag(value: int) -> int:
+    return value >> 1 if not value & 1 else -((value + 1) >> 1)
+
+
+def _write_varint(out: bytearray, value: int):
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def encode_points(points: Iterable[Point], previous: Point = (0, 0, NO_PRICE)) -> bytes:
+    """
+    Дельта-кодирование точек: разности с предыдущей точкой в zigzag varint.
+    Точка, у которой не изменились места и цена, занимает 3-4 байта.
+    """
+    out = bytearray()
+    for point in points:
+        for value, last in zip(point, previous):
+            _write_varint(out, _zigzag(value - last))
+        previous = point
+    return bytes(out)
+
+
+def decode_points(payload: bytes) -> List[Point]:
+    """Точки блока в порядке записи"""
+    points = []
+    values = []
+    previous = (0, 0, NO_PRICE)
+    value, shift = 0, 0
+    for byte in payload:
+        value |= (byte & 0x7F) << shift
+        if byte & 0x80:
+            shift += 7
+            continue
+        values.append(_unzigzag(value) + previous[len(values)])
+        value, shift = 0, 0
+        if len(values) == 3:
+            previous = tuple(values)
+            points.append(previous)
+            values = []
+    return points
+
+
+def bucket_start(moment: datetime, resolution: str) -> datetime:
+    """Начало блока: час для точек проверок, сутки для почасовых, месяц для посуточных"""
+    if resolution == CHECK:
+        return moment.replace(minute=0, second=0, microsecond=0)
+    if resolution == HOUR:
+        return moment.replace(hour=0, minute=0, second=0, microsecond=0)
+    return moment.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def append_point(chunk: TrainSeatSeriesChunk, offset: int, count: int, price: Optional[int]):
+    """Дописывание точки в блок без разбора уже записанных"""
+    point = (offset, count, NO_PRICE if price is None else price)
+    chunk.payload += encode_points([point], (chunk.last_offset, chunk.last_count, chunk.last_price))
+    chunk.last_offset, chunk.last_count, chunk.last_price = point
+    chunk.point_count += 1
+
+
+def new_chunk(series_id: int, resolution: str, start: datetime) -> TrainSeatSeriesChunk:
+    return TrainSeatSeriesChunk(series_id=series_id, resolution=resolution, bucket_start=start, point_count=0,
+                                payload=b'', last_offset=0, last_count=0, last_price=NO_PRICE)
+
+
+def series_key(route_key: RouteKey, train_number: Optional[str], departure_time: Optional[datetime],
+               seat_class: str) -> str:
+    time_text = departure_time.strftime('%H:%M') if departure_time else ''
+    return (f"{route_key.departure_station}:{route_key.arrival_station}:{route_key.departure_date.isoformat()}:"
+            f"{train_number or ''}:{time_text}:{seat_class}")
+
+
+class PriceHistoryRecorder:
+    """
+    Запись мест и минимальных цен по классам мест каждого поезда при каждой проверке.
+
+    Точки проверок за час копятся в одном блоке ряда; если поезд есть на странице,
+    а класса мест больше нет, записывается ноль мест. Поезда, которых нет на странице,
+    не записываются: страница могла быть отфильтрована по номеру поезда или времени.
+    """
+
+    def record(self, db: Session, route_key: RouteKey, snapshot: List[Dict], checked_at: datetime) -> int:
+        """Точки одной проверки маршрута (коммит остается за вызывающим кодом); возвращает число точек"""
+        samples: Dict[str, Tuple[Optional[str], Optional[datetime], str, int, Optional[int]]] = {}
+        for train in snapshot:
+            departure_time = datetime.fromisoformat(train['departure_time']) if train.get('departure_time') else None
+            for seat_class, seat in (train.get('available_seats') or {}).items():
+                key = series_key(route_key, train.get('train_number'), departure_time, seat_class)
+                samples[key] = (train.get('train_number'), departure_time, seat_class, seat.get('count') or 0,
+                                seat.get('price'))
+        if not samples:
+            return 0
+
+        # Ключ ряда заканчивается классом мест: без него остается ключ поезда
+        trains = {key.rsplit(':', 1)[0] for key in samples}
+        series = {
+            item.series_key: item for item in route_series(db, route_key)
+            if item.series_key.rsplit(':', 1)[0] in trains
+        }
+        for key, (train_number, departure_time, seat_class, _, _) in samples.items():
+            if key not in series:
+                series[key] = TrainSeatSeries(
+                    series_key=key,
+                    departure_station=route_key.departure_station,
+                    arrival_station=route_key.arrival_station,
+                    departure_date=route_key.departure_date,
+                    train_number=train_number,
+                    departure_time=departure_time,
+                    seat_class=seat_class,
+                )
+                db.add(series[key])
+        db.flush()
+
+        bucket = bucket_start(checked_at, CHECK)
+        offset = int((checked_at - bucket).total_seconds())
+        chunks = {
+            chunk.series_id: chunk for chunk in db.query(TrainSeatSeriesChunk).filter(
+                TrainSeatSeriesChunk.series_id.in_([item.id for item in series.values()]),
+                TrainSeatSeriesChunk.resolution == CHECK,
+                TrainSeatSeriesChunk.bucket_start == bucket
+            )
+        }
+
+        for key, item in series.items():
+            # Класс мест поезда, который есть на странице, но без мест - ноль
+            _, _, _, count, price = samples.get(key, (None, None, None, 0, None))
+            chunk = chunks.get(item.id)
+            if chunk is None:
+                chunk = new_chunk(item.id, CHECK, bucket)
+                db.add(chunk)
+            append_point(chunk, offset, count, price)
+        return len(series)
+
+
+def _aggregate(points: List[Point]) -> Tuple[int, int]:
+    """Агрегат блока: максимум мест и минимальная известная цена"""
+    prices = [price for _, _, price in points if price != NO_PRICE]
+    return max(count for _, count, _ in points), min(prices) if prices else NO_PRICE
+
+
+def downsample(db: Session, source: str, target: str, older_than: datetime, batch_size: int = 1000) -> int:
+    """
+    Свертка блоков source старше older_than в точки target: каждый блок дает одну точку
+    (максимум мест, минимальная цена). Возвращает число свернутых блоков.
+    """
+    total = 0
+    while True:
+        chunks = db.query(TrainSeatSeriesChunk).filter(
+            TrainSeatSeriesChunk.resolution == source,
+            TrainSeatSeriesChunk.bucket_start < older_than
+        ).order_by(TrainSeatSeriesChunk.series_id, TrainSeatSeriesChunk.bucket_start).limit(batch_size).all()
+        if not chunks:
+            return total
+
+        targets: Dict[Tuple[int, datetime], TrainSeatSeriesChunk] = {}
+        for chunk in chunks:
+            target_bucket = bucket_start(chunk.bucket_start, target)
+            target_key = (chunk.series_id, target_bucket)
+            target_chunk = targets.get(target_key)
+            if target_chunk is None:
+                target_chunk = db.query(TrainSeatSeriesChunk).filter(
+                    TrainSeatSeriesChunk.series_id == chunk.series_id,
+                    TrainSeatSeriesChunk.resolution == target,
+                    TrainSeatSeriesChunk.bucket_start == target_bucket
+                ).first()
+                if target_chunk is None:
+                    target_chunk = new_chunk(chunk.series_id, target, target_bucket)
+                    db.add(target_chunk)
+                targets[target_key] = target_chunk
+
+            points = decode_points(chunk.payload)
+            if points:
+                count, price = _aggregate(points)
+                offset = int((chunk.bucket_start - target_bucket).total_seconds())
+                append_point(target_chunk, offset, count, None if price == NO_PRICE else price)
+            db.delete(chunk)
+
+        db.commit()
+        total += len(chunks)
+
+
+def downsample_price_history(db: Session, now: Optional[datetime] = None) -> Dict:
+    """Свертка старых точек (проверки -> часы -> сутки) и удаление рядов давно ушедших поездов"""
+    now = now or datetime.now()
+    hourly = downsample(db, CHECK, HOUR, now - timedelta(days=settings.price_history_raw_days),
+                        settings.price_history_downsample_batch)
+    daily = downsample(db, HOUR, DAY, now - timedelta(days=settings.price_history_hourly_days),
+                       settings.price_history_downsample_batch)
+
+    expired = db.query(TrainSeatSeries).filter(
+        TrainSeatSeries.departure_date < now.date() - timedelta(days=settings.price_history_retention_days)
+    ).all()
+    for item in expired:
+        db.delete(item)
+    db.commit()
+
+    logger.info(f"История цен: свернуто блоков {hourly} в часы, {daily} в сутки, удалено рядов {len(expired)}")
+    return {'hourly': hourly, 'daily': daily, 'expired_series': len(expired)}
+
+
+def series_points(db: Session, series_id: int) -> List[Tuple[datetime, int, Optional[int]]]:
+    """Точки ряда всех разрешений по времени: (момент, количество мест, цена в копейках)"""
+    points = []
+    for chunk in db.query(TrainSeatSeriesChunk).filter(TrainSeatSeriesChunk.series_id == series_id):
+        for offset, count, price in decode_points(chunk.payload):
+            points.append((chunk.bucket_start + timedelta(seconds=offset), count,
+                           None if price == NO_PRICE else price))
+    points.sort(key=lambda point: point[0])
+    return points
+
+
+def route_series(db: Session, route_key: RouteKey) -> List[TrainSeatSeries]:
+    """Ряды всех поездов и классов мест маршрута на дату"""
+    return db.query(TrainSeatSeries).filter(
+        TrainSeatSeries.departure_station == route_key.departure_station,
+        TrainSeatSeries.arrival_station == route_key.arrival_station,
+        TrainSeatSeries.departure_date == route_key.departure_date
+    ).order_by(TrainSeatSeries.departure_time, TrainSeatSeries.seat_class).all()
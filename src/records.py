@@ -0,0 +1,108 @@
+from dataclasses import dataclass
+from datetime import date, datetime, time, timedelta
+from typing import Dict, Optional, Tuple
+import re
+
+
+# Классы мест в порядке битов маски
+SEAT_CLASSES = ('плацкарт', 'купе', 'св', 'сидячие', 'люкс')
+SEAT_CLASS_BITS = {name: 1 << index for index, name in enumerate(SEAT_CLASSES)}
+
+
+@dataclass(frozen=True, slots=True)
+class SeatClass:
+    """Класс мест поезда: количество свободных мест и минимальная цена в копейках"""
+    name: str
+    count: int
+    price: Optional[int] = None
+
+    @property
+    def bit(self) -> int:
+        return SEAT_CLASS_BITS.get(self.name, 0)
+
+    def to_dict(self) -> Dict:
+        return {'count': self.count, 'price': self.price}
+
+
+@dataclass(frozen=True, slots=True)
+class Train:
+    """Поезд из результата поиска, разобранный один раз парсером"""
+    train_number: Optional[str]
+    departure_time: Optional[datetime]
+    arrival_time: Optional[datetime]
+    seats: Tuple[SeatClass, ...] = ()
+    seat_mask: int = 0  # классы мест, в которых есть свободные места
+
+    @classmethod
+    def build(cls, train_number: Optional[str], departure_time: Optional[datetime],
+              arrival_time: Optional[datetime], seats: Tuple[SeatClass, ...]) -> 'Train':
+        mask = 0
+        for seat in seats:
+            if seat.count > 0:
+                mask |= seat.bit
+        return cls(train_number, departure_time, arrival_time, seats, mask)
+
+    @property
+    def departure_minutes(self) -> Optional[int]:
+        """Время отправления в минутах от начала суток"""
+        if not self.departure_time:
+            return None
+        return self.departure_time.hour * 60 + self.departure_time.minute
+
+    def seats_dict(self) -> Dict[str, Dict]:
+        return {seat.name: seat.to_dict() for seat in self.seats}
+
+    def prices_dict(self) -> Dict[str, int]:
+        return {seat.name: seat.price for seat in self.seats if seat.price is not None}
+
+    def to_dict(self) -> Dict:
+        """Представление для JSON (снимок маршрута)"""
+        return {
+            'train_number': self.train_number,
+            'departure_time': self.departure_time.isoformat() if self.departure_time else None,
+            'arrival_time': self.arrival_time.isoformat() if self.arrival_time else None,
+            'available_seats': self.seats_dict(),
+        }
+
+
+def parse_count(text: Optional[str]) -> int:
+    """Количество мест из текста ('12 мест' -> 12)"""
+    digits = ''.join(filter(str.isdigit, text or ''))
+    return int(digits) if digits else 0
+
+
+def parse_price_kopecks(text: Optional[str]) -> Optional[int]:
+    """Цена в копейках из текста ('от 2 345,50 ₽' -> 234550)"""
+    if not text:
+        return None
+    price_match = re.search(r'\d[\d\s ]*(?:[.,]\d{1,2})?', text)
+    if not price_match:
+        return None
+    number = re.sub(r'[\s ]', '', price_match.group()).replace(',', '.')
+    rubles, _, kopecks = number.partition('.')
+    return int(rubles) * 100 + (int(kopecks.ljust(2, '0')) if kopecks else 0)
+
+
+def parse_departure_times(departure_date: date, departure_text: Optional[str],
+                          arrival_text: Optional[str]) -> Tuple[Optional[datetime], Optional[datetime]]:
+    """
+    Время отправления и прибытия (ЧЧ:ММ) в виде datetime; прибытие раньше отправления
+    означает прибытие на следующие сутки
+    """
+    departure = _combine(departure_date, departure_text)
+    arrival = _combine(departure_date, arrival_text)
+    if departure and arrival and arrival < departure:
+        arrival += timedelta(days=1)
+    return departure, arrival
+
+
+def _combine(day: date, text: Optional[str]) -> Optional[datetime]:
+    if not text:
+        return None
+    time_match = re.search(r'(\d{1,2}):(\d{2})', text)
+    if not time_match:
+        return None
+    hours, minutes = int(time_match.group(1)), int(time_match.group(2))
+    if hours > 23 or minutes > 59:
+        return None
+    return datetime.combine(day, time(hours, minutes))
@@ -0,0 +1,167 @@
+import time
+from collections import defaultdict
+from datetime import date, datetime
+from typing import Dict, Iterable, List, Optional
+
+from loguru import logger
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session, selectinload
+
+from src.archive import ResponseArchive
+from src.circuit_breaker import CircuitBreaker
+from src.config import settings
+from src.database import Base
+from src.metrics import metrics
+from src.models import RouteWatch, Subscription, User
+from src.parser import ParserPool, content_fingerprint, iter_chunks
+from src.records import Train
+from src.utils import RouteKey
+
+
+class ReplayScraper:
+    """
+    Подмена RZDScraper, отдающая ответы из архива вместо запросов к РЖД.
+    Ответы маршрута выдаются по кругу в порядке записи; разбор - тем же ParserPool.
+    """
+
+    def __init__(self, archive: ResponseArchive):
+        self.archive = archive
+        self.breaker = CircuitBreaker.from_settings()
+        self.parser = ParserPool(settings.parser_pool_size)
+        self.responses: Dict[RouteKey, List[bytes]] = defaultdict(list)
+        self._positions: Dict[RouteKey, int] = defaultdict(int)
+        self._fingerprints: Dict[RouteKey, str] = {}
+        self.searches = 0
+
+        for entry in archive.entries():
+            if entry.get('status', 200) != 200:
+                continue
+            content = archive.load(entry['sha256'])
+            if content is None:
+                continue
+            route_key = RouteKey(
+                entry['departure_station'],
+                entry['arrival_station'],
+                date.fromisoformat(entry['departure_date'])
+            )
+            self.responses[route_key].append(content)
+
+    def search_tickets(self, departure_station: str, arrival_station: str,
+                       departure_date: date, train_number: Optional[str] = None,
+                       time_from: str = '00:00', time_to: str = '23:59',
+                       conditional: bool = False, stream: bool = False) -> Optional[Iterable[Train]]:
+        """Следующий архивный ответ маршрута (None - содержимое не изменилось с прошлой проверки)"""
+        route_key = RouteKey(departure_station, arrival_station, departure_date)
+        pages = self.responses.get(route_key)
+        if not pages:
+            return []
+        position = self._positions[route_key]
+        self._positions[route_key] = position + 1
+        self.searches += 1
+        content = pages[position % len(pages)]
+        
+        fingerprint = content_fingerprint(content)
+        unchanged = conditional and self._fingerprints.get(route_key) == fingerprint
+        self._fingerprints[route_key] = fingerprint
+        if conditional:
+            metrics.increment('rzd_search_fingerprint_hits' if unchanged else 'rzd_search_fingerprint_misses')
+        if unchanged:
+            return None
+        if stream:
+            return self.parser.iter_parse(iter_chunks(content), departure_date)
+        return self.parser.parse(content, departure_date)
+
+
+class NullBot:
+    """Клиент Telegram, который ничего не отправляет"""
+
+    def __init__(self):
+        self.sent = 0
+
+    async def send_message(self, **kwargs):
+        self.sent += 1
+
+
+def seed_replay_database(db: Session, routes: List[RouteKey]):
+    """Один пользователь и по одной подписке на любой поезд для каждого маршрута архива"""
+    user = User(telegram_id=0, username='replay')
+    db.add(user)
+    db.flush()
+    for route_key in routes:
+        subscription = Subscription(
+            user_id=user.id,
+            departure_station=route_key.departure_station,
+            arrival_station=route_key.arrival_station,
+            departure_date=route_key.departure_date,
+            check_frequency=settings.check_interval_minutes,
+            is_active=True
+        )
+        watch = RouteWatch(
+            departure_station=route_key.departure_station,
+            arrival_station=route_key.arrival_station,
+            departure_date=route_key.departure_date,
+            subscriber_count=1,
+            is_active=True,
+            check_frequency=settings.check_interval_minutes
+        )
+        subscription.route_watches.append(watch)
+        db.add(subscription)
+    db.commit()
+
+
+async def replay(archive_dir: str, cycles: int = 10, database_url: str = 'sqlite://') -> Dict:
+    """
+    Прогон архивных ответов через MonitoringService без пауз между циклами.
+    По умолчанию использует отдельную базу в памяти, рабочая база не затрагивается.
+    """
+    from src.monitoring import MonitoringService
+
+    archive = ResponseArchive(archive_dir, max_bytes=settings.response_archive_max_mb * 1024 * 1024)
+    scraper = ReplayScraper(archive)
+    routes = sorted(scraper.responses)
+    if not routes:
+        logger.warning(f"В архиве {archive_dir} нет ответов для воспроизведения")
+        return {'routes': 0, 'cycles': 0, 'checks': 0}
+
+    engine = create_engine(database_url)
+    Base.metadata.create_all(engine)
+    monitoring = MonitoringService(scraper=scraper)
+    monitoring.bot = NullBot()
+    metrics.reset()
+
+    cycle_times = []
+    with Session(engine, expire_on_commit=False) as db:
+        seed_replay_database(db, routes)
+        watches = db.query(RouteWatch).options(
+            selectinload(RouteWatch.subscriptions).selectinload(Subscription.user)
+        ).all()
+
+        for _ in range(cycles):
+            started = time.perf_counter()
+            await monitoring.check_route_watches(watches, db)
+            cycle_times.append(time.perf_counter() - started)
+        await monitoring.flush_notifications(db, force=True)
+
+    scraper.parser.shutdown()
+    elapsed = sum(cycle_times)
+    result = {
+        'routes': len(routes),
+        'responses': sum(len(pages) for pages in scraper.responses.values()),
+        'cycles': cycles,
+        'checks': scraper.searches,
+        'elapsed_seconds': round(elapsed, 3),
+        'checks_per_second': round(scraper.searches / elapsed, 1) if elapsed else None,
+        'cycle_seconds_avg': round(elapsed / cycles, 4),
+        'cycle_seconds_max': round(max(cycle_times), 4),
+        'notifications': monitoring.bot.sent,
+        'fingerprint_hit_ratio': metrics.hit_ratio(
+            'rzd_search_fingerprint_hits', 'rzd_search_fingerprint_misses'
+        ),
+        'metrics': metrics.snapshot(),
+        'finished_at': datetime.now().isoformat(),
+    }
+    logger.info(
+        f"Воспроизведение: {result['checks']} проверок за {result['elapsed_seconds']} с "
+        f"({result['checks_per_second']} проверок/с)"
+    )
+    return result
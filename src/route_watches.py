@@ -0,0 +1,124 @@
+from datetime import date, datetime
+from typing import List
+
+from loguru import logger
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session, selectinload
+
+from src.models import RouteWatch, Subscription
+
+
+def get_or_create_route_watch(db: Session, departure_station: str, arrival_station: str,
+                              departure_date: date) -> RouteWatch:
+    """
+    Маршрут на дату с блокировкой строки (создается при первом обращении)
+    """
+    db.execute(
+        insert(RouteWatch.__table__)
+        .values(
+            departure_station=departure_station,
+            arrival_station=arrival_station,
+            departure_date=departure_date,
+            subscriber_count=0,
+            is_active=False,
+        )
+        .on_conflict_do_nothing(constraint="uq_route_watches_route")
+    )
+    return db.query(RouteWatch).filter(
+        RouteWatch.departure_station == departure_station,
+        RouteWatch.arrival_station == arrival_station,
+        RouteWatch.departure_date == departure_date,
+    ).with_for_update().one()
+
+
+def attach_subscription(db: Session, subscription: Subscription) -> List[RouteWatch]:
+    """
+    Привязка подписки к маршрутам всех ее дат. Первый подписчик активирует маршрут.
+    Коммит остается за вызывающим кодом.
+    """
+    watches = []
+    for departure_date in subscription.departure_dates():
+        watch = get_or_create_route_watch(
+            db, subscription.departure_station, subscription.arrival_station, departure_date
+        )
+        if watch in subscription.route_watches:
+            continue
+
+        subscription.route_watches.append(watch)
+        watch.subscriber_count += 1
+        frequency = subscription.check_frequency or 10
+
+        if not watch.is_active:
+            # Маршрут активируется: проверяем сразу
+            watch.is_active = True
+            watch.check_frequency = frequency
+            watch.next_check_at = datetime.now()
+            logger.info(f"Маршрут {watch.route_key} активирован")
+        elif frequency < watch.check_frequency:
+            watch.check_frequency = frequency
+
+        watches.append(watch)
+
+    return watches
+
+
+def detach_subscription(db: Session, subscription: Subscription) -> List[RouteWatch]:
+    """
+    Отвязка подписки от ее маршрутов. Маршрут без подписчиков выводится из проверок.
+    Коммит остается за вызывающим кодом.
+    """
+    watches = list(subscription.route_watches)
+    for watch in watches:
+        db.refresh(watch, with_for_update=True)
+        subscription.route_watches.remove(watch)
+        watch.subscriber_count = max(0, watch.subscriber_count - 1)
+
+        remaining = [s for s in watch.subscriptions if s.is_active and s.id != subscription.id]
+        if watch.subscriber_count == 0 or not remaining:
+            retire_route_watch(watch)
+        else:
+            watch.check_frequency = min(s.check_frequency or 10 for s in remaining)
+
+    return watches
+
+
+def retire_route_watch(watch: RouteWatch):
+    """Вывод маршрута из проверок"""
+    watch.subscriber_count = 0
+    watch.is_active = False
+    watch.next_check_at = None
+    logger.info(f"Маршрут {watch.route_key} выведен из проверок")
+
+
+def reconcile_route_watches(db: Session) -> dict:
+    """
+    Сверка маршрутов с подписками: привязывает подписки без маршрутов (созданные до
+    появления route_watches), пересчитывает счетчики и выводит прошедшие даты
+    """
+    attached = 0
+    orphaned = db.query(Subscription).filter(
+        Subscription.is_active == True,
+        ~Subscription.route_watches.any()
+    ).all()
+    for subscription in orphaned:
+        if attach_subscription(db, subscription):
+            attached += 1
+    db.flush()
+
+    retired = 0
+    today = date.today()
+    watches = db.query(RouteWatch).filter(RouteWatch.is_active == True).options(
+        selectinload(RouteWatch.subscriptions)
+    ).all()
+    for watch in watches:
+        active = [s for s in watch.subscriptions if s.is_active]
+        if not active or watch.departure_date < today:
+            retire_route_watch(watch)
+            retired += 1
+            continue
+        watch.subscriber_count = len(active)
+        watch.check_frequency = min(s.check_frequency or 10 for s in active)
+
+    db.commit()
+    logger.info(f"Сверка маршрутов: привязано подписок {attached}, выведено маршрутов {retired}")
+    return {'attached': attached, 'retired': retired}
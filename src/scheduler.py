@@ -0,0 +1,210 @@
+import time
+from datetime import datetime
+from typing import Iterable, List, Optional
+
+from loguru import logger
+from sqlalchemy.orm import Session
+
+from src.config import settings
+from src.models import RouteWatch
+
+
+# Атомарный захват наступивших маршрутов: захваченный маршрут переносится на время аренды,
+# чтобы другой тикер его не взял, а упавшая проверка повторилась после аренды. Маршрут
+# с отметкой «в работе» (задача еще в очереди или выполняется) не ставится повторно,
+# пока отметка не снята задачей или не устарела
+POP_DUE_SCRIPT = """
+local due = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, tonumber(ARGV[2]))
+local claimed = {}
+for _, member in ipairs(due) do
+    redis.call('ZADD', KEYS[1], 'XX', ARGV[3], member)
+    local started = redis.call('HGET', KEYS[2], member)
+    if not started or tonumber(started) < tonumber(ARGV[4]) then
+        redis.call('HSET', KEYS[2], member, ARGV[1])
+        table.insert(claimed, member)
+    end
+end
+return claimed
+"""
+
+
+class RouteScheduler:
+    """
+    Расписание проверок маршрутов в сортированном множестве Redis: элемент - id маршрута,
+    вес - время следующей проверки (Unix time). Тикер раз в секунду забирает наступившие
+    маршруты и ставит задачи проверки, поэтому частота каждого маршрута соблюдается
+    с точностью до секунды, а не до шага beat.
+
+    Поставленный маршрут отмечается в хеше «в работе» и не ставится снова, даже если
+    очередь проверок дольше аренды; отметку снимает задача (complete) после переноса
+    маршрута на следующее время, а отметка упавшей задачи устаревает через inflight_seconds.
+    """
+
+    def __init__(self, redis_client, key: str = 'rzd:route_schedule', lease_seconds: int = 300,
+                 inflight_seconds: int = 1800):
+        self.redis = redis_client
+        self.key = key
+        self.inflight_key = f"{key}:inflight"
+        self.lease_seconds = lease_seconds
+        self.inflight_seconds = inflight_seconds
+        self._pop_due = redis_client.register_script(POP_DUE_SCRIPT)
+
+    @classmethod
+    def from_settings(cls, redis_client) -> 'RouteScheduler':
+        return cls(redis_client, key=settings.scheduler_key, lease_seconds=settings.scheduler_lease_seconds,
+                   inflight_seconds=settings.scheduler_inflight_seconds)
+
+    def schedule(self, watch_id: int, when: Optional[datetime] = None):
+        """Постановка маршрута в расписание (без времени - проверить сейчас)"""
+        self.redis.zadd(self.key, {str(watch_id): when.timestamp() if when else time.time()})
+
+    def unschedule(self, watch_id: int):
+        pipeline = self.redis.pipeline()
+        pipeline.zrem(self.key, str(watch_id))
+        pipeline.hdel(self.inflight_key, str(watch_id))
+        pipeline.execute()
+
+    def complete(self, watch_ids: Iterable[int]):
+        """Снятие отметки «в работе» после проверки: маршрут снова может быть поставлен"""
+        members = [str(watch_id) for watch_id in watch_ids]
+        if members:
+            self.redis.hdel(self.inflight_key, *members)
+
+    def sync_watches(self, watches: Iterable[RouteWatch]):
+        """Перенос маршрутов в расписание по их next_check_at; неактивные удаляются"""
+        pipeline = self.redis.pipeline()
+        for watch in watches:
+            if watch.is_active:
+                when = watch.next_check_at.timestamp() if watch.next_check_at else time.time()
+                pipeline.zadd(self.key, {str(watch.id): when})
+            else:
+                pipeline.zrem(self.key, str(watch.id))
+                pipeline.hdel(self.inflight_key, str(watch.id))
+        pipeline.execute()
+
+    def pop_due(self, limit: int = 100, now: Optional[float] = None) -> List[int]:
+        """Захват маршрутов, время проверки которых наступило"""
+        now = now or time.time()
+        members = self._pop_due(
+            keys=[self.key, self.inflight_key],
+            args=[now, limit, now + self.lease_seconds, now - self.inflight_seconds]
+        )
+        return [int(member) for member in members]
+
+    def rebuild(self, db: Session) -> int:
+        """Полная сверка расписания с базой: активные маршруты добавляются, остальные удаляются"""
+        today = datetime.now().date()
+        watches = db.query(RouteWatch.id, RouteWatch.next_check_at).filter(
+            RouteWatch.is_active == True,
+            RouteWatch.departure_date >= today
+        ).all()
+        active = {str(watch_id): next_check_at.timestamp() if next_check_at else time.time()
+                  for watch_id, next_check_at in watches}
+
+        scheduled = {member.decode() if isinstance(member, bytes) else member
+                     for member in self.redis.zrange(self.key, 0, -1)}
+        pipeline = self.redis.pipeline()
+        stale = scheduled - set(active)
+        if stale:
+            pipeline.zrem(self.key, *stale)
+            pipeline.hdel(self.inflight_key, *stale)
+        # Уже запланированные маршруты не трогаем: их вес может быть арендой идущей проверки
+        missing = {member: score for member, score in active.items() if member not in scheduled}
+        if missing:
+            pipeline.zadd(self.key, missing)
+        pipeline.execute()
+        return len(missing)
+
+    def size(self) -> int:
+        return self.redis.zcard(self.key)
+
+
+_route_scheduler: Optional[RouteScheduler] = None
+
+
+def create_route_scheduler() -> Optional[RouteScheduler]:
+    """Расписание в Redis, если проверки планируются им, а не шагом beat (один клиент на процесс)"""
+    global _route_scheduler
+    if settings.check_scheduler != 'redis':
+        return None
+    if _route_scheduler is None:
+        import redis
+
+        _route_scheduler = RouteScheduler.from_settings(redis.Redis.from_url(settings.redis_url))
+    return _route_scheduler
+
+
+def sync_scheduled_watches(watches: Iterable[RouteWatch]):
+    """Немедленный перенос изменений маршрутов в расписание (после коммита)"""
+    scheduler = create_route_scheduler()
+    if not scheduler:
+        return
+    try:
+        scheduler.sync_watches(watches)
+    except Exception as e:
+        # Расписание сверяется с базой при следующей полной сверке тикера
+        logger.warning(f"Не удалось обновить расписание проверок: {e}")
+
+
+def complete_scheduled_watches(watch_ids: Iterable[int]):
+    """Снятие отметки «в работе» с маршрутов, проверку которых поставил тикер"""
+    scheduler = create_route_scheduler()
+    if not scheduler:
+        return
+    try:
+        scheduler.complete(watch_ids)
+    except Exception as e:
+        # Отметка устареет сама через SCHEDULER_INFLIGHT_SECONDS
+        logger.warning(f"Не удалось снять отметку проверки маршрутов: {e}")
+
+
+def run_ticker(scheduler: RouteScheduler, enqueue, batch_size: int = 20, tick_seconds: float = 1.0,
+               rebuild_seconds: float = 300):
+    """
+    Тикер: раз в tick_seconds забирает наступившие маршруты и передает их в enqueue
+    пачками по batch_size; раз в rebuild_seconds сверяет расписание с базой.
+    """
+    from src.database import engine
+
+    last_rebuild = 0.0
+    logger.info(f"Тикер расписания проверок запущен (шаг {tick_seconds} с)")
+    while True:
+        try:
+            if time.monotonic() - last_rebuild >= rebuild_seconds:
+                with Session(engine) as db:
+                    added = scheduler.rebuild(db)
+                if added:
+                    logger.info(f"В расписание добавлено маршрутов: {added}")
+                last_rebuild = time.monotonic()
+
+            limit = batch_size * 10
+            due = scheduler.pop_due(limit=limit)
+            for start in range(0, len(due), batch_size):
+                enqueue(due[start:start + batch_size])
+            if due:
+                logger.info(f"Поставлено проверок маршрутов: {len(due)}")
+            if len(due) == limit:
+                continue  # наступивших больше, чем забрано за шаг
+        except Exception as e:
+            logger.error(f"Ошибка тикера расписания: {e}")
+        time.sleep(tick_seconds)
+
+
+def main():
+    from src.tasks import check_route_watches_task
+
+    scheduler = create_route_scheduler()
+    if not scheduler:
+        logger.error("Тикер не нужен: CHECK_SCHEDULER не равен redis, проверки планирует beat")
+        return
+    run_ticker(
+        scheduler,
+        enqueue=lambda watch_ids: check_route_watches_task.apply_async(args=[watch_ids]),
+        batch_size=settings.scheduler_batch_size,
+        tick_seconds=settings.scheduler_tick_seconds,
+        rebuild_seconds=settings.scheduler_rebuild_seconds,
+    )
+
+
+if __name__ == "__main__":
+    main()
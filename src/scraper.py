@@ -1,11 +1,128 @@
 import requests
-from bs4 import BeautifulSoup
 import time
-import json
-from typing import Dict, List, Optional
-from datetime import datetime, date
+from collections import OrderedDict
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from urllib.parse import urlencode
+from datetime import date
 from loguru import logger
 from src.config import settings
+from src.archive import ResponseArchive
+from src.browser_pool import BrowserPool
+from src.circuit_breaker import CircuitBreaker
+from src.metrics import metrics
+from src.parser import ParserPool, TrainFingerprint, content_fingerprint, iter_chunks
+from src.records import Train
+
+
+def _accept_encoding() -> str:
+    """Поддерживаемые сжатия: brotli - только если urllib3 может его распаковать"""
+    encodings = ['gzip', 'deflate']
+    try:
+        import brotli  # noqa: F401
+        encodings.append('br')
+    except ImportError:
+        try:
+            import brotlicffi  # noqa: F401
+            encodings.append('br')
+        except ImportError:
+            pass
+    return ', '.join(encodings)
+
+
+class ValidatorCache:
+    """
+    ETag, Last-Modified и отпечаток содержимого последних разобранных ответов
+    по URL запроса (LRU)
+    """
+    
+    def __init__(self, max_entries: int = 2048):
+        self.max_entries = max_entries
+        self._entries: 'OrderedDict[str, Tuple[Optional[str], Optional[str], Optional[str]]]' = OrderedDict()
+    
+    def headers(self, key: str) -> Dict[str, str]:
+        """Заголовки условного запроса"""
+        validators = self._entries.get(key)
+        if not validators:
+            return {}
+        self._entries.move_to_end(key)
+        etag, last_modified, _ = validators
+        headers = {}
+        if etag:
+            headers['If-None-Match'] = etag
+        if last_modified:
+            headers['If-Modified-Since'] = last_modified
+        return headers
+    
+    def fingerprint(self, key: str) -> Optional[str]:
+        """Отпечаток последнего разобранного ответа"""
+        validators = self._entries.get(key)
+        return validators[2] if validators else None
+    
+    def store(self, key: str, response: requests.Response, fingerprint: Optional[str]):
+        self._entries[key] = (response.headers.get('ETag'), response.headers.get('Last-Modified'), fingerprint)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+    
+    def forget(self, key: str):
+        self._entries.pop(key, None)
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class EmptyPageBackoff:
+    """
+    Маршруты, страница которых пуста и в браузере: поездов действительно нет.
+    Запасной путь через браузер для них откладывается с удвоением паузы, пока браузер
+    снова не найдет поезда (LRU по URL запроса).
+    """
+    
+    def __init__(self, base_seconds: float = 1800, max_seconds: float = 21600, max_entries: int = 2048):
+        self.base_seconds = base_seconds
+        self.max_seconds = max_seconds
+        self.max_entries = max_entries
+        self._entries: 'OrderedDict[str, Tuple[float, int]]' = OrderedDict()  # ключ -> (повтор после, пустых подряд)
+    
+    def allowed(self, key: str) -> bool:
+        """Можно ли снова загрузить страницу в браузере"""
+        entry = self._entries.get(key)
+        return entry is None or time.monotonic() >= entry[0]
+    
+    def record_empty(self, key: str):
+        _, failures = self._entries.pop(key, (0.0, 0))
+        delay = min(self.base_seconds * 2 ** failures, self.max_seconds)
+        self._entries[key] = (time.monotonic() + delay, failures + 1)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+    
+    def reset(self, key: str):
+        self._entries.pop(key, None)
+
+
+class TrainStream:
+    """
+    Поезда потокового разбора. Отпечаток поездов считается по мере чтения ответа, поэтому
+    unchanged (тот же набор поездов, что в прошлый раз) известен только после чтения всех поездов.
+    """
+    
+    def __init__(self):
+        self.trains: Iterable[Train] = ()
+        self.unchanged = False
+    
+    def __iter__(self) -> Iterator[Train]:
+        return iter(self.trains)
+
+
+def _response_encoding(response: requests.Response) -> str:
+    """Кодировка из заголовка ответа; без charset requests подставляет ISO-8859-1, а РЖД отдает UTF-8"""
+    if 'charset' in response.headers.get('Content-Type', '').lower() and response.encoding:
+        return response.encoding
+    return 'utf-8'
+
+
+class RZDUnavailableError(Exception):
+    """Сайт РЖД не ответил; проверку нужно повторить позже, а не считать, что поездов нет"""
 
 
 class RZDScraper:
@@ -13,147 +130,306 @@ class RZDScraper:
         self.base_url = settings.rzd_base_url
         self.session = requests.Session()
         self.session.headers.update({
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+            'Accept-Encoding': _accept_encoding()
         })
+        self.breaker = CircuitBreaker.from_settings()
+        self.parser = ParserPool(settings.parser_pool_size)
+        if settings.parser_streaming and self.parser.size:
+            logger.warning("Потоковый разбор отключен: при PARSER_POOL_SIZE != 0 страница разбирается целиком в пуле")
+        self.validators = ValidatorCache(settings.http_validator_cache_size)
+        self.archive = ResponseArchive.from_settings()  # None - ответы не архивируются
+        # Запасной путь через браузер для страниц, которым нужен JavaScript;
+        # браузеры запускает мониторинг вызовом browser.start()
+        self.browser = BrowserPool.from_settings()
+        self.browser_backoff = EmptyPageBackoff(
+            settings.browser_empty_backoff_seconds, settings.browser_empty_backoff_max_seconds,
+            settings.http_validator_cache_size
+        )
     
     def search_tickets(self, departure_station: str, arrival_station: str, 
-                      departure_date: date, train_number: Optional[str] = None) -> List[Dict]:
+                      departure_date: date, train_number: Optional[str] = None,
+                      time_from: str = '00:00', time_to: str = '23:59',
+                      conditional: bool = False, stream: bool = False) -> Optional[Iterable[Train]]:
         """
         Поиск билетов на сайте РЖД
+
+        С stream=True возвращает TrainStream: поезда разбираются по мере чтения ответа
+        (без дерева всей страницы); тело буферизуется, только если включен архив.
+        С conditional=True отправляет валидаторы прошлого ответа и возвращает None,
+        если страница не изменилась (304 или тот же отпечаток содержимого):
+        разбор и сопоставление не нужны. При потоковом разборе отпечаток поездов известен
+        только в конце, и неизменность страницы сообщает TrainStream.unchanged.
+        Если разбор не нашел поездов и включен пул браузеров, страница загружается в браузере.
+        При недоступности сайта или ошибке разбора выбрасывает RZDUnavailableError,
+        при разомкнутом предохранителе - CircuitOpenError (без запроса).
         """
+        # Не ходим в РЖД, пока предохранитель разомкнут
+        self.breaker.before_call()
+        
         try:
-            # Формируем URL для поиска
-            search_url = f"{self.base_url}/tickets/public/ru"
+            search_url, params = self._search_params(
+                departure_station, arrival_station, departure_date, train_number, time_from, time_to
+            )
             
-            # Параметры поиска
-            params = {
-                'layerName': 'search',
-                'ticketSearch[departureStation]': departure_station,
-                'ticketSearch[arrivalStation]': arrival_station,
-                'ticketSearch[departureDate]': departure_date.strftime('%d.%m.%Y'),
-                'ticketSearch[timeFrom]': '00:00',
-                'ticketSearch[timeTo]': '23:59'
-            }
+            logger.info(f"Поиск билетов: {departure_station} -> {arrival_station} на {departure_date} {time_from}-{time_to}")
+            
+            validator_key = f"{search_url}?{urlencode(sorted(params.items()))}"
+            headers = self.validators.headers(validator_key) if conditional else {}
             
-            if train_number:
-                params['ticketSearch[trainNumber]'] = train_number
+            started = time.monotonic()
+            try:
+                response = self.session.get(search_url, params=params, headers=headers, timeout=30, stream=stream)
+                response.raise_for_status()
+            except requests.RequestException as e:
+                self.breaker.record_failure(time.monotonic() - started)
+                raise RZDUnavailableError(str(e)) from e
+            except Exception as e:
+                # Исход учитывается при любой ошибке: иначе пробный слот полуоткрытого
+                # предохранителя останется занятым и запросы не возобновятся
+                self.breaker.record_failure(time.monotonic() - started)
+                raise RZDUnavailableError(str(e)) from e
+            self.breaker.record_success(time.monotonic() - started)
             
-            logger.info(f"Поиск билетов: {departure_station} -> {arrival_station} на {departure_date}")
+            if stream and response.status_code != 304 and not self.archive and not self.parser.size:
+                # Архив не нужен: разбираем прямо из сокета, отпечаток поездов считается по пути
+                result = TrainStream()
+                trains = self._stream_trains(response, departure_date, validator_key, conditional, result)
+                result.trains = self._browser_if_empty(
+                    trains, search_url, params, departure_date, validator_key, result
+                )
+                return result
             
-            response = self.session.get(search_url, params=params, timeout=30)
-            response.raise_for_status()
+            # Размер тела на проводе (до распаковки); при stream=True тело сначала дочитывается
+            body = response.content
+            wire_bytes = response.raw.tell() if response.raw is not None else len(body)
+            metrics.observe('rzd_search_wire_bytes', wire_bytes)
+            metrics.observe('rzd_search_body_bytes', len(response.content))
+            
+            if response.status_code == 304:
+                metrics.increment('rzd_search_not_modified')
+                logger.info(f"Страница не изменилась ({wire_bytes} байт)")
+                return None
+            
+            if self.archive:
+                self.archive_response(response, departure_station, arrival_station, departure_date, params)
+            
+            # Страница с теми же данными, что и в прошлый раз, не разбирается
+            fingerprint = content_fingerprint(response.content)
+            if conditional:
+                if fingerprint == self.validators.fingerprint(validator_key):
+                    metrics.increment('rzd_search_fingerprint_hits')
+                    self.validators.store(validator_key, response, fingerprint)
+                    logger.info("Содержимое страницы не изменилось")
+                    return None
+                metrics.increment('rzd_search_fingerprint_misses')
+            
+            # Валидаторы сохраняются только для разобранной страницы
+            self.validators.store(validator_key, response, fingerprint)
+            metrics.increment('rzd_search_full')
+            
+            if stream:
+                logger.info(f"Потоковый разбор ответа ({wire_bytes} байт)")
+                trains = self._guard_parse(self.parser.iter_parse(
+                    iter_chunks(response.content), departure_date, _response_encoding(response)
+                ))
+                return self._browser_if_empty(trains, search_url, params, departure_date, validator_key)
             
             # Парсим результаты
-            soup = BeautifulSoup(response.content, 'html.parser')
-            trains = self._parse_search_results(soup)
+            trains = self.parser.parse(response.content, departure_date)
+            if not trains and self.browser:
+                trains = self.search_with_browser(search_url, params, departure_date, validator_key)
             
-            logger.info(f"Найдено поездов: {len(trains)}")
+            logger.info(f"Найдено поездов: {len(trains)} ({wire_bytes} байт)")
             return trains
             
+        except RZDUnavailableError as e:
+            logger.error(f"РЖД недоступен при поиске билетов: {e}")
+            raise
         except Exception as e:
+            # Ошибка разбора или пула - не пустая страница: снимок маршрута не трогаем, проверку откладываем
             logger.error(f"Ошибка при поиске билетов: {e}")
-            return []
+            self.breaker.record_failure(0.0)
+            raise RZDUnavailableError(f"Ошибка разбора ответа: {e}") from e
+    
+    def _guard_parse(self, trains: Iterable[Train]) -> Iterator[Train]:
+        """Ошибка ленивого разбора, как и ошибка в search_tickets, откладывает проверку"""
+        try:
+            yield from trains
+        except RZDUnavailableError:
+            raise
+        except Exception as e:
+            self.breaker.record_failure(0.0)
+            raise RZDUnavailableError(f"Ошибка разбора ответа: {e}") from e
+    
+    def _search_params(self, departure_station: str, arrival_station: str, departure_date: date,
+                       train_number: Optional[str], time_from: str, time_to: str) -> Tuple[str, Dict]:
+        """URL и параметры запроса поиска"""
+        search_url = f"{self.base_url}/tickets/public/ru"
+        params = {
+            'layerName': 'search',
+            'ticketSearch[departureStation]': departure_station,
+            'ticketSearch[arrivalStation]': arrival_station,
+            'ticketSearch[departureDate]': departure_date.strftime('%d.%m.%Y'),
+            'ticketSearch[timeFrom]': time_from,
+            'ticketSearch[timeTo]': time_to
+        }
+        if train_number:
+            params['ticketSearch[trainNumber]'] = train_number
+        return search_url, params
     
-    def _parse_search_results(self, soup: BeautifulSoup) -> List[Dict]:
+    def forget_validators(self, departure_station: str, arrival_station: str, departure_date: date,
+                          train_number: Optional[str] = None, time_from: str = '00:00', time_to: str = '23:59'):
+        """Сброс валидаторов и отпечатка запроса: следующий ответ будет разобран полностью"""
+        search_url, params = self._search_params(
+            departure_station, arrival_station, departure_date, train_number, time_from, time_to
+        )
+        self.validators.forget(f"{search_url}?{urlencode(sorted(params.items()))}")
+    
+    def search_with_browser(self, search_url: str, params: Dict, departure_date: date,
+                            validator_key: str) -> List[Train]:
         """
-        Парсинг результатов поиска
+        Поиск через браузер, когда обычная страница пуста. Если поезда нашлись, валидаторы
+        маршрута сбрасываются: HTML-оболочка такой страницы не меняется, а данные приходят
+        из JavaScript. Если и в браузере пусто, следующий раз браузер используется
+        не раньше паузы EmptyPageBackoff. Если свободного браузера нет, выбрасывает
+        RZDUnavailableError: проверка откладывается.
         """
-        trains = []
-        
-        # Ищем блоки с поездами (это примерная структура, нужно адаптировать под реальный сайт)
-        train_blocks = soup.find_all('div', class_='train-item') or soup.find_all('tr', class_='train-row')
-        
-        for block in train_blocks:
-            try:
-                train_data = self._parse_train_block(block)
-                if train_data:
-                    trains.append(train_data)
-            except Exception as e:
-                logger.warning(f"Ошибка парсинга блока поезда: {e}")
-                continue
-        
+        if not self.browser_backoff.allowed(validator_key):
+            metrics.increment('rzd_search_browser_skipped')
+            return []
+        html = self.browser.fetch(f"{search_url}?{urlencode(params)}")
+        if html is None:
+            # Браузер занят или еще запускается: пустую страницу нельзя считать отсутствием поездов
+            metrics.increment('rzd_search_browser_unavailable')
+            # Следующий условный запрос не должен принять ту же пустую страницу за неизменившуюся
+            self.validators.forget(validator_key)
+            raise RZDUnavailableError("Нет свободного браузера для страницы с JavaScript")
+        metrics.increment('rzd_search_browser_fallbacks')
+        trains = self.parser.parse(html.encode('utf-8'), departure_date)
+        if trains:
+            self.validators.forget(validator_key)
+            self.browser_backoff.reset(validator_key)
+        else:
+            self.browser_backoff.record_empty(validator_key)
+        logger.info(f"Найдено поездов через браузер: {len(trains)}")
         return trains
     
-    def _parse_train_block(self, block) -> Optional[Dict]:
+    def _browser_if_empty(self, trains: Iterable[Train], search_url: str, params: Dict,
+                          departure_date: date, validator_key: str,
+                          result: Optional[TrainStream] = None) -> Iterator[Train]:
+        """Поезда потокового разбора; если их нет (и страница изменилась) - результат браузера"""
+        found = False
+        for train in trains:
+            found = True
+            yield train
+        if not found and self.browser and not (result and result.unchanged):
+            yield from self.search_with_browser(search_url, params, departure_date, validator_key)
+    
+    def _stream_trains(self, response: requests.Response, departure_date: date, validator_key: str,
+                       conditional: bool, result: TrainStream) -> Iterator[Train]:
         """
-        Парсинг блока с информацией о поезде
+        Поезда из ответа, читаемого частями; отпечаток и метрики пишутся после чтения всего тела.
+        Обрыв чтения или ошибка разбора выбрасывают RZDUnavailableError.
         """
+        count = 0
+        fingerprint = TrainFingerprint()
         try:
-            # Извлекаем номер поезда
-            train_number_elem = block.find('span', class_='train-number') or block.find('td', class_='train-number')
-            train_number = train_number_elem.text.strip() if train_number_elem else None
-            
-            # Извлекаем время отправления
-            departure_time_elem = block.find('span', class_='departure-time') or block.find('td', class_='departure-time')
-            departure_time = departure_time_elem.text.strip() if departure_time_elem else None
-            
-            # Извлекаем время прибытия
-            arrival_time_elem = block.find('span', class_='arrival-time') or block.find('td', class_='arrival-time')
-            arrival_time = arrival_time_elem.text.strip() if arrival_time_elem else None
-            
-            # Извлекаем доступные места
-            seats_data = self._parse_available_seats(block)
-            
-            return {
-                'train_number': train_number,
-                'departure_time': departure_time,
-                'arrival_time': arrival_time,
-                'available_seats': seats_data,
-                'prices': self._extract_prices(block)
-            }
-            
+            chunks = response.iter_content(chunk_size=16384)
+            for train in self.parser.iter_parse(chunks, departure_date, _response_encoding(response)):
+                count += 1
+                fingerprint.update(train)
+                yield train
+            wire_bytes = response.raw.tell() if response.raw is not None else 0
+        except requests.RequestException as e:
+            self.breaker.record_failure(0.0)
+            raise RZDUnavailableError(f"Обрыв чтения ответа: {e}") from e
         except Exception as e:
-            logger.warning(f"Ошибка парсинга блока поезда: {e}")
-            return None
-    
-    def _parse_available_seats(self, block) -> Dict:
-        """
-        Парсинг доступных мест
-        """
-        seats = {}
+            # Оборванная страница не должна выглядеть полной: проверка откладывается, снимок не меняется
+            self.breaker.record_failure(0.0)
+            raise RZDUnavailableError(f"Ошибка потокового разбора после {count} поездов: {e}") from e
+        finally:
+            response.close()
         
-        # Ищем блоки с типами мест
-        seat_types = ['плацкарт', 'купе', 'св', 'сидячие', 'люкс']
-        
-        for seat_type in seat_types:
-            seat_elem = block.find('span', string=lambda text: text and seat_type.lower() in text.lower())
-            if seat_elem:
-                # Извлекаем количество мест и цену
-                parent = seat_elem.parent
-                if parent:
-                    count_elem = parent.find('span', class_='count') or parent.find('span', class_='places')
-                    price_elem = parent.find('span', class_='price') or parent.find('span', class_='cost')
-                    
-                    count = count_elem.text.strip() if count_elem else '0'
-                    price = price_elem.text.strip() if price_elem else '0'
-                    
-                    seats[seat_type] = {
-                        'count': count,
-                        'price': price
-                    }
-        
-        return seats
+        metrics.observe('rzd_search_wire_bytes', wire_bytes)
+        if conditional:
+            result.unchanged = fingerprint.hexdigest() == self.validators.fingerprint(validator_key)
+            metrics.increment('rzd_search_fingerprint_hits' if result.unchanged else 'rzd_search_fingerprint_misses')
+        self.validators.store(validator_key, response, fingerprint.hexdigest())
+        if result.unchanged:
+            logger.info(f"Содержимое страницы не изменилось ({wire_bytes} байт)")
+            return
+        metrics.increment('rzd_search_full')
+        logger.info(f"Найдено поездов: {count} ({wire_bytes} байт)")
+    
+    def archive_response(self, response: requests.Response, departure_station: str,
+                         arrival_station: str, departure_date: date, params: Dict):
+        """Сохранение сырого ответа в архив; ошибка архива не влияет на поиск"""
+        try:
+            self.archive.store(response.content, {
+                'departure_station': departure_station,
+                'arrival_station': arrival_station,
+                'departure_date': departure_date.isoformat(),
+                'status': response.status_code,
+                'params': params,
+            })
+        except OSError as e:
+            logger.warning(f"Ошибка записи ответа в архив: {e}")
     
-    def _extract_prices(self, block) -> Dict:
+    def iter_station_catalog(self, page_size: int = 500) -> Iterator[List[Dict]]:
         """
-        Извлечение цен
+        Полный каталог станций постранично
+
+        Выгрузка заканчивается на пустой странице или по общему числу станций из ответа:
+        сервер может отдавать страницы меньше запрошенной. Ошибка запроса или страница,
+        которая не сдвинулась относительно предыдущей (сервер игнорирует смещение),
+        прерывают выгрузку исключением RZDUnavailableError: неполный каталог нельзя
+        использовать для отключения станций.
         """
-        prices = {}
-        
-        price_elements = block.find_all('span', class_='price') or block.find_all('span', class_='cost')
+        catalog_url = f"{self.base_url}/stations/catalog"
+        offset = 0
+        previous_first = None
         
-        for price_elem in price_elements:
+        while True:
             try:
-                price_text = price_elem.text.strip()
-                # Извлекаем числовое значение цены
-                price_value = ''.join(filter(str.isdigit, price_text))
-                if price_value:
-                    prices[price_text] = int(price_value)
-            except Exception as e:
-                logger.warning(f"Ошибка извлечения цены: {e}")
-                continue
-        
-        return prices
+                response = self.session.get(
+                    catalog_url, params={'offset': offset, 'limit': page_size}, timeout=30
+                )
+                response.raise_for_status()
+                data = response.json()
+            except (requests.RequestException, ValueError) as e:
+                raise RZDUnavailableError(f"Каталог станций (смещение {offset}): {e}") from e
+            
+            raw = data.get('stations', [])
+            if not raw:
+                break
+            
+            first = raw[0].get('code')
+            if previous_first is not None and first == previous_first:
+                raise RZDUnavailableError(f"Каталог станций: страница со смещением {offset} повторяет предыдущую")
+            if data.get('offset') is not None and data['offset'] != offset:
+                raise RZDUnavailableError(
+                    f"Каталог станций: запрошено смещение {offset}, получено {data['offset']}"
+                )
+            previous_first = first
+            
+            page = [
+                {
+                    'code': station.get('code', ''),
+                    'name': station.get('name', ''),
+                    'region': station.get('region', '')
+                }
+                for station in raw
+                if station.get('code') and station.get('name')
+            ]
+            if page:
+                yield page
+            
+            offset += len(raw)
+            total = data.get('total')
+            if total is not None and offset >= total:
+                break
+            time.sleep(settings.scraping_delay / 10)
     
     def get_stations(self, query: str) -> List[Dict]:
         """
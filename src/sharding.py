@@ -0,0 +1,110 @@
+import asyncio
+import bisect
+import hashlib
+import os
+import socket
+import time
+import uuid
+from typing import List, Optional
+
+from loguru import logger
+
+from src.utils import RouteKey
+
+
+def route_shard_key(route_key: RouteKey) -> str:
+    """Строковый ключ маршрута для кольца хешей"""
+    return f"{route_key.departure_station}:{route_key.arrival_station}:{route_key.departure_date.isoformat()}"
+
+
+class HashRing:
+    """Кольцо согласованного хеширования с виртуальными узлами"""
+
+    def __init__(self, nodes: List[str], replicas: int = 64):
+        self.nodes = sorted(nodes)
+        ring = sorted(
+            (self._hash(f"{node}#{replica}"), node)
+            for node in self.nodes
+            for replica in range(replicas)
+        )
+        self._hashes = [point for point, _ in ring]
+        self._nodes = [node for _, node in ring]
+
+    @staticmethod
+    def _hash(value: str) -> int:
+        return int.from_bytes(hashlib.md5(value.encode('utf-8')).digest()[:8], 'big')
+
+    def node_for(self, key: str) -> Optional[str]:
+        """Узел, которому принадлежит ключ"""
+        if not self._hashes:
+            return None
+        index = bisect.bisect(self._hashes, self._hash(key)) % len(self._hashes)
+        return self._nodes[index]
+
+
+class ShardMembership:
+    """
+    Участие экземпляра монитора в шардировании маршрутов.
+
+    Живые экземпляры хранятся в сортированном множестве Redis со сроком аренды в качестве веса.
+    Экземпляр продлевает аренду каждые ttl/3 секунд; аренда умершего экземпляра истекает,
+    кольцо перестраивается, и его маршруты переходят к оставшимся. Экземпляр, который не смог
+    продлить аренду, перестает владеть маршрутами к моменту ее истечения.
+    """
+
+    MEMBERS_KEY = 'rzd:monitor:members'
+
+    def __init__(self, redis_client, instance_id: Optional[str] = None,
+                 ttl_seconds: int = 30, replicas: int = 64):
+        self.redis = redis_client
+        self.instance_id = instance_id or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.ttl_seconds = ttl_seconds
+        self.replicas = replicas
+        self.ring = HashRing([], replicas)
+        self._lease_deadline = 0.0  # time.monotonic(), до которого аренда точно действует
+
+    async def heartbeat(self) -> List[str]:
+        """Продление аренды и обновление списка живых экземпляров"""
+        # Время сервера Redis общее для всех экземпляров, поэтому расхождение часов не влияет на аренду
+        started = time.monotonic()
+        seconds, microseconds = await self.redis.time()
+        now = seconds + microseconds / 1_000_000
+
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.zadd(self.MEMBERS_KEY, {self.instance_id: now + self.ttl_seconds})
+            pipe.zremrangebyscore(self.MEMBERS_KEY, '-inf', now)
+            pipe.zrange(self.MEMBERS_KEY, 0, -1)
+            _, _, members = await pipe.execute()
+        self._lease_deadline = started + self.ttl_seconds
+
+        members = sorted(m.decode() if isinstance(m, bytes) else m for m in members)
+        if members != self.ring.nodes:
+            self.ring = HashRing(members, self.replicas)
+            logger.info(f"Состав мониторов изменился: {len(members)} экземпляров, текущий {self.instance_id}")
+        return members
+
+    async def run_heartbeat(self):
+        """Фоновое продление аренды"""
+        while True:
+            try:
+                await self.heartbeat()
+            except Exception as e:
+                logger.error(f"Ошибка продления аренды монитора: {e}")
+            await asyncio.sleep(self.ttl_seconds / 3)
+
+    async def leave(self):
+        """Выход из шардирования: маршруты сразу переходят к остальным экземплярам"""
+        await self.redis.zrem(self.MEMBERS_KEY, self.instance_id)
+        self.ring = HashRing([], self.replicas)
+        self._lease_deadline = 0.0
+        logger.info(f"Монитор {self.instance_id} вышел из шардирования")
+
+    def has_lease(self) -> bool:
+        """Действует ли аренда: после ее истечения маршруты могли перейти к другим экземплярам"""
+        return time.monotonic() < self._lease_deadline
+
+    def owns(self, route_key: RouteKey) -> bool:
+        """Принадлежит ли маршрут этому экземпляру"""
+        if not self.has_lease():
+            return False
+        return self.ring.node_for(route_shard_key(route_key)) == self.instance_id
@@ -0,0 +1,145 @@
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+from loguru import logger
+from sqlalchemy import func
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from src.config import settings
+from src.models import Station, StationCatalogVersion
+
+
+def upsert_stations(db: Session, stations: List[Dict], version: int) -> int:
+    """Вставка или обновление страницы каталога одним запросом"""
+    # В одном INSERT ... ON CONFLICT код станции не может повторяться
+    rows = {
+        station['code']: {
+            'code': station['code'],
+            'name': station['name'],
+            'region': station.get('region') or None,
+            'is_active': True,
+            'catalog_version': version,
+        }
+        for station in stations
+    }
+    if not rows:
+        return 0
+
+    statement = insert(Station.__table__).values(list(rows.values()))
+    db.execute(statement.on_conflict_do_update(
+        index_elements=[Station.code],
+        set_={
+            'name': statement.excluded.name,
+            'region': statement.excluded.region,
+            'is_active': True,
+            'catalog_version': statement.excluded.catalog_version,
+            'updated_at': func.now(),
+        },
+    ))
+    return len(rows)
+
+
+def sync_station_catalog(db: Session, pages: Iterable[List[Dict]]) -> dict:
+    """
+    Синхронизация каталога станций: постраничный upsert и отключение станций,
+    которых нет в новой версии. Пустой каталог ничего не отключает; если станций
+    намного меньше, чем в прошлой версии, каталог считается неполным: станции
+    обновляются, но не отключаются, а версия не становится завершенной.
+    """
+    previous_count = db.query(StationCatalogVersion.station_count).filter(
+        StationCatalogVersion.completed_at.isnot(None)
+    ).order_by(StationCatalogVersion.id.desc()).limit(1).scalar()
+
+    catalog_version = StationCatalogVersion()
+    db.add(catalog_version)
+    db.flush()
+    version = catalog_version.id
+
+    station_count = 0
+    for page in pages:
+        station_count += upsert_stations(db, page, version)
+
+    if not station_count:
+        db.rollback()
+        logger.warning("Каталог станций пуст, синхронизация отменена")
+        return {'version': None, 'stations': 0, 'deactivated': 0}
+
+    if previous_count and station_count < previous_count * (1 - settings.station_sync_max_drop):
+        catalog_version.station_count = station_count
+        db.commit()
+        logger.warning(
+            f"Каталог станций v{version}: {station_count} станций против {previous_count} в прошлой версии, "
+            f"отключение станций пропущено"
+        )
+        return {'version': version, 'stations': station_count, 'deactivated': 0, 'incomplete': True}
+
+    deactivated = db.query(Station).filter(
+        Station.is_active == True,
+        (Station.catalog_version != version) | (Station.catalog_version.is_(None))
+    ).update({Station.is_active: False}, synchronize_session=False)
+
+    catalog_version.station_count = station_count
+    catalog_version.deactivated_count = deactivated
+    catalog_version.completed_at = datetime.now()
+    db.commit()
+
+    logger.info(f"Каталог станций v{version}: {station_count} станций, отключено {deactivated}")
+    return {'version': version, 'stations': station_count, 'deactivated': deactivated}
+
+
+def current_catalog_version(db: Session) -> Optional[int]:
+    """Последняя завершенная версия каталога"""
+    return db.query(func.max(StationCatalogVersion.id)).filter(
+        StationCatalogVersion.completed_at.isnot(None)
+    ).scalar()
+
+
+class StationCache:
+    """
+    Названия станций в памяти процесса.
+
+    Не чаще раза в check_seconds сверяет версию каталога и перечитывает станции,
+    если вышла новая синхронизация.
+    """
+
+    def __init__(self, check_seconds: int = 60):
+        self.check_seconds = check_seconds
+        self.version: Optional[int] = None
+        self._names: Dict[str, str] = {}
+        self._checked_at = 0.0
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    def _refresh(self, db: Session):
+        now = time.monotonic()
+        if self._loaded and now - self._checked_at < self.check_seconds:
+            return
+        with self._lock:
+            if self._loaded and now - self._checked_at < self.check_seconds:
+                return
+            version = current_catalog_version(db)
+            if not self._loaded or version != self.version:
+                # Отключенные станции оставляем: на них могут ссылаться старые подписки
+                self._names = dict(db.query(Station.code, Station.name).all())
+                self.version = version
+                self._loaded = True
+                logger.info(f"Кэш станций загружен: {len(self._names)} станций, версия каталога {version}")
+            self._checked_at = now
+
+    def get_name(self, db: Session, code: str) -> Optional[str]:
+        """Название станции или None, если станции нет в каталоге"""
+        self._refresh(db)
+        return self._names.get(code)
+
+    def display_name(self, db: Session, code: str) -> str:
+        """Название станции для вывода (код, если станции нет в каталоге)"""
+        return self.get_name(db, code) or code
+
+    def invalidate(self):
+        self._loaded = False
+
+
+station_cache = StationCache(settings.station_cache_check_seconds)
@@ -1,61 +1,147 @@
-from celery import current_task
+import asyncio
+import time
+from celery.signals import worker_process_shutdown
 from sqlalchemy.orm import Session
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 from typing import List
 from loguru import logger
 
 from src.celery_app import celery_app
-from src.database import engine
-from src.models import Subscription, FoundTicket, Station
-from src.scraper import RZDScraper
-from src.monitoring import MonitoringService
+from src.config import settings
+from src.database import engine, read_session
+from src.models import Subscription, FoundTicket, RouteWatch
+from src.load_planner import create_load_planner
+from src.outbox import purge_sent_notifications
+from src.price_history import downsample_price_history
+from src.route_watches import reconcile_route_watches, retire_route_watch
+from src.scheduler import complete_scheduled_watches, sync_scheduled_watches
+from src.stations import sync_station_catalog
 
 
-@celery_app.task(bind=True)
+# Сервис мониторинга процесса воркера: предохранитель, валидаторы условных запросов,
+# план нагрузки и пулы разбора и браузеров живут между задачами, а не создаются на каждую
+_monitoring = None
+_loop = None
+
+
+def get_monitoring():
+    """Сервис мониторинга процесса (создается при первой задаче проверки)"""
+    global _monitoring
+    if _monitoring is None:
+        from src.event_bus import create_event_bus
+        from src.monitoring import MonitoringService
+        
+        _monitoring = MonitoringService(event_bus=create_event_bus())
+        browser = getattr(_monitoring.scraper, 'browser', None)
+        if browser:
+            browser.start()
+    return _monitoring
+
+
+def run_async(coro):
+    """Выполнение корутины в цикле событий процесса: клиенты Redis и Telegram привязаны к нему"""
+    global _loop
+    if _loop is None or _loop.is_closed():
+        _loop = asyncio.new_event_loop()
+    return _loop.run_until_complete(coro)
+
+
+@worker_process_shutdown.connect
+def shutdown_monitoring(**kwargs):
+    """Остановка пулов и отправка накопленных сводок при завершении процесса воркера"""
+    if _monitoring is None:
+        return
+    try:
+        run_async(_monitoring.stop_monitoring())
+    except Exception as e:
+        logger.error(f"Ошибка остановки мониторинга воркера: {e}")
+    finally:
+        _loop.close()
+
+
+@celery_app.task(bind=True, priority=5)
 def check_all_subscriptions(self):
     """
-    Проверка всех активных подписок
+    Проверка всех маршрутов, по которым подошло время проверки
     """
+    if settings.check_scheduler != 'beat':
+        # Задача из старого расписания beat: маршруты проверяет тикер или мониторы
+        logger.warning(f"Проверка из beat пропущена: CHECK_SCHEDULER={settings.check_scheduler}")
+        return {'status': 'skipped', 'checked': 0}
+    
     try:
         logger.info("Начало проверки всех подписок")
         
+        monitoring = get_monitoring()
+        
         with Session(engine) as db:
-            # Получаем все активные подписки
-            subscriptions = db.query(Subscription).filter(
-                Subscription.is_active == True
-            ).all()
+            watches = monitoring.due_route_watches(db)
+            
+            logger.info(f"Найдено {len(watches)} маршрутов к проверке")
+            
+            last_report = [0.0]
             
-            logger.info(f"Найдено {len(subscriptions)} активных подписок")
-            
-            monitoring = MonitoringService()
-            
-            for i, subscription in enumerate(subscriptions):
-                try:
-                    # Обновляем прогресс задачи
-                    self.update_state(
-                        state='PROGRESS',
-                        meta={'current': i + 1, 'total': len(subscriptions)}
-                    )
-                    
-                    # Проверяем подписку
-                    await monitoring.check_subscription(subscription, db)
-                    
-                except Exception as e:
-                    logger.error(f"Ошибка проверки подписки {subscription.id}: {e}")
-                    continue
+            def report_progress(current: int, total: int):
+                # Прогресс пишется в Redis не чаще раза в интервал (и для последнего маршрута)
+                now = time.monotonic()
+                if current < total and now - last_report[0] < settings.celery_progress_interval_seconds:
+                    return
+                last_report[0] = now
+                self.update_state(
+                    state='PROGRESS',
+                    meta={'current': current, 'total': total}
+                )
+            
+            run_async(monitoring.check_route_watches(watches, db, on_progress=report_progress))
             
             logger.info("Проверка всех подписок завершена")
-            return {'status': 'completed', 'checked': len(subscriptions)}
+            return {'status': 'completed', 'checked': len(watches), 'deferred': monitoring.deferred_checks}
             
     except Exception as e:
         logger.error(f"Ошибка в задаче проверки подписок: {e}")
         raise self.retry(exc=e, countdown=60, max_retries=3)
 
 
-@celery_app.task
+@celery_app.task(ignore_result=True, priority=5)
+def check_route_watches_task(watch_ids: List[int]):
+    """
+    Проверка маршрутов, поставленных тикером расписания, и их перенос на следующее время
+    """
+    try:
+        from sqlalchemy.orm import selectinload
+        
+        monitoring = get_monitoring()
+        
+        # Коммит после каждого маршрута не сбрасывает загруженные заранее подписки остальных маршрутов
+        with Session(engine, expire_on_commit=False) as db:
+            watches = db.query(RouteWatch).filter(RouteWatch.id.in_(watch_ids)).options(
+                selectinload(RouteWatch.subscriptions).selectinload(Subscription.user)
+            ).all()
+            active = []
+            for watch in watches:
+                if watch.departure_date < date.today():
+                    retire_route_watch(watch)
+                elif watch.is_active:
+                    active.append(watch)
+            
+            run_async(monitoring.check_route_watches(active, db))
+            
+            # Следующая проверка (или пауза предохранителя) сразу попадает в расписание
+            sync_scheduled_watches(watches)
+            return {'status': 'completed', 'checked': len(active), 'deferred': monitoring.deferred_checks}
+            
+    except Exception as e:
+        logger.error(f"Ошибка проверки маршрутов {watch_ids}: {e}")
+        raise
+    finally:
+        # Маршрут снова может быть поставлен тикером: по новому времени или после аренды
+        complete_scheduled_watches(watch_ids)
+
+
+@celery_app.task(ignore_result=True, priority=9)
 def cleanup_old_tickets():
     """
-    Очистка старых найденных билетов (старше 7 дней)
+    Очистка старых найденных билетов (старше 7 дней) и доставленных уведомлений outbox
     """
     try:
         logger.info("Начало очистки старых билетов")
@@ -74,15 +160,56 @@ def cleanup_old_tickets():
             
             db.commit()
             
-            logger.info(f"Удалено {count} старых билетов")
-            return {'status': 'completed', 'deleted': count}
+            outbox_deleted = purge_sent_notifications(db, settings.outbox_retention_days)
+            
+            logger.info(f"Удалено {count} старых билетов и {outbox_deleted} доставленных уведомлений")
+            return {'status': 'completed', 'deleted': count, 'outbox_deleted': outbox_deleted}
             
     except Exception as e:
         logger.error(f"Ошибка очистки старых билетов: {e}")
         raise
 
 
-@celery_app.task
+@celery_app.task(ignore_result=True, priority=9)
+def reconcile_route_watches_task():
+    """
+    Сверка маршрутов с подписками, вывод маршрутов с прошедшей датой и перераспределение
+    проверок по интервалу с учетом добавленных маршрутов
+    """
+    try:
+        with Session(engine) as db:
+            result = reconcile_route_watches(db)
+            
+            planner = create_load_planner()
+            if planner:
+                rebalanced = planner.rebalance(db)
+                db.commit()
+                sync_scheduled_watches(rebalanced)
+                result.update(rebalanced=len(rebalanced), load_plan=planner.load_report())
+            
+            return {'status': 'completed', **result}
+        
+    except Exception as e:
+        logger.error(f"Ошибка сверки маршрутов: {e}")
+        raise
+
+
+@celery_app.task(ignore_result=True, priority=9)
+def downsample_price_history_task():
+    """
+    Свертка истории мест и цен: точки проверок в почасовые, почасовые в посуточные
+    """
+    try:
+        with Session(engine) as db:
+            result = downsample_price_history(db)
+            return {'status': 'completed', **result}
+        
+    except Exception as e:
+        logger.error(f"Ошибка свертки истории цен: {e}")
+        raise
+
+
+@celery_app.task(ignore_result=True, priority=9)
 def update_stations_list():
     """
     Обновление списка станций РЖД
@@ -90,59 +217,30 @@ def update_stations_list():
     try:
         logger.info("Начало обновления списка станций")
         
-        scraper = RZDScraper()
+        from src.scraper import RZDScraper
         
-        # Получаем список популярных станций
-        popular_stations = [
-            'Москва', 'Санкт-Петербург', 'Новосибирск', 'Екатеринбург',
-            'Казань', 'Нижний Новгород', 'Челябинск', 'Самара',
-            'Омск', 'Ростов-на-Дону', 'Уфа', 'Красноярск',
-            'Воронеж', 'Пермь', 'Волгоград', 'Владивосток'
-        ]
+        scraper = RZDScraper()
         
+        # Каталог выгружается постранично и целиком сохраняется в одной транзакции
         with Session(engine) as db:
-            updated_count = 0
-            
-            for station_name in popular_stations:
-                try:
-                    stations = scraper.get_stations(station_name)
-                    
-                    for station_data in stations:
-                        existing_station = db.query(Station).filter(
-                            Station.code == station_data['code']
-                        ).first()
-                        
-                        if not existing_station:
-                            new_station = Station(
-                                code=station_data['code'],
-                                name=station_data['name'],
-                                region=station_data.get('region', '')
-                            )
-                            db.add(new_station)
-                            updated_count += 1
-                        
-                except Exception as e:
-                    logger.warning(f"Ошибка обновления станции {station_name}: {e}")
-                    continue
-            
-            db.commit()
-            
-            logger.info(f"Обновлено {updated_count} станций")
-            return {'status': 'completed', 'updated': updated_count}
+            result = sync_station_catalog(
+                db, scraper.iter_station_catalog(settings.station_sync_page_size)
+            )
+        
+        return {'status': 'completed', **result}
             
     except Exception as e:
         logger.error(f"Ошибка обновления списка станций: {e}")
         raise
 
 
-@celery_app.task
+@celery_app.task(ignore_result=True)
 def send_notification_task(user_id: int, message: str):
     """
     Отправка уведомления пользователю
     """
     try:
         from telegram import Bot
-        from src.config import settings
         
         bot = Bot(token=settings.telegram_bot_token)
         
@@ -160,7 +258,7 @@ def send_notification_task(user_id: int, message: str):
         raise
 
 
-@celery_app.task
+@celery_app.task(ignore_result=True, priority=0)
 def check_specific_subscription(subscription_id: int):
     """
     Проверка конкретной подписки
@@ -178,8 +276,7 @@ def check_specific_subscription(subscription_id: int):
                 logger.warning(f"Подписка {subscription_id} не найдена или неактивна")
                 return {'status': 'not_found'}
             
-            monitoring = MonitoringService()
-            await monitoring.check_subscription(subscription, db)
+            run_async(get_monitoring().check_subscription(subscription, db))
             
             logger.info(f"Подписка {subscription_id} проверена")
             return {'status': 'checked', 'subscription_id': subscription_id}
@@ -192,14 +289,18 @@ def check_specific_subscription(subscription_id: int):
 @celery_app.task
 def get_monitoring_statistics():
     """
-    Получение статистики мониторинга
+    Получение статистики мониторинга (с реплики для чтения, если она настроена)
     """
     try:
-        with Session(engine) as db:
+        with read_session() as db:
             total_subscriptions = db.query(Subscription).filter(
                 Subscription.is_active == True
             ).count()
             
+            active_route_watches = db.query(RouteWatch).filter(
+                RouteWatch.is_active == True
+            ).count()
+            
             total_found_tickets = db.query(FoundTicket).count()
             
             total_notifications = db.query(FoundTicket).filter(
@@ -212,6 +313,7 @@ def get_monitoring_statistics():
             
             return {
                 'active_subscriptions': total_subscriptions,
+                'active_route_watches': active_route_watches,
                 'total_found_tickets': total_found_tickets,
                 'total_notifications': total_notifications,
                 'recent_tickets_24h': recent_tickets,
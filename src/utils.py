@@ -1,8 +1,15 @@
-from datetime import datetime, date
-from typing import Optional, List, Dict
+from datetime import datetime, date, timedelta
+from typing import Optional, List, Dict, NamedTuple, Tuple
 import re
 
 
+class RouteKey(NamedTuple):
+    """Ключ маршрута: один запрос к РЖД (станции и конкретная дата)"""
+    departure_station: str
+    arrival_station: str
+    departure_date: date
+
+
 def validate_date(date_string: str) -> Optional[date]:
     """
     Валидация даты в формате ДД.ММ.ГГГГ
@@ -13,6 +20,44 @@ def validate_date(date_string: str) -> Optional[date]:
         return None
 
 
+def validate_date_range(text: str) -> Optional[Tuple[date, Optional[date]]]:
+    """
+    Валидация даты или диапазона дат в формате ДД.ММ.ГГГГ или ДД.ММ.ГГГГ-ДД.ММ.ГГГГ
+    """
+    parts = [part.strip() for part in text.split('-')]
+    if len(parts) == 1:
+        single = validate_date(parts[0])
+        return (single, None) if single else None
+    
+    if len(parts) != 2:
+        return None
+    
+    date_from, date_to = validate_date(parts[0]), validate_date(parts[1])
+    if not date_from or not date_to or date_to < date_from:
+        return None
+    
+    return date_from, (date_to if date_to != date_from else None)
+
+
+def expand_date_range(date_from: date, date_to: Optional[date] = None,
+                      not_before: Optional[date] = None) -> List[date]:
+    """
+    Список дат диапазона (включительно), начиная не раньше not_before
+    """
+    start = max(date_from, not_before) if not_before else date_from
+    end = date_to or date_from
+    return [start + timedelta(days=offset) for offset in range((end - start).days + 1)]
+
+
+def format_date_range(date_from: date, date_to: Optional[date] = None) -> str:
+    """
+    Форматирование даты или диапазона дат для отображения
+    """
+    if not date_to or date_to == date_from:
+        return date_from.strftime('%d.%m.%Y')
+    return f"{date_from.strftime('%d.%m.%Y')} - {date_to.strftime('%d.%m.%Y')}"
+
+
 def validate_train_number(train_number: str) -> bool:
     """
     Валидация номера поезда
@@ -40,6 +85,27 @@ def format_price(price: str) -> str:
     return "0₽"
 
 
+def format_kopecks(kopecks: Optional[int]) -> str:
+    """
+    Форматирование цены в копейках для отображения
+    """
+    if kopecks is None:
+        return "?₽"
+    rubles, rest = divmod(kopecks, 100)
+    if rest:
+        return f"{rubles},{rest:02d}₽"
+    return f"{rubles}₽"
+
+
+def format_max_prices(max_prices: Optional[Dict[str, int]]) -> Optional[str]:
+    """
+    Форматирование ограничений цены подписки ('купе до 3500₽, св до 9000₽')
+    """
+    if not max_prices:
+        return None
+    return ", ".join(f"{name} до {format_kopecks(price)}" for name, price in max_prices.items())
+
+
 def format_time(time_string: str) -> str:
     """
     Форматирование времени для отображения
@@ -112,7 +178,7 @@ def format_subscription_summary(subscription_data: Dict) -> str:
     Форматирование сводки подписки
     """
     summary = f"🚂 {subscription_data['departure_station_name']} → {subscription_data['arrival_station_name']}\n"
-    summary += f"📅 {subscription_data['departure_date'].strftime('%d.%m.%Y')}\n"
+    summary += f"📅 {format_date_range(subscription_data['departure_date'], subscription_data.get('departure_date_to'))}\n"
     
     if subscription_data.get('train_number'):
         summary += f"🚆 Поезд: {subscription_data['train_number']}\n"
@@ -121,9 +187,32 @@ def format_subscription_summary(subscription_data: Dict) -> str:
         emoji = get_seat_type_emoji(subscription_data['seat_type'])
         summary += f"{emoji} Тип места: {subscription_data['seat_type']}\n"
     
+    if subscription_data.get('max_prices'):
+        summary += f"💰 Цена: {format_max_prices(subscription_data['max_prices'])}\n"
+    
     return summary.strip()
 
 
+# Диапазоны времени отправления в минутах от начала суток: [начало, конец)
+DEPARTURE_TIME_RANGES = {
+    'утро': (6 * 60, 12 * 60),
+    'день': (12 * 60, 18 * 60),
+    'вечер': (18 * 60, 24 * 60),
+    'ночь': (0, 6 * 60),
+}
+
+FULL_DAY = (0, 24 * 60)
+
+
+def get_time_window(time_range: Optional[str]) -> Tuple[int, int]:
+    """
+    Окно времени отправления для диапазона подписки ('любое' и пустое значение - все сутки)
+    """
+    if not time_range:
+        return FULL_DAY
+    return DEPARTURE_TIME_RANGES.get(time_range.lower(), FULL_DAY)
+
+
 def get_time_range_emoji(time_range: str) -> str:
     """
     Получение эмодзи для временного диапазона
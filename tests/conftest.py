@@ -0,0 +1,24 @@
+import os
+import sys
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+# Настройки читаются при импорте src.config: тестам хватает фиктивных значений
+os.environ.setdefault('TELEGRAM_BOT_TOKEN', '123:test')
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def db():
+    """Сессия SQLite в памяти со схемой моделей"""
+    from src.database import Base
+    import src.models  # noqa: F401
+
+    engine = create_engine('sqlite://')
+    Base.metadata.create_all(engine)
+    with Session(engine, expire_on_commit=False) as session:
+        yield session
+    engine.dispose()
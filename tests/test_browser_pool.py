@@ -0,0 +1,39 @@
+import time
+
+from src.browser_pool import BrowserPool, _Browser
+
+
+class FakeDriver:
+    def __init__(self):
+        self.closed = False
+
+    def quit(self):
+        self.closed = True
+
+
+def pool_with(idle_ages):
+    pool = BrowserPool(size=len(idle_ages), idle_seconds=60)
+    now = time.monotonic()
+    for age in idle_ages:
+        browser = _Browser(FakeDriver())
+        browser.last_used = now - age
+        pool._idle.append(browser)
+    pool._count = len(idle_ages)
+    return pool
+
+
+def test_evict_idle_keeps_one_warm_browser():
+    pool = pool_with([600, 300, 120])
+
+    assert pool.evict_idle() == 2
+    assert pool.stats() == {'browsers': 1, 'idle': 1}
+    # Остается последний использованный браузер
+    assert time.monotonic() - pool._idle[0].last_used < 200
+
+
+def test_evict_idle_stops_expired_beside_a_fresh_browser():
+    pool = pool_with([600, 5])
+
+    assert pool.evict_idle() == 1
+    assert pool.stats() == {'browsers': 1, 'idle': 1}
+
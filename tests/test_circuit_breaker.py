@@ -0,0 +1,65 @@
+import time
+
+import pytest
+
+from src.circuit_breaker import CircuitBreaker, CircuitOpenError
+
+
+def make_breaker(**kwargs) -> CircuitBreaker:
+    options = dict(window_size=4, min_calls=4, failure_rate_threshold=0.5, slow_call_seconds=10.0,
+                   base_backoff=30.0, max_backoff=60.0)
+    options.update(kwargs)
+    return CircuitBreaker(**options)
+
+
+def expire_pause(breaker: CircuitBreaker):
+    breaker._open_until = time.monotonic() - 1
+
+
+def test_opens_on_failure_rate():
+    breaker = make_breaker()
+    for _ in range(2):
+        breaker.record_success(0.1)
+    breaker.record_failure(0.1)
+    assert breaker.state == CircuitBreaker.CLOSED
+
+    breaker.record_failure(0.1)
+    assert breaker.state == CircuitBreaker.OPEN
+    with pytest.raises(CircuitOpenError) as error:
+        breaker.before_call()
+    assert 0 < error.value.retry_after <= 60
+
+
+def test_opens_on_slow_calls():
+    breaker = make_breaker(slow_call_rate_threshold=0.5)
+    for _ in range(4):
+        breaker.record_success(12.0)
+    assert breaker.state == CircuitBreaker.OPEN
+
+
+def test_half_open_allows_one_probe_and_closes_on_success():
+    breaker = make_breaker()
+    for _ in range(4):
+        breaker.record_failure(0.1)
+    expire_pause(breaker)
+
+    breaker.before_call()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+    breaker.record_success(0.1)
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.before_call()
+
+
+def test_failed_probe_reopens():
+    breaker = make_breaker()
+    for _ in range(4):
+        breaker.record_failure(0.1)
+    expire_pause(breaker)
+
+    breaker.before_call()
+    breaker.record_failure(0.1)
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.retry_after() > 0
@@ -0,0 +1,62 @@
+from datetime import date, datetime, timedelta
+
+from src.load_planner import LoadPlanner
+from src.models import RouteWatch
+
+PERIOD = 600
+
+
+def make_watch(watch_id: int) -> RouteWatch:
+    return RouteWatch(id=watch_id, departure_station='2000000', arrival_station=str(2004000 + watch_id),
+                      departure_date=date(2026, 1, 1), check_frequency=PERIOD // 60)
+
+
+def planned(count: int):
+    watches = [make_watch(index) for index in range(count)]
+    planner = LoadPlanner()
+    planner.plan((watch.id, watch.route_key, watch.check_frequency) for watch in watches)
+    return planner, watches
+
+
+def test_phases_spread_evenly():
+    planner, _ = planned(10)
+    assert sorted(planner.phases.values()) == [index * PERIOD / 10 for index in range(10)]
+    assert planner.load_report()['peak_rps'] == 1
+
+
+def test_next_check_lands_on_phase_within_period():
+    planner, watches = planned(10)
+    now = datetime(2026, 1, 1, 12, 0, 0)
+    for watch in watches:
+        for offset in range(0, PERIOD, 37):
+            checked = now + timedelta(seconds=offset)
+            slot = planner.next_check_at(watch, checked, checked)
+            gap = (slot - checked).total_seconds()
+            assert PERIOD / 2 <= gap <= PERIOD
+            on_phase = slot.timestamp() % PERIOD == planner.phases[watch.id]
+            assert on_phase or gap == PERIOD
+
+
+def test_gap_never_exceeds_period_after_late_check():
+    planner, watches = planned(4)
+    watch = watches[1]
+    phase = planner.phases[watch.id]
+    # Проверка сразу после своего слота (например, после паузы предохранителя)
+    base = datetime.fromtimestamp((datetime(2026, 1, 1).timestamp() // PERIOD) * PERIOD + phase)
+    checked = base + timedelta(seconds=PERIOD * 0.6)
+    slot = planner.next_check_at(watch, checked, checked)
+    assert (slot - checked).total_seconds() == PERIOD
+
+
+def test_overdue_route_is_scheduled_after_now():
+    planner, watches = planned(3)
+    now = datetime(2026, 1, 1, 12, 0, 0)
+    slot = planner.next_check_at(watches[0], now, now - timedelta(hours=2))
+    assert now < slot <= now + timedelta(seconds=PERIOD)
+
+
+def test_unplanned_route_uses_hash_phase():
+    planner = LoadPlanner()
+    watch = make_watch(99)
+    assert planner.phase(watch) == planner.phase(make_watch(99))
+    assert 0 <= planner.phase(watch) < PERIOD
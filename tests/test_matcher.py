@@ -0,0 +1,62 @@
+from datetime import datetime
+
+from src.matcher import (ANY_SEAT_CLASS, UNKNOWN_SEAT_CLASS, RouteMatcher, build_route_query,
+                         seat_class_mask)
+from src.models import Subscription
+from src.records import SEAT_CLASS_BITS, SeatClass, Train
+
+
+def train(number: str, hour: int, *seats: SeatClass) -> Train:
+    return Train.build(number, datetime(2026, 1, 1, hour, 15), datetime(2026, 1, 1, hour + 1, 40), seats)
+
+
+def subscription(subscription_id: int, **kwargs) -> Subscription:
+    return Subscription(id=subscription_id, **kwargs)
+
+
+def matched_ids(subscriptions, trains):
+    return sorted((item.id, found.train_number) for item, found in RouteMatcher(subscriptions).match(trains))
+
+
+def test_seat_class_mask():
+    assert seat_class_mask(None) == ANY_SEAT_CLASS
+    assert seat_class_mask('Любой') == ANY_SEAT_CLASS
+    assert seat_class_mask('Купе') == SEAT_CLASS_BITS['купе']
+    assert seat_class_mask('вагон-ресторан') == UNKNOWN_SEAT_CLASS
+
+
+def test_unknown_seat_type_matches_nothing():
+    trains = [train('001А', 8, *(SeatClass(name, 5) for name in SEAT_CLASS_BITS))]
+    assert matched_ids([subscription(1, seat_type='вагон-ресторан')], trains) == []
+    assert matched_ids([subscription(2, seat_type='любой')], trains) == [(2, '001А')]
+
+
+def test_train_number_seat_class_and_time_window():
+    trains = [
+        train('001А', 8, SeatClass('купе', 3)),
+        train('002А', 20, SeatClass('плацкарт', 0), SeatClass('св', 1)),
+        train('003А', 9),
+    ]
+    subscriptions = [
+        subscription(1),
+        subscription(2, train_number=' 002а '),
+        subscription(3, seat_type='плацкарт'),
+        subscription(4, seat_type='купе', departure_time_range='вечер'),
+    ]
+    # Поезд без мест не подходит никому; плацкарт без мест не подходит подписке на плацкарт
+    assert matched_ids(subscriptions, trains) == [(1, '001А'), (1, '002А'), (2, '002А')]
+
+
+def test_price_limits():
+    trains = [train('001А', 8, SeatClass('купе', 2, 500000), SeatClass('плацкарт', 4, None))]
+    assert matched_ids([subscription(1, seat_type='купе', max_prices={'купе': 600000})], trains) == [(1, '001А')]
+    assert matched_ids([subscription(2, seat_type='купе', max_prices={'купе': 400000})], trains) == []
+    # Цена плацкарта не распознана: ограниченный класс не подходит
+    assert matched_ids([subscription(3, seat_type='плацкарт', max_prices={'плацкарт': 1})], trains) == []
+
+
+def test_build_route_query_merges_filters():
+    query = build_route_query([subscription(1, train_number='001А'), subscription(2, train_number='001а')])
+    assert query.train_number == '001А'
+    assert (query.time_from, query.time_to) == ('00:00', '23:59')
+    assert build_route_query([subscription(1, train_number='001А'), subscription(2)]).train_number is None
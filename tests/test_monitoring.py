@@ -0,0 +1,103 @@
+from datetime import date, datetime, timedelta
+
+import pytest
+from sqlalchemy import event
+
+from src.models import RouteWatch, Subscription, User
+from src.monitoring import MonitoringService
+from src.records import SeatClass, Train
+
+
+class StubScraper:
+    def __init__(self, trains):
+        self.trains = trains
+        self.conditional = []
+        self.forgotten = []
+
+    def search_tickets(self, **kwargs):
+        self.conditional.append(kwargs['conditional'])
+        return list(self.trains)
+
+    def forget_validators(self, *args):
+        self.forgotten.append(args)
+
+
+@pytest.fixture
+def watch(db):
+    departure_date = date.today() + timedelta(days=10)
+    user = User(telegram_id=1)
+    subscription = Subscription(user=user, departure_station='2000000', arrival_station='2004000',
+                                departure_date=departure_date)
+    watch = RouteWatch(departure_station='2000000', arrival_station='2004000', departure_date=departure_date,
+                       subscriptions=[subscription])
+    db.add(watch)
+    db.commit()
+    return watch
+
+
+def make_service():
+    train = Train.build('001А', datetime.now(), datetime.now(), (SeatClass('купе', 3, 500000),))
+    scraper = StubScraper([train])
+    service = MonitoringService(scraper=scraper)
+    return service, scraper
+
+
+@pytest.mark.asyncio
+async def test_failed_match_keeps_next_check_unconditional(db, watch):
+    service, scraper = make_service()
+    stored = []
+
+    async def process_found_train(train, subscription, db, departure_date=None):
+        stored.append(train)
+        return len(stored) > 1  # первая запись не удалась
+
+    service.process_found_train = process_found_train
+
+    await service.check_route_watch(watch, db)
+    assert watch.id not in service.matched_subscribers
+    assert len(scraper.forgotten) == 1
+
+    await service.check_route_watch(watch, db)
+    assert scraper.conditional == [False, False]
+    assert watch.id in service.matched_subscribers
+
+    await service.check_route_watch(watch, db)
+    assert scraper.conditional[-1] is True
+
+
+@pytest.mark.asyncio
+async def test_cycle_loads_subscriptions_once(db, monkeypatch):
+    import src.monitoring as monitoring_module
+
+    departure_date = date.today() + timedelta(days=10)
+    user = User(telegram_id=2)
+    for index in range(5):
+        subscription = Subscription(user=user, departure_station='2000000', arrival_station=str(2004000 + index),
+                                    departure_date=departure_date)
+        db.add(RouteWatch(departure_station='2000000', arrival_station=str(2004000 + index),
+                          departure_date=departure_date, subscriptions=[subscription]))
+    db.commit()
+
+    engine = db.get_bind()
+    monkeypatch.setattr(monitoring_module, 'engine', engine)
+    service, scraper = make_service()
+
+    async def process_found_train(train, subscription, db, departure_date=None):
+        return True
+
+    service.process_found_train = process_found_train
+    statements = []
+
+    def record(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(engine, 'before_cursor_execute', record)
+    try:
+        await service.check_all_subscriptions()
+    finally:
+        event.remove(engine, 'before_cursor_execute', record)
+
+    assert len(scraper.conditional) == 5
+    # Подписки и пользователи всех маршрутов загружаются один раз, а не заново после каждого коммита
+    assert sum('subscriptions.user_id AS' in statement for statement in statements) == 1
+    assert sum('FROM users' in statement for statement in statements) == 1
@@ -0,0 +1,71 @@
+import pytest
+
+import src.notifier as notifier_module
+from src.models import FoundTicket
+from src.notifier import NotifierService
+
+
+class FakeBus:
+    def __init__(self):
+        self.acked = []
+        self.marked = []
+
+    async def delivered_keys(self, keys):
+        return set()
+
+    async def ack(self, entry_ids):
+        self.acked.extend(entry_ids)
+
+    async def mark_delivered(self, keys, ttl_seconds):
+        self.marked.extend(keys)
+
+
+@pytest.mark.asyncio
+async def test_flush_acks_only_delivered_chunks(db, monkeypatch):
+    monkeypatch.setattr(notifier_module, 'engine', db.get_bind())
+    for ticket_id in (1, 2):
+        db.add(FoundTicket(id=ticket_id, subscription_id=1, train_number=str(ticket_id)))
+    db.commit()
+
+    bus = FakeBus()
+    notifier = NotifierService(bus, consumer='test')
+    sent = []
+
+    async def send(chat_id, text):
+        # Первая часть сводки уходит, на второй Telegram отвечает временной ошибкой
+        sent.append(text)
+        return len(sent) == 1
+
+    notifier.send = send
+    await notifier.accept([
+        ('1-0', {'idempotency_key': 'found_ticket:1', 'ticket_id': 1, 'chat_id': 10, 'message': 'a' * 3000}),
+        ('2-0', {'idempotency_key': 'found_ticket:2', 'ticket_id': 2, 'chat_id': 10, 'message': 'b' * 3000}),
+    ])
+    await notifier.flush(force=True)
+
+    assert len(sent) == 2
+    assert bus.acked == ['1-0']
+    assert bus.marked == ['found_ticket:1']
+    db.expire_all()
+    assert {ticket.id: ticket.is_notified for ticket in db.query(FoundTicket)} == {1: True, 2: False}
+    assert notifier.pending == {} and notifier.in_flight == set()
+
+
+@pytest.mark.asyncio
+async def test_flush_stops_after_first_failed_chunk(monkeypatch):
+    bus = FakeBus()
+    notifier = NotifierService(bus, consumer='test')
+    sent = []
+
+    async def send(chat_id, text):
+        sent.append(text)
+        return False
+
+    notifier.send = send
+    await notifier.accept([
+        (f'{index}-0', {'ticket_id': index, 'chat_id': 10, 'message': 'x' * 3000}) for index in range(3)
+    ])
+    await notifier.flush(force=True)
+
+    assert len(sent) == 1
+    assert bus.acked == []
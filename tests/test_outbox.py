@@ -0,0 +1,83 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import event
+
+from src.models import NotificationOutbox
+from src.outbox import OutboxRelay, purge_sent_notifications
+
+
+def aware(seconds_ago: float) -> datetime:
+    return datetime.now().astimezone() - timedelta(seconds=seconds_ago)
+
+
+def add_entry(db, key: str, chat_id: int, seconds_ago: float, status=NotificationOutbox.PENDING, sent_at=None):
+    entry = NotificationOutbox(
+        idempotency_key=key, found_ticket_id=1, chat_id=chat_id, message=key,
+        status=status, attempts=0, available_at=aware(seconds_ago), sent_at=sent_at,
+    )
+    db.add(entry)
+    return entry
+
+
+@pytest.fixture
+def timestamptz():
+    """SQLite возвращает naive datetime; как Postgres с timestamptz, делаем загруженные значения aware"""
+    def make_aware(target, *args):
+        for name in ('available_at', 'claimed_until', 'sent_at'):
+            value = target.__dict__.get(name)
+            if value is not None and value.tzinfo is None:
+                target.__dict__[name] = value.astimezone()
+
+    event.listen(NotificationOutbox, 'load', make_aware)
+    event.listen(NotificationOutbox, 'refresh', make_aware)
+    yield
+    event.remove(NotificationOutbox, 'load', make_aware)
+    event.remove(NotificationOutbox, 'refresh', make_aware)
+
+
+def test_claim_window_with_aware_timestamps(db, timestamptz):
+    add_entry(db, 'old', chat_id=1, seconds_ago=120)
+    add_entry(db, 'fresh', chat_id=2, seconds_ago=5)
+    add_entry(db, 'old-chat-new-entry', chat_id=1, seconds_ago=1)
+    db.commit()
+
+    claimed = OutboxRelay(window_seconds=60).claim(db)
+
+    assert list(claimed) == [1]
+    assert [message.idempotency_key for message in claimed[1]] == ['old', 'old-chat-new-entry']
+
+
+def test_claim_force_and_lease(db):
+    add_entry(db, 'fresh', chat_id=2, seconds_ago=5)
+    db.commit()
+    relay = OutboxRelay(window_seconds=60)
+
+    assert list(relay.claim(db, force=True)) == [2]
+    # Аренда еще действует: запись не захватывается повторно
+    assert relay.claim(db, force=True) == {}
+
+
+@pytest.mark.asyncio
+async def test_drain_acks_only_delivered(db):
+    add_entry(db, 'a', chat_id=1, seconds_ago=120)
+    add_entry(db, 'b', chat_id=1, seconds_ago=120)
+    db.commit()
+
+    async def deliver(chat_id, messages):
+        return [True, False]
+
+    relay = OutboxRelay(deliver_chat=deliver, window_seconds=60, retry_base_seconds=30)
+    assert await relay.drain(db) == 1
+
+    statuses = {row.idempotency_key: (row.status, row.attempts) for row in db.query(NotificationOutbox)}
+    assert statuses == {'a': (NotificationOutbox.SENT, 0), 'b': (NotificationOutbox.PENDING, 1)}
+    assert relay.next_ready_at(db).timestamp() > datetime.now().timestamp()
+
+
+def test_purge_sent_with_aware_timestamps(db, timestamptz):
+    add_entry(db, 'old', chat_id=1, seconds_ago=0, status=NotificationOutbox.SENT, sent_at=aware(8 * 86400))
+    add_entry(db, 'recent', chat_id=1, seconds_ago=0, status=NotificationOutbox.SENT, sent_at=aware(3600))
+    db.commit()
+
+    assert purge_sent_notifications(db, older_than_days=7) == 1
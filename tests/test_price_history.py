@@ -0,0 +1,49 @@
+from datetime import date, datetime, timedelta
+
+from src.models import TrainSeatSeriesChunk
+from src.price_history import (CHECK, HOUR, NO_PRICE, PriceHistoryRecorder, decode_points, downsample,
+                               encode_points, route_series, series_points)
+from src.utils import RouteKey
+
+ROUTE = RouteKey('2000000', '2004000', date(2026, 2, 1))
+
+
+def test_varint_round_trip():
+    points = [(0, 10, 350000), (60, 10, 350000), (125, 0, NO_PRICE), (3599, 300, 2 ** 40), (3599, 0, 0)]
+    assert decode_points(encode_points(points)) == points
+
+
+def test_unchanged_point_is_compact():
+    payload = encode_points([(30, 12, 450000)], previous=(0, 12, 450000))
+    assert len(payload) == 3
+
+
+def test_appended_payload_decodes_as_one_block():
+    first = encode_points([(0, 5, 100)])
+    second = encode_points([(60, 4, 90)], previous=(0, 5, 100))
+    assert decode_points(first + second) == [(0, 5, 100), (60, 4, 90)]
+
+
+def snapshot(count: int, price):
+    return [{
+        'train_number': '001А',
+        'departure_time': '2026-02-01T08:15:00',
+        'available_seats': {'купе': {'count': count, 'price': price}},
+    }]
+
+
+def test_record_and_downsample(db):
+    recorder = PriceHistoryRecorder()
+    start = datetime(2026, 1, 20, 10, 0)
+    for index, (count, price) in enumerate([(5, 500000), (3, 450000), (0, None)]):
+        recorder.record(db, ROUTE, snapshot(count, price), start + timedelta(minutes=index * 10))
+    db.commit()
+
+    [series] = route_series(db, ROUTE)
+    assert [point[1:] for point in series_points(db, series.id)] == [(5, 500000), (3, 450000), (0, None)]
+
+    assert downsample(db, CHECK, HOUR, start + timedelta(hours=2)) == 1
+    [chunk] = db.query(TrainSeatSeriesChunk).filter(TrainSeatSeriesChunk.series_id == series.id).all()
+    assert chunk.resolution == HOUR
+    # Свертка блока: максимум мест и минимальная цена за час
+    assert decode_points(chunk.payload) == [(10 * 3600, 5, 450000)]
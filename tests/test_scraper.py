@@ -0,0 +1,103 @@
+import io
+from datetime import date
+
+import pytest
+import requests
+
+from src.browser_pool import BrowserPool
+from src.records import SEAT_CLASSES
+from src.scraper import RZDScraper, RZDUnavailableError, TrainStream
+
+DEPARTURE_DATE = date(2026, 3, 15)
+
+
+def build_page(trains: int, stamp: str = '12:00:00') -> str:
+    blocks = []
+    for i in range(trains):
+        seats = "".join(
+            f'<div><span>{name}</span><span class="count">{i + 1}</span>'
+            f'<span class="price">от {1000 + i} руб.</span></div>'
+            for name in SEAT_CLASSES
+        )
+        blocks.append(
+            f'<div class="train-item"><span class="train-number">{i:03d}М</span>'
+            f'<span class="departure-time">{i % 24:02d}:15</span>'
+            f'<span class="arrival-time">{(i + 9) % 24:02d}:40</span>{seats}</div>'
+        )
+    return f"<html><body><p>Обновлено {stamp}</p>{''.join(blocks)}</body></html>"
+
+
+def make_response(body: bytes, content_type: str) -> requests.Response:
+    response = requests.Response()
+    response.status_code = 200
+    response.headers['Content-Type'] = content_type
+    response.encoding = requests.utils.get_encoding_from_headers(response.headers)
+    response.raw = io.BytesIO(body)
+    return response
+
+
+@pytest.fixture
+def scraper(monkeypatch):
+    scraper = RZDScraper()
+    scraper.browser = None
+    scraper.archive = None
+    scraper.parser.size = 0
+    responses = []
+    monkeypatch.setattr(scraper.session, 'get', lambda *args, **kwargs: responses.pop(0))
+    return scraper, responses
+
+
+def search(scraper, conditional=False):
+    return scraper.search_tickets('2000000', '2004000', DEPARTURE_DATE, conditional=conditional, stream=True)
+
+
+def test_stream_uses_response_charset(scraper):
+    scraper, responses = scraper
+    responses.append(make_response(build_page(2).encode('cp1251'), 'text/html; charset=windows-1251'))
+
+    trains = list(search(scraper))
+
+    assert [train.train_number for train in trains] == ['000М', '001М']
+    assert {seat.name for seat in trains[0].seats} == set(SEAT_CLASSES)
+
+
+def test_conditional_stream_reports_unchanged_trains(scraper):
+    scraper, responses = scraper
+    responses.append(make_response(build_page(3, '12:00:00').encode('utf-8'), 'text/html'))
+    responses.append(make_response(build_page(3, '12:05:00').encode('utf-8'), 'text/html'))
+    responses.append(make_response(build_page(4).encode('utf-8'), 'text/html'))
+
+    first = search(scraper, conditional=True)
+    assert isinstance(first, TrainStream)
+    assert len(list(first)) == 3 and not first.unchanged
+
+    # Изменилась только метка времени: те же поезда
+    second = search(scraper, conditional=True)
+    assert len(list(second)) == 3 and second.unchanged
+
+    third = search(scraper, conditional=True)
+    assert len(list(third)) == 4 and not third.unchanged
+
+
+def test_parse_error_defers_check_and_counts_as_failure(scraper, monkeypatch):
+    scraper, responses = scraper
+    responses.append(make_response(build_page(1).encode('utf-8'), 'text/html'))
+
+    def broken(*args, **kwargs):
+        raise ValueError('сломанная разметка')
+
+    monkeypatch.setattr(scraper.parser, 'parse', broken)
+    with pytest.raises(RZDUnavailableError):
+        scraper.search_tickets('2000000', '2004000', DEPARTURE_DATE)
+    assert list(scraper.breaker._calls)[-1][0] is True
+
+
+def test_no_free_browser_defers_instead_of_empty(scraper, monkeypatch):
+    scraper, responses = scraper
+    responses.append(make_response(b'<html><body></body></html>', 'text/html'))
+    scraper.browser = BrowserPool(size=1)
+    monkeypatch.setattr(scraper.browser, '_warm_up', lambda: None)
+
+    with pytest.raises(RZDUnavailableError):
+        scraper.search_tickets('2000000', '2004000', DEPARTURE_DATE)
+    assert len(scraper.validators) == 0
@@ -0,0 +1,47 @@
+import time
+from datetime import date
+
+import pytest
+
+from src.sharding import HashRing, ShardMembership, route_shard_key
+from src.utils import RouteKey
+
+fakeredis = pytest.importorskip('fakeredis')
+
+
+def route(index: int) -> RouteKey:
+    return RouteKey('2000000', str(2004000 + index), date(2026, 1, 1))
+
+
+def test_hash_ring_moves_only_keys_of_removed_node():
+    keys = [route_shard_key(route(index)) for index in range(500)]
+    before = HashRing(['a', 'b', 'c'])
+    after = HashRing(['a', 'b'])
+
+    for key in keys:
+        if before.node_for(key) != 'c':
+            assert after.node_for(key) == before.node_for(key)
+    assert {before.node_for(key) for key in keys} == {'a', 'b', 'c'}
+    assert HashRing([]).node_for(keys[0]) is None
+
+
+@pytest.mark.asyncio
+async def test_membership_splits_routes_and_expires_lease():
+    redis = fakeredis.FakeAsyncRedis()
+    first = ShardMembership(redis, 'first', ttl_seconds=30)
+    second = ShardMembership(redis, 'second', ttl_seconds=30)
+    await first.heartbeat()
+    assert await second.heartbeat() == ['first', 'second']
+    await first.heartbeat()
+
+    routes = [route(index) for index in range(100)]
+    owners = [(first.owns(key), second.owns(key)) for key in routes]
+    assert all(a != b for a, b in owners)
+
+    # Аренда истекла без продления: экземпляр не владеет маршрутами
+    first._lease_deadline = time.monotonic() - 1
+    assert not any(first.owns(key) for key in routes)
+
+    await first.leave()
+    assert await second.heartbeat() == ['second']
+    assert all(second.owns(key) for key in routes)